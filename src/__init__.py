@@ -1,8 +1,24 @@
 """
 Khởi tạo package src
+
+Các class được import khi truy cập lần đầu, nên `from src import SentimentDatabase`
+không phải tải SentimentAnalyzer hay model.
 """
 
-from .sentiment_analyzer import SentimentAnalyzer
-from .database import SentimentDatabase
+import importlib
+
+_EXPORTS = {
+    'SentimentAnalyzer': '.sentiment_analyzer',
+    'SentimentDatabase': '.database',
+    'ModelRegistry': '.model_registry',
+}
+
+__all__ = list(_EXPORTS)
+
 
-__all__ = ['SentimentAnalyzer', 'SentimentDatabase']
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -6,11 +6,14 @@ Chạy: streamlit run src/app.py
 
 import streamlit as st
 import json
+import os
+import tempfile
 from datetime import datetime
 import pandas as pd
 import plotly.express as px
-from sentiment_analyzer import SentimentAnalyzer
 from database import SentimentDatabase
+from metrics import REGISTRY, start_metrics_server
+from model_registry import ModelRegistry
 
 # Cấu hình trang
 st.set_page_config(
@@ -183,17 +186,209 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_database() -> SentimentDatabase:
+    """
+    Một SentimentDatabase (pool kết nối) dùng chung cho mọi session
+    
+    Đặt SENTIMENT_WRITE_BEHIND=1 để ghi lịch sử trễ ở thread nền; các hàm đọc
+    tự ghi nốt hàng đợi trước khi đọc nên lịch sử và thống kê luôn đầy đủ.
+    """
+    db = SentimentDatabase(metrics=REGISTRY)
+    if os.environ.get('SENTIMENT_WRITE_BEHIND') == '1':
+        db.enable_write_behind()
+    return db
+
+@st.cache_resource
+def start_metrics_exporter():
+    """Exporter Prometheus (GET /metrics) chạy một lần khi đặt SENTIMENT_METRICS_PORT"""
+    port = os.environ.get('SENTIMENT_METRICS_PORT')
+    return start_metrics_server(int(port)) if port else None
+
+start_metrics_exporter()
+ui_classifications = REGISTRY.counter(
+    'sentiment_app_classifications_total', 'Số câu được phân loại qua giao diện', ('app',)
+).labels(app='streamlit')
+
+# Cache các truy vấn dashboard theo số thế hệ dữ liệu của database: mỗi lần
+# lưu/xóa làm tăng số thế hệ (kể cả từ process khác dùng chung file SQLite),
+# rerun không có ghi mới chỉ đọc số thế hệ, không chạy lại truy vấn hay dựng
+# lại DataFrame/biểu đồ.
+@st.cache_data(max_entries=16)
+def load_statistics(generation: int) -> dict:
+    return get_database().get_statistics()
+
+@st.cache_data(max_entries=16)
+def load_history(generation: int, pages: int, query: str = '', sentiment: str = None,
+                 match_diacritics: bool = False):
+    """
+    Đọc pages trang lịch sử (keyset pagination, 50 bản ghi mỗi trang)
+    
+    Khi có query thì đọc kết quả tìm kiếm toàn văn (search_history) thay vì
+    lịch sử mới nhất.
+    
+    Returns:
+        (DataFrame, còn trang tiếp theo?, tổng số bản ghi (None khi tìm kiếm))
+    """
+    db = get_database()
+    history = []
+    cursor = None
+    for _ in range(pages):
+        if query:
+            page, cursor = db.search_history(
+                query, limit=50, cursor=cursor, sentiment=sentiment, match_diacritics=match_diacritics
+            )
+        else:
+            page, cursor = db.get_history_page(limit=50, cursor=cursor)
+        history.extend(page)
+        if cursor is None:
+            break
+    df = pd.DataFrame(history, columns=['ID', 'Câu văn', 'Cảm xúc', 'Thời gian'])
+    total_count = None if query else db.get_total_count()
+    return df, cursor is not None, total_count
+
+EXPORT_MIME = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'parquet': 'application/vnd.apache.parquet'}
+
+def prepare_export(fmt: str, sentiment: str = None, start=None, end=None):
+    """
+    Xuất toàn bộ lịch sử (theo bộ lọc) ra file tạm theo từng chunk
+    
+    Chỉ giữ một file tạm mỗi session: file của lần xuất trước bị xóa.
+    
+    Returns:
+        (đường dẫn file tạm, số bản ghi)
+    """
+    previous = st.session_state.pop('export_file', None)
+    if previous and os.path.exists(previous[0]):
+        os.remove(previous[0])
+    fd, path = tempfile.mkstemp(prefix="history_", suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        count = get_database().export_history(path, fmt=fmt, sentiment=sentiment, start=start, end=end)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, count
+
+@st.cache_data(max_entries=16)
+def build_charts(generation: int, granularity: str = 'hour') -> dict:
+    """
+    Dựng các biểu đồ của tab Biểu đồ
+    
+    Args:
+        generation: Số thế hệ dữ liệu (khóa cache)
+        granularity: Độ chi tiết của biểu đồ xu hướng ('hour' hoặc 'day')
+    
+    Returns:
+        Dictionary {pie, bar, timeline} (timeline None nếu chưa có lịch sử)
+    """
+    stats = load_statistics(generation)
+    
+    # Pie chart
+    pie_data = pd.DataFrame({
+        'Cảm xúc': ['Tích cực', 'Tiêu cực', 'Trung tính'],
+        'Số lượng': [stats['positive'], stats['negative'], stats['neutral']],
+        'Emoji': ['◆', '◆', '◆']
+    })
+    
+    fig_pie = px.pie(
+        pie_data, 
+        values='Số lượng', 
+        names='Cảm xúc',
+        color='Cảm xúc',
+        color_discrete_map={
+            'Tích cực': '#40FFF5',
+            'Tiêu cực': '#FF4040',
+            'Trung tính': '#FFFFFF'
+        }
+    )
+    fig_pie.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='#FFFFFF', size=14)
+    )
+    
+    # Bar chart
+    bar_data = pd.DataFrame({
+        'Cảm xúc': ['◆ Tích cực', '◆ Tiêu cực', '◆ Trung tính'],
+        'Số lượng': [stats['positive'], stats['negative'], stats['neutral']]
+    })
+    
+    fig_bar = px.bar(
+        bar_data,
+        x='Cảm xúc',
+        y='Số lượng',
+        color='Cảm xúc',
+        color_discrete_map={
+            '◆ Tích cực': '#40FFF5',
+            '◆ Tiêu cực': '#FF4040',
+            '◆ Trung tính': '#FFFFFF'
+        }
+    )
+    fig_bar.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(26,26,26,1)',
+        font=dict(color='#FFFFFF', size=14),
+        xaxis=dict(gridcolor='#333333'),
+        yaxis=dict(gridcolor='#333333')
+    )
+    
+    # Timeline: toàn bộ lịch sử từ bảng rollup (chi phí theo số bucket, không theo số bản ghi)
+    fig_timeline = None
+    timeline = get_database().get_timeline(granularity=granularity)
+    if timeline:
+        timeline_grouped = pd.DataFrame(timeline, columns=['Thời gian', 'Cảm xúc', 'Số lượng'])
+        timeline_grouped['Thời gian'] = pd.to_datetime(timeline_grouped['Thời gian'])
+        
+        fig_timeline = px.line(
+            timeline_grouped,
+            x='Thời gian',
+            y='Số lượng',
+            color='Cảm xúc',
+            color_discrete_map={
+                'POSITIVE': '#40FFF5',
+                'NEGATIVE': '#FF4040',
+                'NEUTRAL': '#FFFFFF'
+            }
+        )
+        fig_timeline.update_layout(
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(26,26,26,1)',
+            font=dict(color='#FFFFFF', size=14),
+            xaxis=dict(gridcolor='#333333'),
+            yaxis=dict(gridcolor='#333333')
+        )
+    
+    return {'pie': fig_pie, 'bar': fig_bar, 'timeline': fig_timeline}
+
 # Khởi tạo session state
 if 'db' not in st.session_state:
-    st.session_state.db = SentimentDatabase()
+    st.session_state.db = get_database()
 
 if 'selected_model' not in st.session_state:
     st.session_state.selected_model = "phobert"
 
-if 'analyzer' not in st.session_state or st.session_state.get('current_model') != st.session_state.selected_model:
+@st.cache_resource
+def get_model_registry() -> ModelRegistry:
+    """
+    Registry model dùng chung cho mọi session (mỗi model chỉ tải một lần)
+    
+    Giới hạn bộ nhớ trọng số đặt qua biến môi trường SENTIMENT_MODEL_BUDGET_MB
+    (mặc định không giới hạn, giữ cả hai model).
+    """
+    budget = os.environ.get('SENTIMENT_MODEL_BUDGET_MB')
+    return ModelRegistry(
+        memory_budget_mb=float(budget) if budget else None,
+        cache_path="data/prediction_cache.db",
+        instrument=True,
+        metrics=REGISTRY
+    )
+
+model_registry = get_model_registry()
+
+if st.session_state.selected_model not in model_registry.loaded_models():
     with st.spinner(f'Đang tải model {st.session_state.selected_model}...'):
-        st.session_state.analyzer = SentimentAnalyzer(model_name=st.session_state.selected_model)
-        st.session_state.current_model = st.session_state.selected_model
+        model_registry.get(st.session_state.selected_model)
 
 # Header
 st.markdown('''
@@ -242,7 +437,7 @@ with st.sidebar:
     st.markdown("---")
     
     # Thống kê
-    stats = st.session_state.db.get_statistics()
+    stats = load_statistics(st.session_state.db.get_generation())
     st.markdown('<h2 style="color: #40FFF5;">◆ THỐNG KÊ</h2>', unsafe_allow_html=True)
     col1, col2 = st.columns(2)
     with col1:
@@ -252,8 +447,23 @@ with st.sidebar:
         st.metric("◆ Tiêu cực", stats['negative'])
         st.metric("◆ Trung tính", stats['neutral'])
     
+    # Thời gian từng bước của analyze() (model đang chọn, từ lúc khởi động)
+    timings = model_registry.get(st.session_state.selected_model).timing_stats()
+    if timings and timings.get('total', {}).get('count'):
+        with st.expander(f"⏱ Thời gian xử lý ({timings['total']['count']} lần)"):
+            st.dataframe(
+                pd.DataFrame([
+                    {'Bước': stage, 'TB (ms)': t['mean_ms'], 'p50': t['p50_ms'],
+                     'p95': t['p95_ms'], 'p99': t['p99_ms']}
+                    for stage, t in timings.items()
+                ]).round(3),
+                hide_index=True,
+                use_container_width=True
+            )
+    
     if st.button("◆ XÓA LỊCH SỬ"):
         st.session_state.db.clear_history()
+        st.session_state.history_pages = 1
         st.success("✓ Đã xóa lịch sử!")
         st.rerun()
 
@@ -286,7 +496,8 @@ with tab1:
         else:
             with st.spinner('Đang phân tích...'):
                 # Phân tích
-                result = st.session_state.analyzer.analyze(text_input)
+                with model_registry.acquire(st.session_state.selected_model) as analyzer:
+                    result = analyzer.analyze(text_input)
                 
                 # Kiểm tra lỗi
                 if 'error' in result:
@@ -297,6 +508,7 @@ with tab1:
                         text=result['text'],
                         label=result['sentiment']
                     )
+                    ui_classifications.inc()
                     
                     # Hiển thị kết quả
                     sentiment = result['sentiment']
@@ -364,14 +576,37 @@ with tab1:
 with tab2:
     st.markdown('<h2 style="color: #40FFF5; text-align: center;">◈ LỊCH SỬ PHÂN LOẠI ◈</h2>', unsafe_allow_html=True)
     
-    history = st.session_state.db.get_history(limit=50)
+    # Tìm kiếm toàn văn (FTS5), mặc định không phân biệt dấu
+    col_query, col_label, col_accent = st.columns([3, 1, 1])
+    with col_query:
+        search_query = st.text_input(
+            "◆ Tìm kiếm", placeholder='VD: giao hang nhanh, "chất lượng kém", ngo*'
+        ).strip()
+    with col_label:
+        # Lọc theo nhãn chỉ áp dụng cho kết quả tìm kiếm
+        search_label = st.selectbox(
+            "◆ Cảm xúc", ["TẤT CẢ", "POSITIVE", "NEUTRAL", "NEGATIVE"], disabled=not search_query
+        )
+    with col_accent:
+        st.markdown("<br>", unsafe_allow_html=True)
+        match_diacritics = st.checkbox("Phân biệt dấu")
+    search_sentiment = None if search_label == "TẤT CẢ" or not search_query else search_label
+    
+    # Keyset pagination: mỗi lần "Tải thêm" đọc thêm một trang 50 bản ghi,
+    # đổi điều kiện tìm kiếm thì quay lại trang đầu
+    search_key = (search_query, search_sentiment, match_diacritics)
+    if 'history_pages' not in st.session_state or st.session_state.get('history_search') != search_key:
+        st.session_state.history_pages = 1
+        st.session_state.history_search = search_key
+    
+    df, has_more, total_count = load_history(
+        st.session_state.db.get_generation(), st.session_state.history_pages,
+        search_query, search_sentiment, match_diacritics
+    )
     
-    if not history:
-        st.info("◆ Chưa có lịch sử phân loại nào.")
+    if df.empty:
+        st.info("◆ Không tìm thấy bản ghi phù hợp." if search_query else "◆ Chưa có lịch sử phân loại nào.")
     else:
-        # Chuyển sang DataFrame
-        df = pd.DataFrame(history, columns=['ID', 'Câu văn', 'Cảm xúc', 'Thời gian'])
-        
         # Hiển thị bảng
         st.dataframe(
             df,
@@ -385,117 +620,80 @@ with tab2:
             }
         )
         
-        total_count = st.session_state.db.get_total_count()
-        if total_count > 50:
-            st.info(f"◆ Hiển thị 50/{total_count} bản ghi mới nhất")
+        if search_query:
+            st.info(f"◆ Hiển thị {len(df)} kết quả mới nhất" + (" (còn nữa)" if has_more else ""))
+        elif total_count > len(df):
+            st.info(f"◆ Hiển thị {len(df)}/{total_count} bản ghi mới nhất")
         
-        # Download CSV
-        csv = df.to_csv(index=False, encoding='utf-8-sig')
-        st.download_button(
-            label="◆ TẢI CSV",
-            data=csv,
-            file_name=f"history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        if has_more:
+            if st.button("◆ TẢI THÊM"):
+                st.session_state.history_pages += 1
+                st.rerun()
+        
+    # Xuất toàn bộ lịch sử (không chỉ các dòng đang hiển thị): database ghi
+    # ra file tạm theo từng chunk, nút tải đọc từ file đó
+    with st.expander("◆ XUẤT TOÀN BỘ LỊCH SỬ"):
+        col_format, col_export_label, col_range = st.columns([1, 1, 2])
+        with col_format:
+            export_format = st.selectbox("◆ Định dạng", ["csv", "jsonl", "parquet"])
+        with col_export_label:
+            export_label = st.selectbox(
+                "◆ Cảm xúc", ["TẤT CẢ", "POSITIVE", "NEUTRAL", "NEGATIVE"], key="export_label"
+            )
+        with col_range:
+            export_range = st.date_input("◆ Khoảng ngày", value=(), format="YYYY-MM-DD")
+        
+        if st.button("◆ CHUẨN BỊ FILE"):
+            start = datetime.combine(export_range[0], datetime.min.time()) if export_range else None
+            end = datetime.combine(export_range[-1], datetime.max.time()) if export_range else None
+            try:
+                path, count = prepare_export(
+                    export_format, None if export_label == "TẤT CẢ" else export_label, start, end
+                )
+                st.session_state.export_file = (path, export_format, count)
+            except (ImportError, ValueError) as e:
+                st.error(f"✗ {e}")
+        
+        if 'export_file' in st.session_state and os.path.exists(st.session_state.export_file[0]):
+            path, fmt, count = st.session_state.export_file
+            with open(path, 'rb') as export_file:
+                st.download_button(
+                    label=f"◆ TẢI {fmt.upper()} ({count} bản ghi)",
+                    data=export_file,
+                    file_name=f"history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}",
+                    mime=EXPORT_MIME[fmt]
+                )
 
 # Tab 3: Biểu đồ
 with tab3:
     st.markdown('<h2 style="color: #40FFF5; text-align: center;">◈ BIỂU ĐỒ THỐNG KÊ ◈</h2>', unsafe_allow_html=True)
     
-    stats = st.session_state.db.get_statistics()
+    generation = st.session_state.db.get_generation()
+    stats = load_statistics(generation)
     
     if stats['total'] == 0:
         st.info("◆ Chưa có dữ liệu để hiển thị biểu đồ.")
     else:
+        granularity = st.radio(
+            "◆ Xu hướng theo:",
+            options=['hour', 'day'],
+            format_func=lambda x: "Giờ" if x == 'hour' else "Ngày",
+            horizontal=True
+        )
+        charts = build_charts(generation, granularity)
         col1, col2 = st.columns(2)
         
         with col1:
-            # Pie chart
             st.markdown('<h3 style="color: #40FFF5;">◆ Phân bố cảm xúc</h3>', unsafe_allow_html=True)
-            pie_data = pd.DataFrame({
-                'Cảm xúc': ['Tích cực', 'Tiêu cực', 'Trung tính'],
-                'Số lượng': [stats['positive'], stats['negative'], stats['neutral']],
-                'Emoji': ['◆', '◆', '◆']
-            })
-            
-            fig_pie = px.pie(
-                pie_data, 
-                values='Số lượng', 
-                names='Cảm xúc',
-                color='Cảm xúc',
-                color_discrete_map={
-                    'Tích cực': '#40FFF5',
-                    'Tiêu cực': '#FF4040',
-                    'Trung tính': '#FFFFFF'
-                }
-            )
-            fig_pie.update_layout(
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#FFFFFF', size=14)
-            )
-            st.plotly_chart(fig_pie, use_container_width=True)
+            st.plotly_chart(charts['pie'], use_container_width=True)
         
         with col2:
-            # Bar chart
             st.markdown('<h3 style="color: #40FFF5;">◆ Số lượng theo loại</h3>', unsafe_allow_html=True)
-            bar_data = pd.DataFrame({
-                'Cảm xúc': ['◆ Tích cực', '◆ Tiêu cực', '◆ Trung tính'],
-                'Số lượng': [stats['positive'], stats['negative'], stats['neutral']]
-            })
-            
-            fig_bar = px.bar(
-                bar_data,
-                x='Cảm xúc',
-                y='Số lượng',
-                color='Cảm xúc',
-                color_discrete_map={
-                    '◆ Tích cực': '#40FFF5',
-                    '◆ Tiêu cực': '#FF4040',
-                    '◆ Trung tính': '#FFFFFF'
-                }
-            )
-            fig_bar.update_layout(
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(26,26,26,1)',
-                font=dict(color='#FFFFFF', size=14),
-                xaxis=dict(gridcolor='#333333'),
-                yaxis=dict(gridcolor='#333333')
-            )
-            st.plotly_chart(fig_bar, use_container_width=True)
+            st.plotly_chart(charts['bar'], use_container_width=True)
         
-        # Timeline
         st.markdown('<h3 style="color: #40FFF5;">◆ Xu hướng theo thời gian</h3>', unsafe_allow_html=True)
-        history = st.session_state.db.get_history(limit=100)
-        if history:
-            timeline_df = pd.DataFrame(history, columns=['ID', 'Câu văn', 'Cảm xúc', 'Thời gian'])
-            timeline_df['Thời gian'] = pd.to_datetime(timeline_df['Thời gian'])
-            
-            # Group by time and sentiment
-            timeline_grouped = timeline_df.groupby([
-                pd.Grouper(key='Thời gian', freq='H'),
-                'Cảm xúc'
-            ]).size().reset_index(name='Số lượng')
-            
-            fig_timeline = px.line(
-                timeline_grouped,
-                x='Thời gian',
-                y='Số lượng',
-                color='Cảm xúc',
-                color_discrete_map={
-                    'POSITIVE': '#40FFF5',
-                    'NEGATIVE': '#FF4040',
-                    'NEUTRAL': '#FFFFFF'
-                }
-            )
-            fig_timeline.update_layout(
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(26,26,26,1)',
-                font=dict(color='#FFFFFF', size=14),
-                xaxis=dict(gridcolor='#333333'),
-                yaxis=dict(gridcolor='#333333')
-            )
-            st.plotly_chart(fig_timeline, use_container_width=True)
+        if charts['timeline'] is not None:
+            st.plotly_chart(charts['timeline'], use_container_width=True)
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,210 @@
+"""
+Phân loại hàng loạt file lớn bằng nhiều process
+
+Đọc CSV, JSONL hoặc văn bản thuần (mỗi dòng một câu) từ file hoặc stdin theo
+từng chunk, phân phối cho một pool process (mỗi process một SentimentAnalyzer,
+số thread torch cố định để không tranh chấp CPU) và trả kết quả theo đúng thứ
+tự đầu vào. Số chunk đang xử lý bị giới hạn nên bộ nhớ không tăng theo kích
+thước file.
+"""
+
+import contextlib
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, TextIO
+
+# Analyzer riêng của mỗi worker process
+_worker_analyzer = None
+
+def detect_format(path: str) -> str:
+    """Đoán định dạng đầu vào theo phần mở rộng file ('-' là văn bản thuần)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    return 'text'
+
+
+def read_texts(stream: TextIO, fmt: str = 'text', field: str = 'text') -> Iterator[str]:
+    """
+    Đọc lần lượt từng câu từ stream
+
+    Args:
+        stream: File văn bản đang mở
+        fmt: 'text', 'csv' hoặc 'jsonl'
+        field: Tên cột (CSV) hoặc khóa (JSONL) chứa câu văn
+
+    Yields:
+        Câu văn (bỏ qua dòng trống)
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            text = row.get(field)
+            if text and text.strip():
+                yield text
+    elif fmt == 'jsonl':
+        for line in stream:
+            if not line.strip():
+                continue
+            text = json.loads(line).get(field)
+            if isinstance(text, str) and text.strip():
+                yield text
+    else:
+        for line in stream:
+            line = line.rstrip('\r\n')
+            if line.strip():
+                yield line
+
+
+def _init_worker(model_name: str, threads: int, analyzer_kwargs: Dict, in_process: bool = False):
+    """
+    Khởi tạo worker: giới hạn thread torch và tải model một lần
+
+    Với in_process (workers <= 1) không đổi biến môi trường hay stdout của
+    process gọi; số thread torch do _pinned_threads đặt tạm rồi trả lại.
+    """
+    global _worker_analyzer
+
+    if not in_process:
+        threads = str(max(threads, 1))
+        for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ[var] = threads
+        # Thông báo của model không được lẫn vào JSONL trên stdout
+        sys.stdout = sys.stderr
+
+        try:
+            import torch
+            torch.set_num_threads(int(threads))
+            torch.set_num_interop_threads(1)
+        except (ImportError, RuntimeError):
+            pass
+
+    try:
+        from .sentiment_analyzer import SentimentAnalyzer
+    except ImportError:
+        from sentiment_analyzer import SentimentAnalyzer
+    with contextlib.redirect_stdout(sys.stderr):
+        _worker_analyzer = SentimentAnalyzer(model_name=model_name, lazy=False, **analyzer_kwargs)
+
+
+@contextlib.contextmanager
+def _pinned_threads(threads: int):
+    """Tạm đặt số thread torch của process hiện tại, trả lại giá trị cũ khi xong"""
+    try:
+        import torch
+    except ImportError:
+        yield
+        return
+    previous = torch.get_num_threads()
+    torch.set_num_threads(max(threads, 1))
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+
+def _score_chunk(texts: List[str]) -> List[Dict]:
+    return _worker_analyzer.batch_analyze(texts)
+
+
+def _chunks(texts: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(texts)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def score_stream(texts: Iterable[str], model_name: str = "phobert", workers: int = None,
+                 threads_per_worker: int = 1, chunk_size: int = 256,
+                 max_pending: int = None, **analyzer_kwargs) -> Iterator[List[Dict]]:
+    """
+    Phân loại một luồng câu bằng pool process, trả kết quả theo thứ tự đầu vào
+
+    Args:
+        texts: Iterable các câu (được đọc dần, không nạp hết vào bộ nhớ)
+        model_name: Tên model
+        workers: Số process (mặc định: số CPU / threads_per_worker)
+        threads_per_worker: Số thread torch mỗi process
+        chunk_size: Số câu mỗi chunk gửi cho một worker
+        max_pending: Số chunk tối đa đang xử lý cùng lúc (mặc định 2 × workers)
+        **analyzer_kwargs: Tham số thêm cho SentimentAnalyzer
+
+    Yields:
+        Danh sách kết quả của từng chunk, theo đúng thứ tự
+    """
+    if workers is None:
+        workers = max((os.cpu_count() or 1) // max(threads_per_worker, 1), 1)
+    if max_pending is None:
+        max_pending = 2 * workers
+
+    chunks = _chunks(texts, chunk_size)
+
+    if workers <= 1:
+        _init_worker(model_name, threads_per_worker, analyzer_kwargs, in_process=True)
+        with _pinned_threads(threads_per_worker):
+            for chunk in chunks:
+                with contextlib.redirect_stdout(sys.stderr):
+                    results = _score_chunk(chunk)
+                yield results
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(model_name, threads_per_worker, analyzer_kwargs),
+    ) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_score_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def run_batch(input_path: str = '-', output_path: str = '-', fmt: str = None, field: str = 'text',
+              model_name: str = "phobert", workers: int = None, threads_per_worker: int = 1,
+              chunk_size: int = 256, db=None) -> int:
+    """
+    Phân loại file/stdin và ghi kết quả JSONL (tùy chọn lưu vào database)
+
+    Args:
+        input_path: File đầu vào hoặc '-' cho stdin
+        output_path: File JSONL đầu ra hoặc '-' cho stdout
+        fmt: 'text', 'csv', 'jsonl' (None: đoán theo phần mở rộng)
+        field: Cột/khóa chứa câu văn với CSV/JSONL
+        model_name: Tên model
+        workers: Số process
+        threads_per_worker: Số thread torch mỗi process
+        chunk_size: Số câu mỗi chunk
+        db: SentimentDatabase để lưu hàng loạt kết quả, None để không lưu
+
+    Returns:
+        Số câu đã phân loại
+    """
+    fmt = fmt or detect_format(input_path)
+    source = sys.stdin if input_path == '-' else open(input_path, encoding='utf-8', newline='')
+    sink = sys.stdout if output_path == '-' else open(output_path, 'w', encoding='utf-8')
+    count = 0
+    try:
+        texts = read_texts(source, fmt, field)
+        for results in score_stream(texts, model_name, workers, threads_per_worker, chunk_size):
+            sink.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in results))
+            if db is not None:
+                db.save_classifications(results)
+            count += len(results)
+        sink.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    return count
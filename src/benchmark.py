@@ -0,0 +1,420 @@
+"""
+Đo hiệu năng các bước xử lý
+
+Chạy: python src/benchmark.py [--size 10000] [--tokenizer vinai/phobert-base-v2] [--startup]
+      python src/benchmark.py --quantization phobert [--size 200]
+      python src/benchmark.py --suite [--sizes 100,1000,10000] [--model stub]
+                              [--output bench.json] [--baseline baseline.json]
+"""
+
+import argparse
+import copy
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from database import SentimentDatabase
+from sentiment_analyzer import SentimentAnalyzer, TextPreprocessor
+
+# Câu mẫu lấy từ bộ test case chuẩn
+SAMPLE_TEXTS = [
+    "Hôm nay tôi rất vui",
+    "Món ăn này dở quá",
+    "Thời tiết bình thường",
+    "Rất vui hôm nay",
+    "Công việc ổn định",
+    "Phim này hay lắm",
+    "Tôi buồn vì thất bại",
+    "Ngày mai đi học",
+    "Cảm ơn bạn rất nhiều",
+    "Mệt mỏi quá hôm nay",
+]
+
+
+def make_corpus(size: int, seed: int = 0, keywords: list = None) -> list:
+    """
+    Sinh corpus tiếng Việt bằng cách ghép ngẫu nhiên các câu mẫu
+
+    Args:
+        size: Số câu cần sinh
+        seed: Seed cho random
+        keywords: Từ khóa cảm xúc để sinh thêm cụm câu (VD: positive_keywords)
+
+    Returns:
+        Danh sách câu văn
+    """
+    rng = random.Random(seed)
+    pieces = SAMPLE_TEXTS + [f"Thấy {keyword} lắm" for keyword in keywords or []]
+    return [
+        " ".join(rng.choice(pieces) for _ in range(rng.randint(1, 3))) + rng.choice(["", "!", "...", " :)"])
+        for _ in range(size)
+    ]
+
+
+def time_per_text(func, texts: list) -> float:
+    """Thời gian trung bình (micro giây) cho mỗi câu"""
+    start = time.perf_counter()
+    func(texts)
+    return (time.perf_counter() - start) / max(len(texts), 1) * 1e6
+
+
+def bench_preprocess(texts: list, tokenizer_name: str = None) -> dict:
+    """
+    So sánh chi phí tiền xử lý với chi phí tokenization
+
+    Args:
+        texts: Corpus cần đo
+        tokenizer_name: Tên tokenizer HuggingFace (tùy chọn)
+
+    Returns:
+        Dictionary thời gian micro giây/câu cho từng bước
+    """
+    preprocessor = TextPreprocessor()
+    results = {'preprocess_us': time_per_text(preprocessor.batch, texts)}
+
+    if tokenizer_name:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+        processed = preprocessor.batch(texts)
+        results['tokenize_us'] = time_per_text(tokenizer, processed)
+
+    return results
+
+
+def bench_startup(repeat: int = 3) -> dict:
+    """
+    Đo thời gian khởi động (process mới) của các lệnh nhẹ so với import torch
+
+    Args:
+        repeat: Số lần chạy mỗi lệnh, lấy thời gian nhỏ nhất
+
+    Returns:
+        Dictionary thời gian (giây) cho từng lệnh
+    """
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    commands = {
+        'import_src': [sys.executable, '-c', 'import src; src.SentimentDatabase'],
+        'cli_stats': [sys.executable, os.path.join(src_dir, 'main.py'), 'stats'],
+        'import_torch_transformers': [sys.executable, '-c', 'import torch, transformers'],
+    }
+
+    results = {}
+    for name, command in commands.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            completed = subprocess.run(command, cwd=os.path.dirname(src_dir), capture_output=True)
+            elapsed = time.perf_counter() - start
+            if completed.returncode != 0:
+                best = None
+                break
+            best = elapsed if best is None else min(best, elapsed)
+        results[name + '_s'] = best
+    return results
+
+
+def bench_quantization(texts: list, model_name: str = "phobert") -> dict:
+    """
+    So sánh model fp32 và int8: bộ nhớ trọng số, độ trễ và tỉ lệ trùng nhãn
+
+    Args:
+        texts: Corpus cần đo
+        model_name: Tên model ('phobert' hoặc 'distilbert')
+
+    Returns:
+        Dictionary {fp32: {...}, int8: {...}, label_agreement}
+    """
+    from transformers import pipeline
+    from quantization import model_size_bytes, quantize_model
+
+    # Tắt cache để mọi câu đều chạy qua model
+    fp32 = SentimentAnalyzer(model_name=model_name, cache_size=0, lazy=False)
+    int8 = SentimentAnalyzer(model_name=model_name, cache_size=0, quantize=True)
+    # Lượng tử hóa bản sao của chính model fp32: lớp phân loại của model gốc
+    # được khởi tạo ngẫu nhiên mỗi lần tải, hai lần tải riêng không so sánh được
+    int8.model = pipeline(
+        "sentiment-analysis",
+        model=quantize_model(copy.deepcopy(fp32.model.model).cpu()),
+        tokenizer=fp32.model.tokenizer,
+        device=-1,
+    )
+    int8.loaded_model_name = fp32.loaded_model_name
+
+    results = {}
+    labels = {}
+    for precision, analyzer in (("fp32", fp32), ("int8", int8)):
+        analyzer.batch_analyze(texts[:8])  # warm-up
+        start = time.perf_counter()
+        outputs = analyzer.batch_analyze(texts)
+        elapsed = time.perf_counter() - start
+        labels[precision] = [r['sentiment'] for r in outputs]
+        results[precision] = {
+            'model_mb': model_size_bytes(analyzer.model.model) / 1024 / 1024,
+            'latency_ms_per_text': elapsed / len(texts) * 1000,
+        }
+
+    agree = sum(a == b for a, b in zip(labels['fp32'], labels['int8']))
+    results['label_agreement'] = agree / len(texts)
+    return results
+
+
+class StandInPipeline:
+    """
+    Model thay thế nhỏ, chạy cục bộ không cần tải trọng số
+
+    Bộ phân loại tuyến tính trên từ đã băm, trả kết quả cùng format với
+    transformers.pipeline("sentiment-analysis"). Dùng để đo chi phí của các
+    bước bao quanh model khi không có trọng số thật (VD: máy offline).
+    """
+
+    LABELS = ('LABEL_0', 'LABEL_1', 'LABEL_2')
+    tokenizer = None
+
+    def __init__(self, buckets: int = 4096):
+        rng = random.Random(0)
+        self.buckets = buckets
+        self.weights = [[rng.uniform(-1, 1) for _ in self.LABELS] for _ in range(buckets)]
+
+    def _classify(self, text: str) -> dict:
+        logits = [0.0] * len(self.LABELS)
+        for word in text.lower().split():
+            row = self.weights[zlib.crc32(word.encode('utf-8')) % self.buckets]
+            for k, w in enumerate(row):
+                logits[k] += w
+        top = max(logits)
+        exps = [math.exp(v - top) for v in logits]
+        best = exps.index(max(exps))
+        return {'label': self.LABELS[best], 'score': exps[best] / sum(exps)}
+
+    def __call__(self, texts, batch_size: int = None, **kwargs) -> list:
+        if isinstance(texts, str):
+            texts = [texts]
+        return [self._classify(text) for text in texts]
+
+
+def latency_stats(samples: list, items: int, total: float) -> dict:
+    """
+    Tổng hợp độ trễ của các lần gọi
+
+    Args:
+        samples: Thời gian (giây) của từng lần gọi
+        items: Tổng số câu/bản ghi đã xử lý
+        total: Tổng thời gian (giây)
+
+    Returns:
+        Dictionary {calls, items, throughput_per_s, p50_ms, p95_ms, p99_ms}
+    """
+    ordered = sorted(samples)
+
+    def pct(q: float) -> float:
+        # Phân vị theo thứ hạng gần nhất
+        return ordered[min(max(math.ceil(q * len(ordered)) - 1, 0), len(ordered) - 1)] * 1000
+
+    return {
+        'calls': len(samples),
+        'items': items,
+        'throughput_per_s': items / total if total > 0 else None,
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+    }
+
+
+def measure(func, calls: list, items: int = None) -> dict:
+    """
+    Gọi func với từng tham số trong calls và đo độ trễ mỗi lần gọi
+
+    Args:
+        items: Tổng số câu/bản ghi được xử lý (mặc định mỗi lần gọi một câu)
+    """
+    samples = []
+    clock = time.perf_counter
+    start = clock()
+    for arg in calls:
+        t0 = clock()
+        func(arg)
+        samples.append(clock() - t0)
+    total = clock() - start
+    return latency_stats(samples, len(calls) if items is None else items, total)
+
+
+def make_analyzer(model: str = "stub") -> SentimentAnalyzer:
+    """Analyzer không cache (mọi câu chạy qua model), model thật hoặc StandInPipeline"""
+    if model == "stub":
+        analyzer = SentimentAnalyzer(cache_size=0)
+        analyzer.model = StandInPipeline()
+    else:
+        analyzer = SentimentAnalyzer(model_name=model, cache_size=0, lazy=False)
+    return analyzer
+
+
+def bench_stages(size: int, analyzer: SentimentAnalyzer, batch_size: int = 32,
+                 read_calls: int = 200, seed: int = 0) -> dict:
+    """
+    Đo throughput và p50/p95/p99 của từng bước trên corpus size câu
+
+    Các bước: preprocess, keyword (đếm từ khóa), inference (model từng câu),
+    batch_analyze (theo batch), save_classification (từng bản ghi, database
+    tạm), get_history và get_statistics (database đã có size bản ghi).
+
+    Returns:
+        Dictionary {tên bước: latency_stats}
+    """
+    keywords = analyzer.positive_keywords + analyzer.negative_keywords + analyzer.neutral_keywords
+    texts = make_corpus(size, seed, keywords)
+    processed = analyzer.batch_preprocess(texts)
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    results = {
+        'preprocess': measure(analyzer.preprocess, texts),
+        'keyword': measure(analyzer._keyword_scores, texts),
+        'inference': measure(analyzer.model, processed),
+    }
+    results['batch_analyze'] = measure(analyzer.batch_analyze, batches, len(texts))
+
+    labels = ('POSITIVE', 'NEGATIVE', 'NEUTRAL')
+    with tempfile.TemporaryDirectory() as tmp:
+        with SentimentDatabase(os.path.join(tmp, 'bench.db')) as db:
+            rows = [(text, labels[i % 3]) for i, text in enumerate(texts)]
+            results['save_classification'] = measure(lambda row: db.save_classification(*row), rows)
+            results['get_history'] = measure(lambda _: db.get_history(limit=50), range(read_calls))
+            results['get_statistics'] = measure(lambda _: db.get_statistics(), range(read_calls))
+
+    return results
+
+
+def run_suite(sizes: list, model: str = "stub", batch_size: int = 32) -> dict:
+    """
+    Chạy bộ benchmark ở nhiều kích thước dữ liệu
+
+    Returns:
+        Dictionary có thể ghi JSON {meta, results: {kích thước: {bước: số liệu}}}
+    """
+    analyzer = make_analyzer(model)
+    analyzer.batch_analyze(SAMPLE_TEXTS)  # warm-up
+    return {
+        'meta': {
+            'model': model,
+            'batch_size': batch_size,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': {str(size): bench_stages(size, analyzer, batch_size) for size in sizes},
+    }
+
+
+def compare_to_baseline(current: dict, baseline: dict, threshold: float = 0.10) -> list:
+    """
+    So sánh kết quả với baseline đã lưu
+
+    Args:
+        current: Kết quả của run_suite()
+        baseline: Kết quả run_suite() trước đó (đọc từ JSON)
+        threshold: Tỉ lệ chậm đi tối đa được chấp nhận (0.10 = 10%)
+
+    Returns:
+        Danh sách (kích thước, bước, chỉ số, baseline, hiện tại, tỉ lệ, hồi quy?)
+    """
+    rows = []
+    for size, stages in current['results'].items():
+        for stage, stats in stages.items():
+            base = baseline.get('results', {}).get(size, {}).get(stage)
+            if not base:
+                continue
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_per_s'):
+                old, new = base.get(metric), stats.get(metric)
+                if not old or new is None:
+                    continue
+                ratio = new / old
+                # Độ trễ tăng hoặc throughput giảm quá ngưỡng là hồi quy
+                if metric == 'throughput_per_s':
+                    regressed = ratio < 1 / (1 + threshold)
+                else:
+                    regressed = ratio > 1 + threshold
+                rows.append((size, stage, metric, old, new, ratio, regressed))
+    return rows
+
+
+def print_suite(report: dict):
+    for size, stages in report['results'].items():
+        print(f"\n◆ {size} câu (model: {report['meta']['model']})")
+        print(f"  {'Bước':<20} {'câu/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+        for stage, r in stages.items():
+            throughput = f"{r['throughput_per_s']:.0f}" if r['throughput_per_s'] else '-'
+            print(f"  {stage:<20} {throughput:>12} {r['p50_ms']:>10.4f} {r['p95_ms']:>10.4f} {r['p99_ms']:>10.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo hiệu năng tiền xử lý")
+    parser.add_argument("--size", type=int, default=10000, help="Số câu trong corpus")
+    parser.add_argument("--tokenizer", default=None, help="Tokenizer để so sánh (VD: vinai/phobert-base-v2)")
+    parser.add_argument("--startup", action="store_true", help="Đo thời gian khởi động CLI và import package")
+    parser.add_argument("--quantization", metavar="MODEL", default=None,
+                        help="So sánh fp32 và int8 cho model (phobert hoặc distilbert)")
+    parser.add_argument("--suite", action="store_true", help="Đo p50/p95/p99 từng bước ở nhiều kích thước")
+    parser.add_argument("--sizes", default="100,1000,10000", help="Các kích thước corpus, cách nhau bởi dấu phẩy")
+    parser.add_argument("--model", default="stub", choices=["stub", "phobert", "distilbert"],
+                        help="Model cho bước suy luận (stub: model thay thế cục bộ)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--output", default=None, help="Ghi kết quả JSON ra file")
+    parser.add_argument("--baseline", default=None, help="File JSON kết quả cũ để so sánh")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Ngưỡng hồi quy (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    if args.suite:
+        sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+        report = run_suite(sizes, args.model, args.batch_size)
+        print_suite(report)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"\n✓ Đã ghi kết quả vào {args.output}")
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                rows = compare_to_baseline(report, json.load(f), args.threshold)
+            regressions = [row for row in rows if row[6]]
+            print(f"\n◆ So sánh với {args.baseline}: {len(regressions)}/{len(rows)} chỉ số hồi quy")
+            for size, stage, metric, old, new, ratio, regressed in rows:
+                if regressed:
+                    print(f"  ✗ {size:>6} {stage:<20} {metric:<16} {old:.4f} → {new:.4f} ({ratio:.2f}x)")
+            print()
+            if regressions:
+                sys.exit(1)
+        print()
+        return
+
+    if args.quantization:
+        results = bench_quantization(make_corpus(args.size), args.quantization)
+        print(f"\n◆ Lượng tử hóa {args.quantization} ({args.size} câu):")
+        for precision in ("fp32", "int8"):
+            r = results[precision]
+            print(f"  {precision}: {r['model_mb']:.1f} MB | {r['latency_ms_per_text']:.2f} ms/câu")
+        print(f"  Tỉ lệ trùng nhãn: {results['label_agreement']:.2%}\n")
+        return
+
+    if args.startup:
+        print("\n◆ Thời gian khởi động:")
+        for name, value in bench_startup().items():
+            print(f"  {name}: {'không chạy được' if value is None else f'{value:.3f} s'}")
+        print()
+        return
+
+    texts = make_corpus(args.size)
+    results = bench_preprocess(texts, args.tokenizer)
+
+    print(f"\n◆ Corpus: {len(texts)} câu")
+    for name, value in results.items():
+        print(f"  {name}: {value:.2f} µs/câu")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Fixture dùng chung cho các test của SentimentDatabase
+"""
+
+import pytest
+
+from database import SentimentDatabase
+
+@pytest.fixture
+def make_db(tmp_path):
+    """
+    Factory tạo SentimentDatabase trong thư mục tạm của pytest
+
+    Mỗi lần gọi dùng một thư mục con riêng; mọi database được đóng khi test
+    kết thúc, thư mục tạm do pytest dọn.
+
+    Args (của factory):
+        rows: Các bản ghi (text, sentiment, timestamp) chèn sẵn, None nếu không cần
+        name: Tên file database
+        **kwargs: Tham số truyền cho SentimentDatabase (VD: compact=True)
+    """
+    created = []
+
+    def factory(rows=None, name: str = "history.db", **kwargs) -> SentimentDatabase:
+        directory = tmp_path / f"db{len(created)}"
+        directory.mkdir()
+        db = SentimentDatabase(str(directory / name), **kwargs)
+        created.append(db)
+        if rows:
+            db._insert_rows(rows)
+        return db
+
+    yield factory
+    for db in created:
+        db.close()
@@ -1,46 +1,585 @@
+import hashlib
+import re
 import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Tuple
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
 import os
 
+try:
+    from .history_export import export_chunks
+    from .write_behind import WriteBehindQueue
+except ImportError:
+    from history_export import export_chunks
+    from write_behind import WriteBehindQueue
+
+# Bảng rollup theo thời gian: độ chi tiết -> (tên bảng, biểu thức bucket từ timestamp)
+ROLLUPS = {
+    'hour': ('sentiment_rollup_hourly', "substr({ts}, 1, 13) || ':00:00'"),
+    'day': ('sentiment_rollup_daily', "substr({ts}, 1, 10)"),
+}
+
+def _rollup_triggers(table: str, bucket: str, source: str = 'sentiments',
+                     timestamp: str = '{row}.timestamp', sentiment: str = '{row}.sentiment',
+                     columns: str = 'sentiment, timestamp') -> List[str]:
+    """
+    Trigger cập nhật tăng dần một bảng rollup khi bảng nguồn thay đổi
+    
+    Trigger dùng UPSERT (SQLite ≥ 3.24) để mỗi bản ghi chỉ tốn một câu lệnh
+    cho mỗi bảng rollup. timestamp/sentiment là biểu thức của dòng ({row} là
+    NEW hoặc OLD) trả về timestamp dạng chuỗi và nhãn.
+    """
+    new_bucket = bucket.format(ts=timestamp.format(row='NEW'))
+    old_bucket = bucket.format(ts=timestamp.format(row='OLD'))
+    new_label, old_label = sentiment.format(row='NEW'), sentiment.format(row='OLD')
+    add = f"""
+            INSERT INTO {table} (bucket, sentiment, count) VALUES ({new_bucket}, {new_label}, 1)
+                ON CONFLICT (bucket, sentiment) DO UPDATE SET count = count + 1;"""
+    remove = f"""
+            UPDATE {table} SET count = count - 1 WHERE bucket = {old_bucket} AND sentiment = {old_label};
+            DELETE FROM {table} WHERE bucket = {old_bucket} AND sentiment = {old_label} AND count <= 0;"""
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_insert AFTER INSERT ON {source} BEGIN{add}\n        END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_delete AFTER DELETE ON {source} BEGIN{remove}\n        END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_update AFTER UPDATE OF {columns} ON {source} "
+        f"BEGIN{remove}{add}\n        END",
+    ]
+
+
+def _rollup_migration(table: str, bucket: str) -> List[str]:
+    """Câu lệnh tạo bảng rollup, trigger cập nhật tăng dần và backfill"""
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            bucket TEXT NOT NULL,
+            sentiment TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (bucket, sentiment)
+        ) WITHOUT ROWID
+        """,
+        *_rollup_triggers(table, bucket),
+        f"DELETE FROM {table}",
+        f"INSERT INTO {table} (bucket, sentiment, count) "
+        f"SELECT {bucket.format(ts='timestamp')}, sentiment, COUNT(*) FROM sentiments GROUP BY 1, 2",
+    ]
+
+
+def text_hash(text: str) -> bytes:
+    """Khóa nội dung của câu văn (BLAKE2b 16 byte) cho bảng history_texts"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+# Dấu thanh/dấu mũ sau khi tách tổ hợp (NFD); 'đ' không tách được nên thay riêng
+_COMBINING_MARKS = re.compile('[\u0300-\u036f]')
+_D_STROKE = str.maketrans('đĐ', 'dD')
+
+
+def remove_diacritics(text: str) -> str:
+    """Bỏ dấu tiếng Việt (VD: 'Đồ ăn ngon' -> 'Do an ngon') cho tìm kiếm không dấu"""
+    return _COMBINING_MARKS.sub('', unicodedata.normalize('NFD', text)).translate(_D_STROKE)
+
+
+# Chỉ mục FTS5: bảng -> (tokenizer, biểu thức nội dung từ cột {text}). Bảng
+# không dấu dùng tokenizer bỏ dấu thanh/dấu mũ, riêng 'đ' không tách được nên
+# thay bằng replace(); trigger chỉ dùng SQL thuần nên mọi kết nối đều ghi được
+FTS_INDEXES = {
+    'history_fts': ("unicode61 remove_diacritics 0", "{text}"),
+    'history_fts_folded': ("unicode61 remove_diacritics 2", "replace(replace({text}, 'đ', 'd'), 'Đ', 'D')"),
+}
+
+
+def _fts_migration(compact: bool) -> List[str]:
+    """
+    Chỉ mục FTS5 cho tìm kiếm lịch sử, đồng bộ bằng trigger
+    
+    history_fts giữ nguyên dấu, history_fts_folded đã bỏ dấu. Bảng contentless
+    nên chỉ lưu chỉ mục; khi xóa phải truyền lại đúng nội dung cũ. Schema cũ
+    đánh chỉ mục từng bản ghi (rowid = sentiments.id), schema gọn đánh chỉ mục
+    mỗi câu văn một lần (rowid = history_texts.id).
+    """
+    source = 'history_texts' if compact else 'sentiments'
+    statements, add, remove, backfill = [], [], [], []
+    for table, (tokenizer, content) in FTS_INDEXES.items():
+        statements.append(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(text, content='', tokenize='{tokenizer}')"
+        )
+        add.append(f"INSERT INTO {table} (rowid, text) VALUES (NEW.id, {content.format(text='NEW.text')});")
+        remove.append(
+            f"INSERT INTO {table} ({table}, rowid, text) VALUES ('delete', OLD.id, {content.format(text='OLD.text')});"
+        )
+        backfill.append(f"INSERT INTO {table} (rowid, text) SELECT id, {content.format(text='text')} FROM {source}")
+    add, remove = ' '.join(add), ' '.join(remove)
+    statements += [
+        f"CREATE TRIGGER IF NOT EXISTS trg_history_fts_insert AFTER INSERT ON {source} BEGIN {add} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_history_fts_delete AFTER DELETE ON {source} BEGIN {remove} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_history_fts_update AFTER UPDATE OF text ON {source} "
+        f"BEGIN {remove} {add} END",
+        *backfill,
+    ]
+    if compact:
+        # Tìm bản ghi theo các câu văn khớp
+        statements.append("CREATE INDEX IF NOT EXISTS idx_history_entries_text_id ON history_entries (text_id)")
+    return statements
+
+
+# Biểu thức của dòng history_entries ({row} là NEW/OLD) trả về timestamp dạng chuỗi và nhãn
+COMPACT_TIMESTAMP = "datetime({row}.ts, 'unixepoch')"
+COMPACT_SENTIMENT = "(SELECT name FROM history_labels WHERE id = {row}.label)"
+
+
 class SentimentDatabase:
     """Quản lý cơ sở dữ liệu SQLite cho lịch sử phân loại cảm xúc"""
     
-    def __init__(self, db_path: str = "data/sentiment_history.db"):
+    # Pragma áp dụng cho mỗi kết nối mới
+    PRAGMAS = {
+        'journal_mode': 'WAL',        # Đọc và ghi chạy song song
+        'synchronous': 'NORMAL',      # Đủ an toàn với WAL, ít fsync hơn FULL
+        'cache_size': -20000,         # ~20MB page cache
+        'mmap_size': 268435456,       # 256MB memory-mapped I/O
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,         # Chờ tối đa 5s thay vì lỗi "database is locked"
+    }
+    
+    def __init__(self, db_path: str = "data/sentiment_history.db", pool_size: int = 4, metrics=None,
+                 compact: bool = False):
         """
         Khởi tạo kết nối database
         
+        Kết nối được giữ lâu dài trong một pool nhỏ và dùng lại giữa các lần gọi,
+        an toàn khi dùng từ nhiều thread (VD: các script thread của Streamlit).
+        
         Args:
             db_path: Đường dẫn đến file database
+            pool_size: Số kết nối rảnh tối đa được giữ lại trong pool
+            metrics: MetricsRegistry để ghi độ trễ ghi và số bản ghi đã lưu, None để tắt
+            compact: True để chuyển database sang schema gọn nếu chưa (xem convert_to_compact)
         """
+        self.metrics = metrics
+        if metrics is not None:
+            write_latency = metrics.histogram(
+                'sentiment_db_write_seconds', 'Độ trễ mỗi transaction ghi (giây)', ('op',))
+            self._m_write_single = write_latency.labels(op='single')
+            self._m_write_bulk = write_latency.labels(op='bulk')
+            self._m_rows = metrics.counter('sentiment_db_rows_written_total', 'Số bản ghi đã lưu')
         self.db_path = db_path
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.pool_size = pool_size
+        self._pool = []
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        # Hàng đợi ghi trễ, None khi ghi đồng bộ (xem enable_write_behind)
+        self._writer = None
+        self._flush_before_read = False
+        # True khi lịch sử lưu theo schema gọn (history_entries/history_texts/history_labels),
+        # kiểm tra lại khi schema_version của file đổi (xem _sync_layout)
+        self.compact = False
+        self._schema_version = None
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.init_database()
+        if compact and not self.compact:
+            self.convert_to_compact()
+    
+    def _create_connection(self) -> sqlite3.Connection:
+        """Tạo kết nối mới và áp dụng các pragma tối ưu"""
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        for name, value in self.PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        # Dùng trong trigger ghi của schema gọn (xem convert_to_compact)
+        conn.create_function('text_hash', 1, text_hash, deterministic=True)
+        return conn
+    
+    @contextmanager
+    def _connection(self):
+        """
+        Mượn một kết nối từ pool trong phạm vi một transaction
+        
+        Commit khi khối lệnh kết thúc bình thường, rollback khi có lỗi,
+        sau đó trả kết nối về pool (hoặc đóng nếu pool đã đầy).
+        """
+        if self._closed:
+            raise sqlite3.ProgrammingError("SentimentDatabase đã bị đóng")
+        
+        with self._pool_lock:
+            conn = self._pool.pop() if self._pool else None
+        if conn is None:
+            conn = self._create_connection()
+        
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._release(conn)
+    
+    def _release(self, conn: sqlite3.Connection):
+        with self._pool_lock:
+            if not self._closed and len(self._pool) < self.pool_size:
+                self._pool.append(conn)
+                return
+        conn.close()
+    
+    def enable_write_behind(self, flush_interval: float = 0.5, flush_size: int = 500,
+                            max_queue: int = 10000, block: bool = True, put_timeout: float = None,
+                            flush_before_read: bool = True) -> WriteBehindQueue:
+        """
+        Bật chế độ ghi trễ cho save_classification
+        
+        save_classification chỉ đưa bản ghi (kèm timestamp lúc gọi) vào hàng
+        đợi; một thread nền ghi theo batch, mỗi batch một transaction. Hàng đợi
+        được ghi nốt khi close() hoặc khi thoát interpreter.
+        
+        Args:
+            flush_interval: Thời gian chờ tối đa để gom batch (giây)
+            flush_size: Số bản ghi tối đa mỗi transaction
+            max_queue: Số bản ghi tối đa đang chờ ghi
+            block: True để chặn người gọi khi hàng đợi đầy, False để bỏ bản ghi mới
+            put_timeout: Thời gian chặn tối đa (giây) trước khi bỏ bản ghi
+            flush_before_read: True để các hàm đọc ghi nốt hàng đợi trước khi đọc
+            
+        Returns:
+            WriteBehindQueue (xem stats() để lấy độ sâu hàng đợi, số bản ghi bị bỏ)
+        """
+        if self._writer is None or self._writer.closed:
+            self._writer = WriteBehindQueue(
+                self._insert_rows, max_queue=max_queue, flush_interval=flush_interval,
+                flush_size=flush_size, block=block, put_timeout=put_timeout, metrics=self.metrics
+            )
+        self._flush_before_read = flush_before_read
+        return self._writer
+    
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Ghi ngay các bản ghi đang chờ trong hàng đợi ghi trễ
+        
+        Returns:
+            True nếu hàng đợi đã được ghi hết
+        """
+        if self._writer is None:
+            return True
+        return self._writer.flush(timeout)
+    
+    def _before_read(self):
+        if self._flush_before_read and self._writer is not None:
+            self._writer.flush()
+    
+    def close(self):
+        """Ghi nốt hàng đợi ghi trễ và đóng toàn bộ kết nối đang được giữ trong pool"""
+        if self._writer is not None:
+            self._writer.close()
+        with self._pool_lock:
+            self._closed = True
+            pool, self._pool = self._pool, []
+        for conn in pool:
+            conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    # Các bước nâng cấp schema, áp dụng lần lượt theo PRAGMA user_version
+    MIGRATIONS = [
+        # 1: Index phục vụ ORDER BY timestamp và keyset pagination
+        [
+            "CREATE INDEX IF NOT EXISTS idx_sentiments_timestamp_id ON sentiments (timestamp, id)",
+        ],
+        # 2: Bộ đếm theo nhãn, cập nhật bằng trigger cho thống kê O(1)
+        [
+            """
+            CREATE TABLE IF NOT EXISTS sentiment_counts (
+                sentiment TEXT PRIMARY KEY,
+                count INTEGER NOT NULL
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_sentiments_count_insert
+            AFTER INSERT ON sentiments
+            BEGIN
+                INSERT OR IGNORE INTO sentiment_counts (sentiment, count) VALUES (NEW.sentiment, 0);
+                UPDATE sentiment_counts SET count = count + 1 WHERE sentiment = NEW.sentiment;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_sentiments_count_delete
+            AFTER DELETE ON sentiments
+            BEGIN
+                UPDATE sentiment_counts SET count = count - 1 WHERE sentiment = OLD.sentiment;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_sentiments_count_update
+            AFTER UPDATE OF sentiment ON sentiments
+            BEGIN
+                UPDATE sentiment_counts SET count = count - 1 WHERE sentiment = OLD.sentiment;
+                INSERT OR IGNORE INTO sentiment_counts (sentiment, count) VALUES (NEW.sentiment, 0);
+                UPDATE sentiment_counts SET count = count + 1 WHERE sentiment = NEW.sentiment;
+            END
+            """,
+            "DELETE FROM sentiment_counts",
+            "INSERT INTO sentiment_counts (sentiment, count) SELECT sentiment, COUNT(*) FROM sentiments GROUP BY sentiment",
+        ],
+        # 3: Số thế hệ dữ liệu, tăng sau mỗi lần ghi để làm mất hiệu lực cache đọc
+        [
+            """
+            CREATE TABLE IF NOT EXISTS db_generation (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                generation INTEGER NOT NULL
+            )
+            """,
+            "INSERT OR IGNORE INTO db_generation (id, generation) VALUES (0, 0)",
+        ],
+        # 4: Rollup số bản ghi theo giờ/ngày và nhãn cho biểu đồ xu hướng
+        _rollup_migration(*ROLLUPS['hour']) + _rollup_migration(*ROLLUPS['day']),
+        # 5: Chỉ mục tìm kiếm toàn văn (phụ thuộc schema: gọi với compact)
+        _fts_migration,
+    ]
     
     def init_database(self):
         """
-        Tạo bảng sentiments nếu chưa tồn tại
+        Tạo bảng sentiments nếu chưa tồn tại và nâng cấp schema
         
         Cấu trúc bảng:
         - id: INTEGER PRIMARY KEY AUTOINCREMENT
         - text: TEXT NOT NULL (câu văn đầu vào)
         - sentiment: TEXT NOT NULL (POSITIVE/NEGATIVE/NEUTRAL)
         - timestamp: TEXT NOT NULL (ISO format: YYYY-MM-DD HH:MM:SS)
+        
+        Index:
+        - idx_sentiments_timestamp_id: (timestamp, id) cho lịch sử mới nhất
+        
+        Bảng phụ:
+        - sentiment_counts: số bản ghi theo từng nhãn, cập nhật bằng trigger
+        - db_generation: số thế hệ dữ liệu, tăng trong cùng transaction với mỗi lần ghi
+        - sentiment_rollup_hourly/daily: số bản ghi theo (giờ/ngày, nhãn), cập nhật bằng trigger
+        - history_fts/history_fts_folded: chỉ mục FTS5 có dấu/không dấu cho search_history
+        
+        Sau convert_to_compact(), sentiments là view trên schema gọn.
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            # Đọc không khóa: database đã ở phiên bản mới nhất thì không cần ghi gì
+            if cursor.execute("PRAGMA user_version").fetchone()[0] < len(self.MIGRATIONS):
+                # DDL không tự mở transaction: khóa ghi tường minh để hai process
+                # mở cùng một file cũ không chạy cùng một bước hai lần
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS sentiments (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        text TEXT NOT NULL,
+                        sentiment TEXT NOT NULL,
+                        timestamp TEXT NOT NULL
+                    )
+                """)
+                compact = self._detect_compact(cursor)
+                # Đọc lại sau khi có khóa: process khác có thể vừa nâng cấp xong
+                version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                for target, statements in enumerate(self.MIGRATIONS[version:], start=version + 1):
+                    if callable(statements):
+                        statements = statements(compact)
+                    for statement in statements:
+                        cursor.execute(statement)
+                    cursor.execute(f"PRAGMA user_version = {target}")
+            self._sync_layout(cursor)
+    
+    @staticmethod
+    def _detect_compact(conn) -> bool:
+        """True nếu file đang dùng schema gọn"""
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_entries'"
+        ).fetchone() is not None
+    
+    def _sync_layout(self, conn) -> bool:
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        Cập nhật self.compact theo schema hiện tại của file
         
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sentiments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                text TEXT NOT NULL,
-                sentiment TEXT NOT NULL,
-                timestamp TEXT NOT NULL
-            )
-        """)
+        Process khác (VD: main.py compact) có thể chuyển file sang schema gọn
+        sau khi database này được mở; các truy vấn theo schema cũ khi đó trả
+        sai bản ghi. schema_version tăng sau mỗi thay đổi schema nên chỉ đọc
+        lại sqlite_master khi số này đổi. Gọi trên kết nối sẽ chạy truy vấn.
         
-        conn.commit()
-        conn.close()
+        Returns:
+            self.compact
+        """
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        if version != self._schema_version:
+            self.compact = self._detect_compact(conn)
+            self._schema_version = version
+        return self.compact
+    
+    # Schema gọn: mỗi câu văn lưu một lần theo hash, nhãn là số nguyên nhỏ,
+    # thời gian là epoch (giây) dạng INTEGER
+    COMPACT_SCHEMA = [
+        """
+        CREATE TABLE history_labels (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        """,
+        "INSERT INTO history_labels (id, name) VALUES (0, 'NEGATIVE'), (1, 'NEUTRAL'), (2, 'POSITIVE')",
+        """
+        CREATE TABLE history_texts (
+            id INTEGER PRIMARY KEY,
+            hash BLOB NOT NULL UNIQUE,
+            text TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE history_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text_id INTEGER NOT NULL REFERENCES history_texts (id),
+            label INTEGER NOT NULL REFERENCES history_labels (id),
+            ts INTEGER NOT NULL
+        )
+        """,
+    ]
+    
+    # Chép dữ liệu từ bảng sentiments cũ (giữ nguyên id và bộ đếm AUTOINCREMENT)
+    COMPACT_COPY = [
+        "INSERT OR IGNORE INTO history_labels (name) SELECT DISTINCT sentiment FROM sentiments",
+        "INSERT OR IGNORE INTO history_texts (hash, text) SELECT text_hash(text), text FROM sentiments ORDER BY id",
+        """
+        INSERT INTO history_entries (id, text_id, label, ts)
+        SELECT s.id, t.id, l.id, CAST(strftime('%s', s.timestamp) AS INTEGER)
+        FROM sentiments s
+        JOIN history_texts t ON t.hash = text_hash(s.text)
+        JOIN history_labels l ON l.name = s.sentiment
+        ORDER BY s.id
+        """,
+        "DELETE FROM sqlite_sequence WHERE name = 'history_entries'",
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'history_entries', seq FROM sqlite_sequence WHERE name = 'sentiments'",
+        # Xóa luôn index và trigger của bảng cũ
+        "DROP TABLE sentiments",
+    ]
+    
+    # View tương thích và trigger trên schema gọn (bộ đếm/rollup đã đúng nên không backfill)
+    COMPACT_OBJECTS = [
+        "CREATE INDEX idx_history_entries_ts_id ON history_entries (ts, id)",
+        """
+        CREATE VIEW sentiments AS
+        SELECT e.id AS id, t.text AS text, l.name AS sentiment, datetime(e.ts, 'unixepoch') AS timestamp
+        FROM history_entries e
+        JOIN history_texts t ON t.id = e.text_id
+        JOIN history_labels l ON l.id = e.label
+        """,
+        # Cần hàm Python text_hash: chỉ kết nối của SentimentDatabase chèn được qua view
+        """
+        CREATE TRIGGER trg_sentiments_view_insert
+        INSTEAD OF INSERT ON sentiments
+        BEGIN
+            INSERT OR IGNORE INTO history_texts (hash, text) VALUES (text_hash(NEW.text), NEW.text);
+            INSERT OR IGNORE INTO history_labels (name) VALUES (NEW.sentiment);
+            INSERT INTO history_entries (id, text_id, label, ts) VALUES (
+                NEW.id,
+                (SELECT id FROM history_texts WHERE hash = text_hash(NEW.text)),
+                (SELECT id FROM history_labels WHERE name = NEW.sentiment),
+                CAST(strftime('%s', NEW.timestamp) AS INTEGER)
+            );
+        END
+        """,
+        """
+        CREATE TRIGGER trg_sentiments_view_delete
+        INSTEAD OF DELETE ON sentiments
+        BEGIN
+            DELETE FROM history_entries WHERE id = OLD.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_history_entries_count_insert
+        AFTER INSERT ON history_entries
+        BEGIN
+            INSERT INTO sentiment_counts (sentiment, count) VALUES ({COMPACT_SENTIMENT.format(row='NEW')}, 1)
+                ON CONFLICT (sentiment) DO UPDATE SET count = count + 1;
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_history_entries_count_delete
+        AFTER DELETE ON history_entries
+        BEGIN
+            UPDATE sentiment_counts SET count = count - 1 WHERE sentiment = {COMPACT_SENTIMENT.format(row='OLD')};
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_history_entries_count_update
+        AFTER UPDATE OF label ON history_entries
+        BEGIN
+            UPDATE sentiment_counts SET count = count - 1 WHERE sentiment = {COMPACT_SENTIMENT.format(row='OLD')};
+            INSERT INTO sentiment_counts (sentiment, count) VALUES ({COMPACT_SENTIMENT.format(row='NEW')}, 1)
+                ON CONFLICT (sentiment) DO UPDATE SET count = count + 1;
+        END
+        """,
+        *[
+            statement
+            for table, bucket in ROLLUPS.values()
+            for statement in _rollup_triggers(table, bucket, 'history_entries',
+                                              COMPACT_TIMESTAMP, COMPACT_SENTIMENT, 'label, ts')
+        ],
+    ]
+    
+    def _size_bytes(self) -> int:
+        with self._connection() as conn:
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+    
+    def convert_to_compact(self, vacuum: bool = True) -> dict:
+        """
+        Chuyển lịch sử sang schema gọn, tại chỗ và trong một transaction
+        
+        - history_texts: mỗi câu văn lưu một lần, khóa theo hash nội dung
+        - history_labels: nhãn là số nguyên nhỏ (0 NEGATIVE, 1 NEUTRAL, 2 POSITIVE)
+        - history_entries: (id, text_id, label, ts) với ts là epoch giây
+        
+        sentiments trở thành view có cùng cột nên id, thứ tự và các tuple
+        get_history trả về không đổi; code chèn trực tiếp vào sentiments vẫn
+        chạy qua trigger INSTEAD OF. Trigger này gọi hàm Python text_hash, chỉ
+        được đăng ký trên kết nối của SentimentDatabase: kết nối sqlite3 khác
+        (công cụ ngoài, process khác) vẫn đọc và xóa được nhưng INSERT vào
+        sentiments sẽ lỗi "no such function: text_hash", hãy ghi qua
+        SentimentDatabase.
+        
+        Args:
+            vacuum: True để VACUUM sau khi chuyển và trả lại dung lượng cho hệ điều hành
+            
+        Returns:
+            Dictionary {before_bytes, after_bytes, entries, texts}
+            
+        Raises:
+            ValueError: Có timestamp không đúng định dạng YYYY-MM-DD HH:MM:SS
+        """
+        self.flush()
+        before = self._size_bytes()
+        
+        with self._connection() as conn:
+            # DDL không tự mở transaction, mở tường minh để chuyển đổi là nguyên tử
+            conn.execute("BEGIN IMMEDIATE")
+            # Process khác có thể đã chuyển file trong lúc chờ khóa
+            if not self._sync_layout(conn):
+                invalid = conn.execute(
+                    "SELECT COUNT(*) FROM sentiments WHERE strftime('%s', timestamp) IS NULL"
+                ).fetchone()[0]
+                if invalid:
+                    raise ValueError(f"Có {invalid} bản ghi có timestamp không hợp lệ")
+                statements = self.COMPACT_SCHEMA + self.COMPACT_COPY + self.COMPACT_OBJECTS
+                # Trigger của chỉ mục cũ đã bị xóa cùng bảng sentiments
+                statements += [f"DROP TABLE IF EXISTS {table}" for table in FTS_INDEXES]
+                statements += _fts_migration(compact=True)
+                for statement in statements:
+                    conn.execute(statement)
+                self._bump_generation(conn)
+            self._sync_layout(conn)
+        
+        if vacuum:
+            with self._connection() as conn:
+                conn.execute("VACUUM")
+        
+        with self._connection() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM history_entries").fetchone()[0]
+            texts = conn.execute("SELECT COUNT(*) FROM history_texts").fetchone()[0]
+        return {'before_bytes': before, 'after_bytes': self._size_bytes(), 'entries': entries, 'texts': texts}
     
     def save_classification(self, text: str, label: str, confidence: float = None):
         """
@@ -55,20 +594,160 @@ class SentimentDatabase:
             label: Nhãn cảm xúc (POSITIVE/NEGATIVE/NEUTRAL)
             confidence: Độ tin cậy (không lưu vào DB theo yêu cầu mới)
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # Tạo timestamp ISO format: YYYY-MM-DD HH:MM:SS
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        # Sử dụng parameterized query để tránh SQL injection
-        cursor.execute(
-            "INSERT INTO sentiments (text, sentiment, timestamp) VALUES (?, ?, ?)",
-            (text, label, timestamp)
+        # Chế độ ghi trễ: trả về ngay, thread nền sẽ ghi theo batch
+        if self._writer is not None and not self._writer.closed:
+            self._writer.put((text, label, timestamp))
+            return
+        
+        if self.metrics is not None:
+            start = time.perf_counter()
+        
+        with self._connection() as conn:
+            # Sử dụng parameterized query để tránh SQL injection
+            conn.execute(
+                "INSERT INTO sentiments (text, sentiment, timestamp) VALUES (?, ?, ?)",
+                (text, label, timestamp)
+            )
+            self._bump_generation(conn)
+        
+        if self.metrics is not None:
+            self._m_write_single.observe(time.perf_counter() - start)
+            self._m_rows.inc()
+    
+    def save_classifications(self, results: Iterable, chunk_size: int = 5000) -> int:
+        """
+        Lưu hàng loạt kết quả phân loại bằng executemany theo từng transaction
+        
+        Nhận trực tiếp danh sách kết quả từ batch_analyze (dictionary có 'text'
+        và 'sentiment', bỏ qua kết quả có 'error') hoặc các tuple (text, label).
+        Dữ liệu được đọc dần từ iterable, mỗi chunk ghi trong một transaction.
+        
+        Args:
+            results: Iterable các kết quả phân loại
+            chunk_size: Số bản ghi tối đa trong mỗi transaction
+            
+        Returns:
+            Số bản ghi đã được lưu
+        """
+        pairs = self._result_pairs(results)
+        inserted = 0
+        
+        while True:
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            chunk = [(text, label, timestamp) for text, label in islice(pairs, chunk_size)]
+            if not chunk:
+                break
+            self._insert_rows(chunk)
+            inserted += len(chunk)
+        
+        return inserted
+    
+    def _insert_rows(self, rows: List[Tuple[str, str, str]]):
+        """Ghi các bản ghi (text, label, timestamp) trong một transaction"""
+        if self.metrics is not None:
+            start = time.perf_counter()
+        with self._connection() as conn:
+            if self._sync_layout(conn):
+                self._insert_compact(conn, rows)
+            else:
+                conn.executemany(
+                    "INSERT INTO sentiments (text, sentiment, timestamp) VALUES (?, ?, ?)",
+                    rows
+                )
+            self._bump_generation(conn)
+        if self.metrics is not None:
+            self._m_write_bulk.observe(time.perf_counter() - start)
+            self._m_rows.inc(len(rows))
+    
+    @staticmethod
+    def _insert_compact(conn: sqlite3.Connection, rows: List[Tuple[str, str, str]]):
+        """Ghi thẳng vào schema gọn, hash tính một lần mỗi bản ghi thay vì qua trigger của view"""
+        hashed = [(text_hash(text), text, label, timestamp) for text, label, timestamp in rows]
+        conn.executemany(
+            "INSERT OR IGNORE INTO history_texts (hash, text) VALUES (?, ?)",
+            [(digest, text) for digest, text, _, _ in hashed]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO history_labels (name) VALUES (?)",
+            [(label,) for label in {row[1] for row in rows}]
         )
+        conn.executemany(
+            "INSERT INTO history_entries (text_id, label, ts) VALUES ("
+            "(SELECT id FROM history_texts WHERE hash = ?), "
+            "(SELECT id FROM history_labels WHERE name = ?), "
+            "CAST(strftime('%s', ?) AS INTEGER))",
+            [(digest, label, timestamp) for digest, _, label, timestamp in hashed]
+        )
+    
+    def save_stream(self, results: Iterable, chunk_size: int = 1000) -> Iterator:
+        """
+        Sink ghi database dạng pass-through cho pipeline streaming
         
-        conn.commit()
-        conn.close()
+        Chuyển tiếp từng kết quả và ghi vào database theo từng chunk (một
+        transaction mỗi chunk), nên có thể ghép với analyze_stream:
+        
+            for result in db.save_stream(analyzer.analyze_stream(lines)):
+                ...
+        
+        Args:
+            results: Iterable kết quả phân loại (dictionary hoặc (text, label))
+            chunk_size: Số kết quả mỗi lần ghi
+            
+        Yields:
+            Các kết quả như đầu vào
+        """
+        buffer = []
+        for result in results:
+            buffer.append(result)
+            if len(buffer) >= chunk_size:
+                self.save_classifications(buffer, chunk_size)
+                yield from buffer
+                buffer = []
+        if buffer:
+            self.save_classifications(buffer, chunk_size)
+            yield from buffer
+    
+    @staticmethod
+    def _result_pairs(results: Iterable):
+        """Chuyển kết quả phân loại thành các cặp (text, sentiment)"""
+        for result in results:
+            if isinstance(result, dict):
+                if 'error' in result:
+                    continue
+                yield result['text'], result['sentiment']
+            else:
+                yield result[0], result[1]
+    
+    # Truy vấn lịch sử theo schema: (SELECT, cột thời gian, cột id, tham số cursor thời gian)
+    HISTORY_QUERIES = {
+        False: (
+            "SELECT id, text, sentiment, timestamp FROM sentiments s",
+            "timestamp", "id", "?",
+        ),
+        True: (
+            "SELECT e.id, t.text, l.name, datetime(e.ts, 'unixepoch') FROM history_entries e "
+            "JOIN history_texts t ON t.id = e.text_id JOIN history_labels l ON l.id = e.label",
+            "e.ts", "e.id", "CAST(strftime('%s', ?) AS INTEGER)",
+        ),
+    }
+    
+    def _history_query(self, keyset: bool = False, conditions: List[str] = (), descending: bool = True) -> str:
+        """
+        SELECT (id, text, sentiment, timestamp) theo thứ tự (timestamp, id)
+        
+        Args:
+            keyset: Thêm điều kiện keyset (tham số timestamp, id đứng trước tham số của conditions)
+            conditions: Điều kiện lọc bổ sung (xem _history_filters)
+            descending: True để lấy mới nhất trước
+        """
+        select, ts, row_id, ts_param = self.HISTORY_QUERIES[self.compact]
+        conditions = ([f"({ts}, {row_id}) < ({ts_param}, ?)"] if keyset else []) + list(conditions)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "DESC" if descending else "ASC"
+        return f"{select}{where} ORDER BY {ts} {order}, {row_id} {order}"
     
     def get_history(self, limit: int = 50, offset: int = 0) -> List[Tuple]:
         """
@@ -76,8 +755,8 @@ class SentimentDatabase:
         
         Giải pháp tối ưu:
         - Giới hạn mặc định 50 bản ghi để tránh làm chậm giao diện
-        - Hỗ trợ offset cho pagination (nút "Tải thêm")
-        - Sử dụng ORDER BY timestamp DESC để lấy mới nhất
+        - Hỗ trợ offset cho pagination (với trang sâu dùng get_history_page)
+        - Sử dụng ORDER BY timestamp DESC, id DESC theo index để lấy mới nhất
         - Parameterized query để tránh SQL injection
         
         Args:
@@ -87,19 +766,227 @@ class SentimentDatabase:
         Returns:
             Danh sách các bản ghi lịch sử (id, text, sentiment, timestamp)
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self._before_read()
+        with self._connection() as conn:
+            self._sync_layout(conn)
+            # Sử dụng parameterized query
+            cursor = conn.execute(
+                f"{self._history_query()} LIMIT ? OFFSET ?",
+                (limit, offset)
+            )
+            results = cursor.fetchall()
         
-        # Sử dụng parameterized query
-        cursor.execute(
-            "SELECT id, text, sentiment, timestamp FROM sentiments ORDER BY timestamp DESC LIMIT ? OFFSET ?",
-            (limit, offset)
-        )
+        return results
+    
+    def get_history_page(self, limit: int = 50, cursor: Tuple = None) -> Tuple[List[Tuple], Tuple]:
+        """
+        Lấy một trang lịch sử bằng keyset pagination (nút "Tải thêm")
         
-        results = cursor.fetchall()
-        conn.close()
+        Trang tiếp theo bắt đầu ngay sau bản ghi cuối của trang trước theo
+        (timestamp, id), nên chi phí trang thứ N bằng trang đầu tiên thay vì
+        tăng tuyến tính như OFFSET.
         
-        return results
+        Args:
+            limit: Số lượng bản ghi mỗi trang (mặc định 50)
+            cursor: (timestamp, id) trả về từ trang trước, None cho trang đầu
+            
+        Returns:
+            (danh sách bản ghi (id, text, sentiment, timestamp), cursor trang sau
+            hoặc None nếu đã hết)
+        """
+        self._before_read()
+        with self._connection() as conn:
+            self._sync_layout(conn)
+            if cursor is None:
+                rows = conn.execute(
+                    f"{self._history_query()} LIMIT ?",
+                    (limit,)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"{self._history_query(keyset=True)} LIMIT ?",
+                    (cursor[0], cursor[1], limit)
+                ).fetchall()
+        
+        next_cursor = (rows[-1][3], rows[-1][0]) if len(rows) == limit else None
+        return rows, next_cursor
+    
+    # Điều kiện lọc theo schema: (nhãn, thời gian >=, thời gian <=)
+    FILTER_CONDITIONS = {
+        False: ("s.sentiment = ?", "s.timestamp >= ?", "s.timestamp <= ?"),
+        True: (
+            "e.label = (SELECT id FROM history_labels WHERE name = ?)",
+            "e.ts >= CAST(strftime('%s', ?) AS INTEGER)",
+            "e.ts <= CAST(strftime('%s', ?) AS INTEGER)",
+        ),
+    }
+    
+    # Truy vấn tìm kiếm theo schema, mới nhất trước theo id (FTS5 duyệt rowid
+    # giảm dần); {fts} là bảng chỉ mục có dấu hoặc không dấu
+    SEARCH_QUERIES = {
+        False: (
+            "SELECT s.id, s.text, s.sentiment, s.timestamp FROM {fts} "
+            "JOIN sentiments s ON s.id = {fts}.rowid WHERE {fts} MATCH ?",
+            "{fts}.rowid",
+        ),
+        True: (
+            "SELECT e.id, t.text, l.name, datetime(e.ts, 'unixepoch') FROM history_entries e "
+            "JOIN history_texts t ON t.id = e.text_id JOIN history_labels l ON l.id = e.label "
+            "WHERE {text_id} IN (SELECT rowid FROM {fts} WHERE {fts} MATCH ?)",
+            "e.id",
+        ),
+    }
+    
+    # Schema gọn: khớp nhiều câu văn hơn ngưỡng này thì duyệt bản ghi mới nhất
+    # trước và lọc theo tập câu khớp, thay vì tra index text_id rồi sắp xếp
+    SEARCH_SCAN_THRESHOLD = 1000
+    
+    @staticmethod
+    def _format_time(value) -> str:
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        return value
+    
+    def _history_filters(self, sentiment: str = None, start=None, end=None) -> Tuple[List[str], List]:
+        """Điều kiện WHERE và tham số lọc theo nhãn và khoảng thời gian (bao gồm hai đầu)"""
+        conditions, params = [], []
+        for condition, value in zip(self.FILTER_CONDITIONS[self.compact], (sentiment, start, end)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(self._format_time(value))
+        return conditions, params
+    
+    @staticmethod
+    def _match_expression(query: str, match_diacritics: bool = False) -> str:
+        """
+        Chuyển chuỗi người dùng nhập thành biểu thức FTS5
+        
+        Các từ phải cùng xuất hiện (AND), "cụm trong ngoặc kép" là cụm từ liền
+        nhau, từ kết thúc bằng * là tiền tố. Ký tự đặc biệt của FTS5 không có
+        tác dụng nên không thể làm lỗi truy vấn.
+        
+        Returns:
+            Biểu thức MATCH cho history_fts (phân biệt dấu) hoặc
+            history_fts_folded (đã bỏ dấu), chuỗi rỗng nếu không có từ nào
+        """
+        terms = []
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+            text = unicodedata.normalize('NFC', phrase or word)
+            if not match_diacritics:
+                text = remove_diacritics(text)
+            tokens = re.findall(r'[^\W_]+', text)
+            if not tokens:
+                continue
+            prefix = ' *' if word.endswith('*') else ''
+            terms.append(f'"{" ".join(tokens)}"{prefix}')
+        return ' '.join(terms)
+    
+    def search_history(self, query: str, limit: int = 50, cursor: int = None, sentiment: str = None,
+                       start=None, end=None, match_diacritics: bool = False) -> Tuple[List[Tuple], int]:
+        """
+        Tìm lịch sử phân loại chứa từ/cụm từ bằng chỉ mục FTS5
+        
+        Mặc định không phân biệt dấu ("hang kem" khớp "hàng kém", kể cả đ/d);
+        match_diacritics=True chỉ khớp đúng dấu. Kết quả mới nhất trước và
+        phân trang bằng keyset theo id, nên chi phí mỗi trang không phụ thuộc
+        số bản ghi.
+        
+        Args:
+            query: Các từ cần tìm (xem _match_expression)
+            limit: Số lượng bản ghi mỗi trang
+            cursor: Giá trị trả về từ trang trước, None cho trang đầu
+            sentiment: Chỉ lấy nhãn này (POSITIVE/NEGATIVE/NEUTRAL), None là tất cả
+            start: Thời điểm bắt đầu (datetime hoặc 'YYYY-MM-DD HH:MM:SS'), None là từ đầu
+            end: Thời điểm kết thúc (bao gồm), None là đến hiện tại
+            match_diacritics: True để tìm có phân biệt dấu
+            
+        Returns:
+            (danh sách bản ghi (id, text, sentiment, timestamp), cursor trang sau
+            hoặc None nếu đã hết)
+        """
+        expression = self._match_expression(query, match_diacritics)
+        if not expression:
+            return [], None
+        
+        fts = 'history_fts' if match_diacritics else 'history_fts_folded'
+        self._before_read()
+        with self._connection() as conn:
+            compact = self._sync_layout(conn)
+            select, row_id = self.SEARCH_QUERIES[compact]
+            row_id = row_id.format(fts=fts)
+            conditions, params = self._history_filters(sentiment, start, end)
+            if cursor is not None:
+                conditions.append(f"{row_id} < ?")
+                params.append(cursor)
+            where = ''.join(f" AND {condition}" for condition in conditions)
+            
+            if compact:
+                matched = conn.execute(
+                    f"SELECT COUNT(*) FROM (SELECT 1 FROM {fts} WHERE {fts} MATCH ? LIMIT ?)",
+                    (expression, self.SEARCH_SCAN_THRESHOLD + 1)
+                ).fetchone()[0]
+                # '+' ngăn SQLite dùng idx_history_entries_text_id
+                select = select.format(
+                    fts=fts, text_id='+e.text_id' if matched > self.SEARCH_SCAN_THRESHOLD else 'e.text_id'
+                )
+            else:
+                select = select.format(fts=fts)
+            rows = conn.execute(
+                f"{select}{where} ORDER BY {row_id} DESC LIMIT ?",
+                [expression, *params, limit]
+            ).fetchall()
+        
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return rows, next_cursor
+    
+    def iter_history_chunks(self, chunk_size: int = 5000, sentiment: str = None,
+                            start=None, end=None) -> Iterator[List[Tuple]]:
+        """
+        Duyệt toàn bộ lịch sử (cũ nhất trước) theo từng chunk
+        
+        Dùng một câu SELECT duy nhất và fetchmany, nên chỉ giữ một chunk trong
+        bộ nhớ và thấy một snapshot nhất quán (WAL không chặn các lần ghi khác
+        trong lúc duyệt).
+        
+        Args:
+            chunk_size: Số bản ghi mỗi chunk
+            sentiment: Chỉ lấy nhãn này, None là tất cả
+            start: Thời điểm bắt đầu (datetime hoặc 'YYYY-MM-DD HH:MM:SS'), None là từ đầu
+            end: Thời điểm kết thúc (bao gồm), None là đến hiện tại
+            
+        Yields:
+            Danh sách bản ghi (id, text, sentiment, timestamp)
+        """
+        self._before_read()
+        with self._connection() as conn:
+            self._sync_layout(conn)
+            conditions, params = self._history_filters(sentiment, start, end)
+            cursor = conn.execute(self._history_query(conditions=conditions, descending=False), params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    
+    def export_history(self, destination: str, fmt: str = None, sentiment: str = None,
+                       start=None, end=None, chunk_size: int = 5000) -> int:
+        """
+        Xuất lịch sử ra CSV (UTF-8 có BOM), JSONL hoặc Parquet theo từng chunk
+        
+        Bộ nhớ không tăng theo số bản ghi (xem iter_history_chunks). Parquet
+        cần pyarrow.
+        
+        Args:
+            destination: Đường dẫn file, hoặc '-' cho stdout (chỉ CSV/JSONL)
+            fmt: 'csv', 'jsonl' hoặc 'parquet', None để đoán theo phần mở rộng
+            sentiment, start, end: Bộ lọc như iter_history_chunks
+            chunk_size: Số bản ghi mỗi lần đọc/ghi
+            
+        Returns:
+            Số bản ghi đã xuất
+        """
+        chunks = self.iter_history_chunks(chunk_size, sentiment, start, end)
+        return export_chunks(chunks, destination, fmt)
     
     def clear_history(self):
         """
@@ -108,53 +995,152 @@ class SentimentDatabase:
         Sử dụng parameterized query (không cần vì không có tham số,
         nhưng vẫn an toàn với cú pháp trực tiếp)
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM sentiments")
-        conn.commit()
-        conn.close()
+        # Bản ghi còn trong hàng đợi ghi trễ cũng thuộc lịch sử cần xóa
+        self.flush()
+        with self._connection() as conn:
+            if self._sync_layout(conn):
+                conn.execute("DELETE FROM history_entries")
+                conn.execute("DELETE FROM history_texts")
+            else:
+                conn.execute("DELETE FROM sentiments")
+            self._bump_generation(conn)
+    
+    @staticmethod
+    def _bump_generation(conn: sqlite3.Connection):
+        conn.execute("UPDATE db_generation SET generation = generation + 1 WHERE id = 0")
+    
+    def get_generation(self) -> int:
+        """
+        Số thế hệ dữ liệu hiện tại
+        
+        Tăng sau mỗi lần lưu hoặc xóa lịch sử (kể cả từ process khác dùng chung
+        file), nên có thể dùng làm khóa cho cache kết quả đọc.
+        
+        Returns:
+            Số thế hệ (chỉ tăng)
+        """
+        self._before_read()
+        with self._connection() as conn:
+            return conn.execute("SELECT generation FROM db_generation WHERE id = 0").fetchone()[0]
     
     def get_total_count(self) -> int:
         """
         Lấy tổng số bản ghi
         
+        Đọc từ bảng bộ đếm sentiment_counts thay vì COUNT(*) toàn bảng.
+        
         Returns:
             Tổng số bản ghi trong database
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM sentiments")
-        result = cursor.fetchone()
-        conn.close()
+        self._before_read()
+        with self._connection() as conn:
+            result = conn.execute("SELECT COALESCE(SUM(count), 0) FROM sentiment_counts").fetchone()
         return result[0]
     
     def get_statistics(self) -> dict:
         """
         Lấy thống kê tổng quan
         
-        Sử dụng parameterized query và COUNT với CASE
+        Đọc từ bảng bộ đếm sentiment_counts (duy trì bằng trigger khi
+        thêm/xóa), chi phí không đổi dù lịch sử lớn đến đâu.
         
         Returns:
             Dictionary chứa thống kê
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN sentiment = 'POSITIVE' THEN 1 ELSE 0 END) as positive,
-                SUM(CASE WHEN sentiment = 'NEUTRAL' THEN 1 ELSE 0 END) as neutral,
-                SUM(CASE WHEN sentiment = 'NEGATIVE' THEN 1 ELSE 0 END) as negative
-            FROM sentiments
-        """)
-        
-        result = cursor.fetchone()
-        conn.close()
+        self._before_read()
+        with self._connection() as conn:
+            counts = dict(conn.execute("SELECT sentiment, count FROM sentiment_counts").fetchall())
         
+        return self._format_statistics(counts)
+    
+    @staticmethod
+    def _format_statistics(counts: dict) -> dict:
         return {
-            'total': result[0],
-            'positive': result[1],
-            'neutral': result[2],
-            'negative': result[3]
+            'total': sum(counts.values()),
+            'positive': counts.get('POSITIVE', 0),
+            'neutral': counts.get('NEUTRAL', 0),
+            'negative': counts.get('NEGATIVE', 0)
         }
+    
+    def get_timeline(self, start=None, end=None, granularity: str = 'hour') -> List[Tuple[str, str, int]]:
+        """
+        Chuỗi thời gian số bản ghi theo nhãn, đọc từ bảng rollup
+        
+        Chi phí tỉ lệ với số bucket trong khoảng thời gian, không phụ thuộc
+        số bản ghi.
+        
+        Args:
+            start: Thời điểm bắt đầu (datetime hoặc 'YYYY-MM-DD HH:MM:SS'), None là từ đầu
+            end: Thời điểm kết thúc (bao gồm), None là đến hiện tại
+            granularity: 'hour' hoặc 'day'
+            
+        Returns:
+            Danh sách (bucket, sentiment, count) theo thứ tự thời gian; bucket có
+            dạng 'YYYY-MM-DD HH:00:00' (giờ) hoặc 'YYYY-MM-DD' (ngày)
+        """
+        if granularity not in ROLLUPS:
+            raise ValueError(f"Độ chi tiết không hợp lệ: {granularity}")
+        table, bucket = ROLLUPS[granularity]
+        
+        conditions, params = [], []
+        for op, value in (('>=', start), ('<=', end)):
+            if value is None:
+                continue
+            value = self._format_time(value)
+            # So sánh theo bucket chứa thời điểm để giữ trọn bucket đầu/cuối
+            conditions.append(f"bucket {op} {bucket.format(ts='?')}")
+            params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        self._before_read()
+        with self._connection() as conn:
+            return conn.execute(
+                f"SELECT bucket, sentiment, count FROM {table} {where} ORDER BY bucket, sentiment",
+                params
+            ).fetchall()
+    
+    def rebuild_counters(self):
+        """
+        Tính lại bảng bộ đếm và bảng rollup từ dữ liệu gốc (quét toàn bảng)
+        
+        Dùng khi bảng sentiments bị sửa trực tiếp ngoài SentimentDatabase
+        hoặc khi verify_counters() phát hiện sai lệch.
+        """
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sentiment_counts")
+            conn.execute(
+                "INSERT INTO sentiment_counts (sentiment, count) "
+                "SELECT sentiment, COUNT(*) FROM sentiments GROUP BY sentiment"
+            )
+            for table, bucket in ROLLUPS.values():
+                # Hai câu lệnh cuối của migration: xóa và backfill
+                for statement in _rollup_migration(table, bucket)[-2:]:
+                    conn.execute(statement)
+    
+    def verify_counters(self) -> bool:
+        """
+        Kiểm tra bảng bộ đếm và bảng rollup có khớp với dữ liệu gốc không (quét toàn bảng)
+        
+        Returns:
+            True nếu khớp
+        """
+        with self._connection() as conn:
+            actual = dict(conn.execute(
+                "SELECT sentiment, COUNT(*) FROM sentiments GROUP BY sentiment"
+            ).fetchall())
+            stored = dict(conn.execute(
+                "SELECT sentiment, count FROM sentiment_counts WHERE count != 0"
+            ).fetchall())
+            if actual != stored:
+                return False
+            for table, bucket in ROLLUPS.values():
+                actual = conn.execute(
+                    f"SELECT {bucket.format(ts='timestamp')}, sentiment, COUNT(*) FROM sentiments "
+                    "GROUP BY 1, 2 ORDER BY 1, 2"
+                ).fetchall()
+                stored = conn.execute(
+                    f"SELECT bucket, sentiment, count FROM {table} WHERE count != 0 ORDER BY 1, 2"
+                ).fetchall()
+                if actual != stored:
+                    return False
+        return True
@@ -0,0 +1,125 @@
+"""
+Xuất lịch sử phân loại ra CSV, JSONL hoặc Parquet theo từng chunk
+
+Các hàm ghi nhận một iterable các chunk (danh sách tuple (id, text,
+sentiment, timestamp), VD: SentimentDatabase.iter_history_chunks) và ghi
+ngay từng chunk, nên bộ nhớ không tăng theo số bản ghi.
+"""
+
+import csv
+import json
+import os
+import sys
+from typing import Iterable, List, TextIO, Tuple
+
+EXPORT_COLUMNS = ('id', 'text', 'sentiment', 'timestamp')
+EXPORT_FORMATS = ('csv', 'jsonl', 'parquet')
+
+Chunks = Iterable[List[Tuple]]
+
+def detect_export_format(path: str) -> str:
+    """
+    Đoán định dạng xuất theo phần mở rộng file
+
+    Raises:
+        ValueError: Phần mở rộng không được hỗ trợ
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if ext in ('.parquet', '.pq'):
+        return 'parquet'
+    raise ValueError(f"Không đoán được định dạng xuất từ '{path}', hãy chọn một trong {EXPORT_FORMATS}")
+
+
+def write_csv(chunks: Chunks, stream: TextIO) -> int:
+    """Ghi CSV có dòng tiêu đề, trả về số bản ghi"""
+    writer = csv.writer(stream)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for chunk in chunks:
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def write_jsonl(chunks: Chunks, stream: TextIO) -> int:
+    """Ghi mỗi bản ghi một object JSON (giữ nguyên chữ có dấu), trả về số bản ghi"""
+    count = 0
+    for chunk in chunks:
+        stream.write(''.join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n' for row in chunk
+        ))
+        count += len(chunk)
+    return count
+
+
+def write_parquet(chunks: Chunks, path: str) -> int:
+    """
+    Ghi Parquet, mỗi chunk một row group; timestamp lưu kiểu timestamp[s]
+
+    Raises:
+        ImportError: Chưa cài pyarrow
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Xuất Parquet cần pyarrow: pip install pyarrow") from e
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('text', pa.string()),
+        ('sentiment', pa.string()),
+        ('timestamp', pa.timestamp('s')),
+    ])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            ids, texts, labels, timestamps = zip(*chunk)
+            writer.write_table(pa.table([
+                pa.array(ids, pa.int64()),
+                pa.array(texts, pa.string()),
+                pa.array(labels, pa.string()),
+                pc.strptime(pa.array(timestamps, pa.string()), format='%Y-%m-%d %H:%M:%S', unit='s'),
+            ], schema=schema))
+            count += len(chunk)
+    return count
+
+
+def export_chunks(chunks: Chunks, destination: str, fmt: str = None) -> int:
+    """
+    Ghi các chunk bản ghi ra file
+
+    CSV ghi UTF-8 có BOM (giống nút tải CSV cũ, Excel mở đúng tiếng Việt),
+    trừ khi ghi ra stdout.
+
+    Args:
+        chunks: Iterable các chunk bản ghi (id, text, sentiment, timestamp)
+        destination: Đường dẫn file, hoặc '-' cho stdout (chỉ CSV/JSONL)
+        fmt: 'csv', 'jsonl' hoặc 'parquet', None để đoán theo phần mở rộng
+
+    Returns:
+        Số bản ghi đã ghi
+    """
+    if fmt is None:
+        if destination == '-':
+            raise ValueError("Cần chỉ định định dạng khi xuất ra stdout")
+        fmt = detect_export_format(destination)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Định dạng không hợp lệ: {fmt}")
+
+    if fmt == 'parquet':
+        if destination == '-':
+            raise ValueError("Không thể xuất Parquet ra stdout")
+        return write_parquet(chunks, destination)
+
+    write = write_csv if fmt == 'csv' else write_jsonl
+    if destination == '-':
+        return write(chunks, sys.stdout)
+    encoding = 'utf-8-sig' if fmt == 'csv' else 'utf-8'
+    with open(destination, 'w', encoding=encoding, newline='') as stream:
+        return write(chunks, stream)
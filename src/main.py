@@ -1,16 +1,31 @@
 from sentiment_analyzer import SentimentAnalyzer
 from database import SentimentDatabase
+from metrics import REGISTRY, start_metrics_server
 from typing import Dict
+import os
 import sys
 
 class SentimentApp:
     """Ứng dụng chính phân loại cảm xúc"""
     
-    def __init__(self):
-        """Khởi tạo ứng dụng"""
+    def __init__(self, write_behind: bool = None):
+        """
+        Khởi tạo ứng dụng
+        
+        Args:
+            write_behind: Lưu lịch sử ở thread nền, người dùng không phải chờ
+                insert/fsync (None: bật khi đặt SENTIMENT_WRITE_BEHIND=1)
+        """
         print("=== Ứng dụng Phân loại Cảm xúc Tiếng Việt ===\n")
-        self.analyzer = SentimentAnalyzer()
-        self.db = SentimentDatabase()
+        self.analyzer = SentimentAnalyzer(instrument=True, metrics=REGISTRY)
+        self.db = SentimentDatabase(metrics=REGISTRY)
+        if write_behind is None:
+            write_behind = os.environ.get('SENTIMENT_WRITE_BEHIND') == '1'
+        if write_behind:
+            self.db.enable_write_behind()
+        self._m_classified = REGISTRY.counter(
+            'sentiment_app_classifications_total', 'Số câu được phân loại qua giao diện', ('app',)
+        ).labels(app='cli')
     
     def classify_and_save(self, text: str) -> Dict:
         """
@@ -41,9 +56,42 @@ class SentimentApp:
             text=result['text'],
             label=result['sentiment']
         )
+        self._m_classified.inc()
         
         return result
     
+    def classify_file(self, path: str, chunk_size: int = 1000) -> int:
+        """
+        Phân loại toàn bộ file (mỗi dòng một câu) và lưu hàng loạt vào database
+        
+        File được đọc dần qua analyze_stream và ghi qua save_stream theo từng
+        chunk, mỗi chunk một transaction.
+        
+        Args:
+            path: Đường dẫn file văn bản, hoặc '-' để đọc từ stdin
+            chunk_size: Số dòng mỗi chunk
+            
+        Returns:
+            Số bản ghi đã được lưu
+        """
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        total_lines = 0
+        saved = 0
+        try:
+            # Pipeline streaming: file → analyze_stream → save_stream (bộ nhớ không đổi)
+            lines = (line.rstrip('\n') for line in stream if line.strip())
+            results = self.analyzer.analyze_stream(lines)
+            for result in self.db.save_stream(results, chunk_size=chunk_size):
+                total_lines += 1
+                if 'error' not in result:
+                    saved += 1
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        
+        print(f"\n◆ Đã phân loại {total_lines} câu, lưu {saved} bản ghi vào database.\n")
+        return saved
+    
     def show_history(self, limit: int = 50):
         """
         Hiển thị lịch sử phân loại (giới hạn 50 bản ghi mới nhất)
@@ -80,6 +128,15 @@ class SentimentApp:
         print(f"😊 Tích cực: {stats['positive']}")
         print(f"😞 Trung tính: {stats['neutral']}")
         print(f"😐 Tiêu cực: {stats['negative']}\n")
+        
+        # Thời gian từng bước của các lần phân loại trong phiên này
+        timings = self.analyzer.timing_stats()
+        if timings and timings.get('total', {}).get('count'):
+            print(f"◆ Thời gian xử lý ({timings['total']['count']} lần phân loại):")
+            print(f"  {'Bước':<12} {'TB (ms)':>10} {'p50':>10} {'p95':>10} {'p99':>10}")
+            for stage, t in timings.items():
+                print(f"  {stage:<12} {t['mean_ms']:>10.3f} {t['p50_ms']:>10.3f} {t['p95_ms']:>10.3f} {t['p99_ms']:>10.3f}")
+            print()
     
     def run_interactive(self):
         """Chạy chế độ tương tác"""
@@ -134,13 +191,122 @@ class SentimentApp:
             except Exception as e:
                 print(f"\n✗ Lỗi: {e}\n")
 
+def run_batch_command(argv: list):
+    """
+    Lệnh batch: phân loại file lớn/stdin bằng nhiều process, ghi JSONL theo thứ tự
+    
+    VD: python main.py batch reviews.csv --column text --workers 4 --save > out.jsonl
+    """
+    import argparse
+    from batch_scoring import run_batch
+    
+    parser = argparse.ArgumentParser(prog="main.py batch", description="Phân loại hàng loạt (JSONL ra stdout)")
+    parser.add_argument("input", nargs="?", default="-", help="File CSV/JSONL/văn bản hoặc '-' cho stdin")
+    parser.add_argument("-o", "--output", default="-", help="File JSONL đầu ra (mặc định stdout)")
+    parser.add_argument("--format", choices=["text", "csv", "jsonl"], default=None,
+                        help="Định dạng đầu vào (mặc định đoán theo phần mở rộng)")
+    parser.add_argument("--column", default="text", help="Cột CSV / khóa JSONL chứa câu văn")
+    parser.add_argument("--model", default="phobert", choices=["phobert", "distilbert"])
+    parser.add_argument("--workers", type=int, default=None, help="Số process (mặc định theo số CPU)")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="Số thread torch mỗi process")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Số câu mỗi chunk")
+    parser.add_argument("--save", action="store_true", help="Lưu hàng loạt kết quả vào SentimentDatabase")
+    args = parser.parse_args(argv)
+    
+    db = SentimentDatabase() if args.save else None
+    count = run_batch(
+        input_path=args.input,
+        output_path=args.output,
+        fmt=args.format,
+        field=args.column,
+        model_name=args.model,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        chunk_size=args.chunk_size,
+        db=db,
+    )
+    print(f"◆ Đã phân loại {count} câu.", file=sys.stderr)
+
+def run_compact_command(argv: list):
+    """
+    Lệnh compact: chuyển lịch sử sang schema gọn tại chỗ và in dung lượng tiết kiệm được
+    
+    VD: python main.py compact [data/sentiment_history.db]
+    """
+    db = SentimentDatabase(argv[0]) if argv else SentimentDatabase()
+    already = db.compact
+    stats = db.convert_to_compact()
+    db.close()
+    
+    before, after = stats['before_bytes'], stats['after_bytes']
+    saved = 1 - after / before if before else 0.0
+    print("◆ Database đã ở schema gọn, chỉ VACUUM." if already else "◆ Đã chuyển sang schema gọn.")
+    print(f"  Bản ghi: {stats['entries']} | Câu văn khác nhau: {stats['texts']}")
+    print(f"  Dung lượng: {before / 1024:.0f} KB → {after / 1024:.0f} KB (giảm {saved:.0%})")
+
+def run_export_command(argv: list):
+    """
+    Lệnh export: xuất toàn bộ lịch sử theo từng chunk (bộ nhớ không tăng theo số bản ghi)
+    
+    VD: python main.py export history.csv --sentiment NEGATIVE --start "2026-10-01 00:00:00"
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="main.py export", description="Xuất lịch sử ra CSV/JSONL/Parquet")
+    parser.add_argument("output", help="File đầu ra (.csv, .jsonl, .parquet) hoặc '-' cho stdout")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], default=None,
+                        help="Định dạng (mặc định đoán theo phần mở rộng)")
+    parser.add_argument("--sentiment", choices=["POSITIVE", "NEUTRAL", "NEGATIVE"], default=None,
+                        help="Chỉ xuất nhãn này")
+    parser.add_argument("--start", default=None, help="Từ thời điểm 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument("--end", default=None, help="Đến thời điểm 'YYYY-MM-DD HH:MM:SS' (bao gồm)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Số bản ghi mỗi lần đọc/ghi")
+    parser.add_argument("--db", default="data/sentiment_history.db", help="Đường dẫn database")
+    args = parser.parse_args(argv)
+    
+    db = SentimentDatabase(args.db)
+    count = db.export_history(
+        args.output, fmt=args.format, sentiment=args.sentiment,
+        start=args.start, end=args.end, chunk_size=args.chunk_size,
+    )
+    db.close()
+    print(f"◆ Đã xuất {count} bản ghi.", file=sys.stderr)
+
 def main():
     """Hàm main"""
     try:
+        # Lệnh batch ghi JSONL ra stdout nên không in banner
+        if sys.argv[1:2] == ['batch']:
+            run_batch_command(sys.argv[2:])
+            return
+        # Lệnh export có thể ghi ra stdout nên cũng không in banner
+        if sys.argv[1:2] == ['export']:
+            run_export_command(sys.argv[2:])
+            return
+        if sys.argv[1:2] == ['compact']:
+            run_compact_command(sys.argv[2:])
+            return
+        
+        # Exporter Prometheus (GET /metrics) khi đặt SENTIMENT_METRICS_PORT
+        metrics_port = os.environ.get('SENTIMENT_METRICS_PORT')
+        if metrics_port:
+            start_metrics_server(int(metrics_port))
+        
         app = SentimentApp()
         
+        # Lệnh nhanh chỉ đọc database, không bao giờ tải torch/model
+        # python main.py history [N] | python main.py stats
+        args = sys.argv[1:]
+        if args[:1] == ['history'] and (len(args) == 1 or (len(args) == 2 and args[1].isdigit())):
+            app.show_history(int(args[1]) if len(args) == 2 else 50)
+        elif args == ['stats']:
+            app.show_statistics()
+        # Chế độ không tương tác: phân loại cả file
+        # python main.py --file reviews.txt  (hoặc --file - để đọc stdin)
+        elif len(sys.argv) > 2 and sys.argv[1] == '--file':
+            app.classify_file(sys.argv[2])
         # Kiểm tra nếu có tham số dòng lệnh
-        if len(sys.argv) > 1:
+        elif len(sys.argv) > 1:
             # Phân loại câu từ tham số
             text = " ".join(sys.argv[1:])
             result = app.classify_and_save(text)
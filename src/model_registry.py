@@ -0,0 +1,180 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+try:
+    from .sentiment_analyzer import SentimentAnalyzer
+    from .quantization import model_size_bytes
+except ImportError:
+    from sentiment_analyzer import SentimentAnalyzer
+    from quantization import model_size_bytes
+
+def estimate_model_bytes(analyzer) -> int:
+    """
+    Ước lượng bộ nhớ trọng số của model trong một SentimentAnalyzer
+
+    Returns:
+        Số byte của toàn bộ tham số, 0 nếu không xác định được
+    """
+    try:
+        return model_size_bytes(analyzer.model.model)
+    except Exception:
+        return 0
+
+
+class _Entry:
+    __slots__ = ('analyzer', 'size', 'in_use', 'lock', 'evict_pending')
+
+    def __init__(self, analyzer, size: int):
+        self.analyzer = analyzer
+        self.size = size
+        self.in_use = 0
+        # evict() khi đang có người mượn: loại lúc lượt mượn cuối kết thúc
+        self.evict_pending = False
+        # Tokenizer của HF không an toàn đa luồng: mỗi model chỉ một lượt suy luận
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Registry model dùng chung cho toàn bộ process
+
+    - Mỗi model chỉ được tải một lần, mọi session dùng chung cùng một SentimentAnalyzer
+    - Giữ nhiều model cùng lúc trong giới hạn bộ nhớ, chuyển model tức thì
+    - Khi vượt giới hạn, loại model ít dùng gần đây nhất và không có ai đang dùng;
+      model đang suy luận (acquire) chỉ bị loại sau khi được trả lại
+    - Suy luận qua acquire được tuần tự hóa theo từng model (các session dùng
+      chung analyzer không gọi tokenizer cùng lúc), model khác vẫn chạy song song
+    """
+
+    def __init__(self, memory_budget_mb: float = None, loader: Callable = None, **analyzer_kwargs):
+        """
+        Args:
+            memory_budget_mb: Tổng bộ nhớ trọng số tối đa (MB), None là không giới hạn
+            loader: Hàm tạo analyzer từ tên model (mặc định SentimentAnalyzer)
+            **analyzer_kwargs: Tham số thêm cho SentimentAnalyzer (VD: cache_path)
+        """
+        self.memory_budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        self._loader = loader or (lambda name: SentimentAnalyzer(model_name=name, lazy=False, **analyzer_kwargs))
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def get(self, model_name: str) -> SentimentAnalyzer:
+        """
+        Lấy analyzer của model, tải nếu chưa có (mỗi model chỉ tải một lần)
+
+        Args:
+            model_name: Tên model ('phobert' hoặc 'distilbert')
+
+        Returns:
+            SentimentAnalyzer dùng chung
+        """
+        with self._lock:
+            entry = self._entries.get(model_name)
+            if entry is not None:
+                self._entries.move_to_end(model_name)
+                return entry.analyzer
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        # Chỉ khóa theo từng model khi tải, các model khác vẫn dùng được
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(model_name)
+                if entry is not None:
+                    self._entries.move_to_end(model_name)
+                    return entry.analyzer
+
+            analyzer = self._loader(model_name)
+            entry = _Entry(analyzer, estimate_model_bytes(analyzer))
+
+            with self._lock:
+                self._entries[model_name] = entry
+                self._enforce_budget(keep=model_name)
+            return analyzer
+
+    @contextmanager
+    def acquire(self, model_name: str):
+        """
+        Mượn analyzer trong lúc suy luận, đảm bảo model không bị loại giữa chừng
+
+        Giữ khóa suy luận của model trong suốt khối with, các session khác
+        mượn cùng model sẽ chờ đến lượt.
+
+        Ví dụ:
+            with registry.acquire("phobert") as analyzer:
+                result = analyzer.analyze(text)
+        """
+        while True:
+            analyzer = self.get(model_name)
+            with self._lock:
+                entry = self._entries.get(model_name)
+                # Model có thể vừa bị loại giữa get() và lúc đánh dấu đang dùng
+                if entry is not None and entry.analyzer is analyzer:
+                    entry.in_use += 1
+                    break
+        try:
+            with entry.lock:
+                yield analyzer
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                if entry.in_use == 0:
+                    if entry.evict_pending and self._entries.get(model_name) is entry:
+                        self._discard(model_name)
+                    self._enforce_budget()
+
+    def _enforce_budget(self, keep: str = None):
+        """Loại các model LRU không được dùng cho đến khi nằm trong giới hạn bộ nhớ"""
+        if self.memory_budget is None:
+            return
+        total = sum(entry.size for entry in self._entries.values())
+        for name in list(self._entries):
+            if total <= self.memory_budget:
+                break
+            entry = self._entries[name]
+            if name == keep or entry.in_use > 0:
+                continue
+            self._discard(name)
+            total -= entry.size
+            print(f"◆ Đã giải phóng model {name} ({entry.size / 1024 / 1024:.0f}MB)")
+
+    def evict(self, model_name: str) -> bool:
+        """
+        Loại model khỏi registry
+
+        Model đang được mượn qua acquire() chưa bị loại ngay (nếu không, lần
+        get() tiếp theo sẽ tải bản sao thứ hai kèm khóa suy luận thứ hai) mà
+        được loại khi lượt mượn cuối cùng kết thúc; trong lúc chờ, get() và
+        acquire() vẫn dùng chung bản đang có.
+
+        Returns:
+            True nếu model có trong registry (đã loại hoặc sẽ loại)
+        """
+        with self._lock:
+            entry = self._entries.get(model_name)
+            if entry is None:
+                return False
+            if entry.in_use > 0:
+                entry.evict_pending = True
+            else:
+                self._discard(model_name)
+            return True
+
+    def _discard(self, model_name: str):
+        """Bỏ model khỏi registry và giải phóng thread riêng của analyzer (gọi khi giữ _lock)"""
+        entry = self._entries.pop(model_name)
+        close = getattr(entry.analyzer, 'close', None)
+        if close is not None:
+            close()
+
+    def loaded_models(self) -> List[str]:
+        """Danh sách model đang được giữ, từ ít dùng đến dùng gần nhất"""
+        with self._lock:
+            return list(self._entries)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bộ nhớ trọng số (byte) của từng model đang được giữ"""
+        with self._lock:
+            return {name: entry.size for name, entry in self._entries.items()}
@@ -0,0 +1,160 @@
+"""
+Backend ONNX Runtime cho suy luận trên CPU
+
+Model sequence-classification được export sang ONNX một lần, lưu cache trên
+đĩa, sau đó phục vụ qua onnxruntime với graph optimization bật tối đa.
+OnnxSentimentPipeline trả kết quả cùng format với transformers.pipeline
+("sentiment-analysis"), nên sentiment_map và logic keyword không đổi.
+"""
+
+import json
+import os
+from typing import Dict, List, Union
+
+import numpy as np
+
+def _cache_dir_for(model_id: str, cache_root: str) -> str:
+    return os.path.join(cache_root, model_id.replace('/', '__'))
+
+
+def export_onnx(model_id: str, cache_root: str = "models/onnx") -> str:
+    """
+    Export model HuggingFace sang ONNX (bỏ qua nếu đã có trong cache)
+
+    Args:
+        model_id: Tên model HuggingFace (VD: "vinai/phobert-base-v2")
+        cache_root: Thư mục gốc lưu các model đã export
+
+    Model gốc chưa có lớp phân loại đã huấn luyện sẽ được khởi tạo ngẫu
+    nhiên lúc tải, nên trọng số PyTorch dùng để export cũng được lưu cùng thư
+    mục: nạp lại từ đó (pipeline(model=thư mục)) cho đúng model đã export.
+
+    Returns:
+        Thư mục chứa model.onnx, trọng số PyTorch, tokenizer và labels.json
+    """
+    target = _cache_dir_for(model_id, cache_root)
+    onnx_path = os.path.join(target, "model.onnx")
+    if os.path.exists(onnx_path):
+        return target
+
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    print(f"Đang export {model_id} sang ONNX...")
+    os.makedirs(target, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModelForSequenceClassification.from_pretrained(model_id)
+    model.eval()
+
+    sample = tokenizer(["Hôm nay tôi rất vui"], return_tensors="pt")
+    tmp_path = onnx_path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            tmp_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=14,
+        )
+
+    model.save_pretrained(target)
+    tokenizer.save_pretrained(target)
+    with open(os.path.join(target, "labels.json"), "w", encoding="utf-8") as f:
+        json.dump({str(k): v for k, v in model.config.id2label.items()}, f, ensure_ascii=False)
+    # Đổi tên sau cùng để một lần export dở dang không bị coi là cache hợp lệ
+    os.replace(tmp_path, onnx_path)
+    print(f"✓ Đã export ONNX vào {target}")
+    return target
+
+
+class OnnxSentimentPipeline:
+    """Thay thế transformers.pipeline("sentiment-analysis") bằng ONNX Runtime"""
+
+    def __init__(self, model_dir: str, num_threads: int = None):
+        """
+        Args:
+            model_dir: Thư mục do export_onnx() tạo ra
+            num_threads: Số thread intra-op của onnxruntime (None: mặc định)
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, "labels.json"), encoding="utf-8") as f:
+            self.id2label = {int(k): v for k, v in json.load(f).items()}
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Lưu graph đã tối ưu để lần khởi động sau không phải tối ưu lại
+        optimized_path = os.path.join(model_dir, "model.optimized.onnx")
+        if os.path.exists(optimized_path):
+            model_path = optimized_path
+        else:
+            model_path = os.path.join(model_dir, "model.onnx")
+            options.optimized_model_filepath = optimized_path
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def preprocess(self, batch: List[str], truncation: bool = False) -> Dict[str, np.ndarray]:
+        """Tokenize một batch thành input của session (cùng tên hook với pipeline của transformers)"""
+        encoded = self.tokenizer(batch, padding=True, truncation=truncation, return_tensors="np")
+        return {
+            name: encoded[name].astype(np.int64)
+            for name in self._input_names if name in encoded
+        }
+
+    def _forward(self, feeds: Dict[str, np.ndarray]) -> np.ndarray:
+        """Chạy session, trả về logits"""
+        return self.session.run(["logits"], feeds)[0]
+
+    def __call__(self, texts: Union[str, List[str]], batch_size: int = None,
+                 truncation: bool = False, **kwargs) -> List[Dict]:
+        """
+        Phân loại một hoặc nhiều câu
+
+        Args:
+            truncation: Cắt câu vượt độ dài tối đa của tokenizer (như pipeline)
+
+        Returns:
+            Danh sách {'label', 'score'} (nhãn có xác suất cao nhất), cùng thứ tự đầu vào
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        batch_size = batch_size or len(texts) or 1
+
+        results = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            logits = self._forward(self.preprocess(batch, truncation=truncation))
+            # Softmax ổn định số học, giống pipeline của transformers
+            logits = logits - logits.max(axis=-1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=-1, keepdims=True)
+            for row in probs:
+                best = int(row.argmax())
+                results.append({'label': self.id2label[best], 'score': float(row[best])})
+        return results
+
+
+def load_onnx_pipeline(model_id: str, cache_root: str = "models/onnx", num_threads: int = None) -> OnnxSentimentPipeline:
+    """
+    Export (nếu cần) và tải model ONNX
+
+    Args:
+        model_id: Tên model HuggingFace
+        cache_root: Thư mục gốc lưu các model đã export
+        num_threads: Số thread intra-op của onnxruntime
+
+    Returns:
+        OnnxSentimentPipeline
+    """
+    return OnnxSentimentPipeline(export_onnx(model_id, cache_root), num_threads=num_threads)
@@ -0,0 +1,177 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+import os
+
+class PredictionCache:
+    """
+    Cache kết quả model (label, score) theo câu đã chuẩn hóa và tên model
+
+    - Tầng bộ nhớ: LRU có giới hạn kích thước, tùy chọn TTL
+    - Tầng lưu trữ (tùy chọn): bảng SQLite, giữ cache qua các lần khởi động lại
+    - Bộ đếm hit/miss/eviction để theo dõi hiệu quả
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = None, db_path: str = None):
+        """
+        Args:
+            max_size: Số mục tối đa trong tầng bộ nhớ (0 để tắt tầng bộ nhớ)
+            ttl: Thời gian sống của mỗi mục (giây), None là không hết hạn
+            db_path: Đường dẫn file SQLite cho tầng lưu trữ, None để tắt
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries = OrderedDict()  # key -> (result, thời điểm tạo)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.persistent_hits = 0
+
+        self._conn = None
+        if db_path:
+            if os.path.dirname(db_path):
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS prediction_cache (
+                        model TEXT NOT NULL,
+                        text TEXT NOT NULL,
+                        label TEXT NOT NULL,
+                        score REAL NOT NULL,
+                        created REAL NOT NULL,
+                        PRIMARY KEY (model, text)
+                    ) WITHOUT ROWID
+                """)
+                # Xóa mục hết hạn theo khoảng thời gian, không quét cả bảng
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_prediction_cache_created ON prediction_cache (created)"
+                )
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, model: str, text: str) -> Optional[Dict]:
+        """
+        Lấy kết quả model đã cache
+
+        Args:
+            model: Tên model
+            text: Câu đã chuẩn hóa
+
+        Returns:
+            Dictionary {'label', 'score'} hoặc None nếu không có
+        """
+        key = (model, text)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(entry[0])
+                del self._entries[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT label, score, created FROM prediction_cache WHERE model = ? AND text = ?",
+                    key
+                ).fetchone()
+                if row is not None and not self._expired(row[2], now):
+                    result = {'label': row[0], 'score': row[1]}
+                    self._store(key, result, row[2])
+                    self.hits += 1
+                    self.persistent_hits += 1
+                    return dict(result)
+                if row is not None:
+                    with self._conn:
+                        self._conn.execute(
+                            "DELETE FROM prediction_cache WHERE model = ? AND text = ?", key
+                        )
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, result: Dict):
+        """Lưu kết quả model vào cache"""
+        self.put_many(model, [(text, result)])
+
+    def put_many(self, model: str, items: Iterable[Tuple[str, Dict]]):
+        """
+        Lưu nhiều kết quả model, ghi tầng lưu trữ trong một transaction
+
+        Cùng transaction đó xóa các mục đã hết hạn của tầng lưu trữ, kể cả mục
+        không bao giờ được đọc lại, để file không phình ra mãi.
+
+        Args:
+            model: Tên model
+            items: Các cặp (câu đã chuẩn hóa, {'label', 'score'})
+        """
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, result in items:
+                result = {'label': result['label'], 'score': result['score']}
+                self._store((model, text), result, now)
+                rows.append((model, text, result['label'], result['score'], now))
+
+            if self._conn is not None and rows:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO prediction_cache (model, text, label, score, created) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        rows
+                    )
+                    if self.ttl is not None:
+                        self._conn.execute(
+                            "DELETE FROM prediction_cache WHERE created < ?", (now - self.ttl,)
+                        )
+
+    def _store(self, key: Tuple, result: Dict, created: float):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (result, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Xóa toàn bộ cache (cả tầng lưu trữ)"""
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM prediction_cache")
+
+    def stats(self) -> Dict:
+        """
+        Thống kê hiệu quả cache
+
+        Returns:
+            Dictionary {hits, misses, evictions, persistent_hits, size, hit_rate}
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'persistent_hits': self.persistent_hits,
+                'size': len(self._entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        """Đóng kết nối tầng lưu trữ"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,82 @@
+"""
+Lượng tử hóa động int8 cho model Transformer trên CPU
+
+Các lớp nn.Linear được lượng tử hóa int8 khi tải model; trọng số đã lượng
+tử hóa được lưu cache trên đĩa để lần khởi động sau không phải đọc lại
+trọng số fp32 và lượng tử hóa lại từ đầu.
+"""
+
+import itertools
+import os
+
+def model_size_bytes(module) -> int:
+    """
+    Bộ nhớ trọng số của một torch.nn.Module (tính cả Linear đã lượng tử hóa)
+
+    Returns:
+        Số byte của tham số, buffer và trọng số int8 đã đóng gói
+    """
+    total = sum(t.numel() * t.element_size() for t in itertools.chain(module.parameters(), module.buffers()))
+    for m in module.modules():
+        packed = getattr(m, '_packed_params', None)
+        if packed is not None and hasattr(packed, '_weight_bias'):
+            weight, bias = packed._weight_bias()
+            total += weight.numel() * weight.element_size()
+            if bias is not None:
+                total += bias.numel() * bias.element_size()
+    return total
+
+
+def quantize_model(model):
+    """Lượng tử hóa động int8 các lớp nn.Linear, trả về bản sao (model gốc giữ nguyên)"""
+    import torch
+
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_quantized_pipeline(model_id: str, cache_root: str = "models/quantized"):
+    """
+    Tải pipeline sentiment-analysis với model đã lượng tử hóa int8
+
+    Lần đầu: tải trọng số fp32, lượng tử hóa rồi lưu state_dict int8 vào cache.
+    Các lần sau: dựng model từ config, lượng tử hóa khung rỗng và nạp
+    state_dict int8 từ cache.
+
+    Lớp phân loại của model gốc được khởi tạo ngẫu nhiên mỗi lần tải, nên
+    bản fp32 mà cache int8 được lượng tử hóa từ đó cũng được lưu cùng thư mục
+    (save_pretrained): so sánh A/B nạp fp32 từ đó thay vì tải lại từ Hub.
+
+    Args:
+        model_id: Tên model HuggingFace
+        cache_root: Thư mục gốc lưu trọng số đã lượng tử hóa
+
+    Returns:
+        transformers pipeline chạy model int8 trên CPU (thư mục cache chứa
+        model_int8.pt và trọng số fp32 gốc)
+    """
+    import torch
+    from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer, pipeline
+
+    target = os.path.join(cache_root, model_id.replace('/', '__'))
+    weights_path = os.path.join(target, "model_int8.pt")
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+
+    if os.path.exists(weights_path):
+        # Cache tạo trước khi lưu kèm bản fp32 không có config.json
+        has_config = os.path.exists(os.path.join(target, "config.json"))
+        config = AutoConfig.from_pretrained(target if has_config else model_id)
+        model = quantize_model(AutoModelForSequenceClassification.from_config(config).eval())
+        model.load_state_dict(torch.load(weights_path))
+    else:
+        print(f"Đang lượng tử hóa int8 {model_id}...")
+        fp32 = AutoModelForSequenceClassification.from_pretrained(model_id).eval()
+        os.makedirs(target, exist_ok=True)
+        fp32.save_pretrained(target)
+        model = quantize_model(fp32)
+        tmp_path = weights_path + ".tmp"
+        torch.save(model.state_dict(), tmp_path)
+        os.replace(tmp_path, weights_path)
+        print(f"✓ Đã lưu trọng số int8 vào {target}")
+
+    # Lượng tử hóa động chỉ chạy trên CPU
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer, device=-1)
@@ -1,7 +1,202 @@
-from transformers import pipeline
-from typing import Dict
-import torch
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterable, Iterator, List
+import asyncio
+import queue
 import re
+import threading
+import time
+import unicodedata
+
+try:
+    from .prediction_cache import PredictionCache
+    from .stage_timings import StageTimings
+except ImportError:
+    from prediction_cache import PredictionCache
+    from stage_timings import StageTimings
+
+
+class KeywordMatcher:
+    """
+    Bộ đếm từ khóa nhiều nhóm dùng automaton Aho-Corasick
+    
+    Các danh sách từ khóa được biên dịch một lần thành một automaton duy nhất,
+    mỗi câu chỉ cần quét một lượt (tuyến tính theo độ dài câu) để tìm tất cả
+    từ khóa của mọi nhóm, không phụ thuộc kích thước từ điển.
+    
+    Kết quả giống hệt cách đếm `sum(1 for word in keywords if word in text)`:
+    mỗi từ khóa xuất hiện (dạng chuỗi con) được tính một lần, từ khóa bị lặp
+    trong danh sách được tính đúng số lần lặp.
+    """
+    
+    def __init__(self, groups: List[List[str]]):
+        """
+        Biên dịch automaton
+        
+        Args:
+            groups: Danh sách các nhóm từ khóa (VD: [tích cực, tiêu cực, trung tính])
+        """
+        self.num_groups = len(groups)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        self._weights = []  # pattern id -> số lần xuất hiện trong từng nhóm
+        
+        pattern_ids = {}
+        for g, keywords in enumerate(groups):
+            for word in keywords:
+                if not word:
+                    continue
+                pid = pattern_ids.get(word)
+                if pid is None:
+                    pid = pattern_ids[word] = len(self._weights)
+                    self._weights.append([0] * self.num_groups)
+                    self._insert(word, pid)
+                self._weights[pid][g] += 1
+        self._weights = [tuple(w) for w in self._weights]
+        self._build_fail_links()
+    
+    def _insert(self, word: str, pid: int):
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (pid,)
+    
+    def _build_fail_links(self):
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+    
+    def count(self, text: str) -> tuple:
+        """
+        Đếm số từ khóa mỗi nhóm xuất hiện trong câu (một lượt quét)
+        
+        Args:
+            text: Câu văn (đã chuyển chữ thường)
+            
+        Returns:
+            Tuple số lượng theo thứ tự các nhóm
+        """
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        hit_states = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                hit_states.add(state)
+        
+        counts = [0] * self.num_groups
+        found = set()
+        for state in hit_states:
+            found.update(out[state])
+        for pid in found:
+            for g, w in enumerate(self._weights[pid]):
+                counts[g] += w
+        return tuple(counts)
+    
+    def count_many(self, texts: List[str]) -> List[tuple]:
+        """
+        Đếm từ khóa cho nhiều câu cùng lúc
+        
+        Args:
+            texts: Danh sách câu văn (đã chuyển chữ thường)
+            
+        Returns:
+            Danh sách tuple số lượng, cùng thứ tự với đầu vào
+        """
+        count = self.count
+        return [count(text) for text in texts]
+
+
+class TextPreprocessor:
+    """
+    Pipeline tiền xử lý được biên dịch một lần, áp dụng trong một lượt
+    
+    - Chuẩn hóa Unicode NFC (dấu tiếng Việt dạng tổ hợp và dựng sẵn cho cùng kết quả)
+    - Loại bỏ khoảng trắng thừa ở hai đầu
+    - Thay thế từ theo từ điển nhỏ bằng một regex duy nhất (bỏ qua cặp giống hệt nhau)
+    - Lọc ký tự bằng một regex đã biên dịch sẵn
+    """
+    
+    # Từ điển chuẩn hóa các từ phổ biến
+    REPLACEMENTS = {
+        'rất': 'rất',
+        'dở': 'dở',
+        'tệ': 'tệ',
+        'tuyệt': 'tuyệt',
+        'hay': 'hay',
+        'buồn': 'buồn',
+        'vui': 'vui',
+        'mệt': 'mệt',
+        'ổn': 'ổn',
+        'tốt': 'tốt',
+    }
+    
+    # Loại bỏ ký tự đặc biệt không cần thiết, giữ chữ cái và dấu câu cơ bản
+    # (\w của Unicode đã bao gồm toàn bộ chữ cái có dấu tiếng Việt)
+    DROP_PATTERN = re.compile(r'[^\w\s.,!?]')
+    
+    def __init__(self, replacements: Dict[str, str] = None):
+        """
+        Args:
+            replacements: Từ điển thay thế (mặc định REPLACEMENTS)
+        """
+        if replacements is None:
+            replacements = self.REPLACEMENTS
+        self.replacements = {
+            unicodedata.normalize('NFC', old): unicodedata.normalize('NFC', new)
+            for old, new in replacements.items()
+            if unicodedata.normalize('NFC', old) != unicodedata.normalize('NFC', new)
+        }
+        if self.replacements:
+            # Ưu tiên từ dài hơn khi các từ chồng lấn nhau
+            alternatives = sorted(self.replacements, key=len, reverse=True)
+            self._replace_pattern = re.compile('|'.join(map(re.escape, alternatives)))
+        else:
+            self._replace_pattern = None
+    
+    def __call__(self, text: str) -> str:
+        if not text:
+            return ""
+        text = unicodedata.normalize('NFC', text).strip()
+        if self._replace_pattern is not None:
+            text = self._replace_pattern.sub(lambda m: self.replacements[m.group(0)], text)
+        return self.DROP_PATTERN.sub('', text)
+    
+    def batch(self, texts: List[str]) -> List[str]:
+        """
+        Tiền xử lý nhiều câu cùng lúc
+        
+        Args:
+            texts: Danh sách câu văn gốc
+            
+        Returns:
+            Danh sách câu đã chuẩn hóa, cùng thứ tự
+        """
+        call = self.__call__
+        return [call(text) for text in texts]
+
 
 class SentimentAnalyzer:
     """
@@ -19,15 +214,76 @@ class SentimentAnalyzer:
     [Core Engine: Lưu & hiển thị]
     """
     
-    def __init__(self, model_name: str = "phobert"):
+    # Ranh giới câu con khi chia văn bản dài
+    SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+    
+    def __init__(self, model_name: str = "phobert", cache_size: int = 1024,
+                 cache_ttl: float = None, cache_path: str = None, lazy: bool = True,
+                 backend: str = "torch", onnx_cache_dir: str = "models/onnx",
+                 quantize: bool = False, quantized_cache_dir: str = "models/quantized",
+                 max_tokens: int = 254, long_text: str = "chunk",
+                 instrument: bool = False, attach_timings: bool = False, metrics=None):
         """
         Khởi tạo pipeline sentiment analysis
         
         Args:
             model_name: Tên model ('phobert' hoặc 'distilbert')
+            backend: Engine suy luận: 'torch' (transformers pipeline) hoặc
+                'onnx' (ONNX Runtime, export một lần và cache trên đĩa)
+            onnx_cache_dir: Thư mục lưu model ONNX đã export
+            quantize: True để lượng tử hóa động int8 các lớp Linear (backend torch, CPU)
+            quantized_cache_dir: Thư mục lưu trọng số int8 đã lượng tử hóa
+            max_tokens: Ngân sách token mỗi lần gửi qua model (không tính token
+                đặc biệt; 254 vừa cửa sổ 256 của PhoBERT), None để không giới hạn
+            long_text: Cách xử lý câu dài hơn max_tokens: 'chunk' (chia theo câu
+                hoặc cửa sổ từ, chấm cả batch rồi gộp thành nhãn toàn văn bản)
+                hoặc 'truncate' (chỉ giữ phần đầu vừa ngân sách)
+            instrument: True để đo thời gian từng bước của analyze() vào
+                self.timings (xem timing_stats())
+            attach_timings: True để kèm 'timings_ms' vào kết quả (cần instrument)
+            metrics: MetricsRegistry để ghi số lượt, độ trễ, lỗi, phân bố nhãn và
+                thời gian tải model (VD: metrics.REGISTRY), None để tắt
+            lazy: True để chỉ tải model ở lần suy luận đầu tiên,
+                False để tải ngay khi khởi tạo
+            cache_size: Số kết quả model tối đa giữ trong cache bộ nhớ (0 để tắt)
+            cache_ttl: Thời gian sống của mỗi mục cache (giây), None là không hết hạn
+            cache_path: File SQLite cho cache lưu trữ (VD: "data/prediction_cache.db"),
+                None để chỉ dùng cache bộ nhớ
         """
-        self.model = None
+        self._model = None
+        self._load_lock = threading.Lock()
+        # Một thread suy luận cho aanalyze_stream: tokenizer của HF không an toàn đa luồng.
+        # Chỉ tạo ở lần stream đầu tiên, giải phóng bằng close()
+        self._stream_executor = None
+        self._executor_lock = threading.Lock()
         self.model_name = model_name
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Backend không hợp lệ: {backend}")
+        self.backend = backend
+        self.onnx_cache_dir = onnx_cache_dir
+        if quantize and backend != "torch":
+            raise ValueError("Lượng tử hóa int8 chỉ hỗ trợ backend 'torch'")
+        self.quantize = quantize
+        self.quantized_cache_dir = quantized_cache_dir
+        if long_text not in ("chunk", "truncate"):
+            raise ValueError(f"Chế độ câu dài không hợp lệ: {long_text}")
+        self.max_tokens = max_tokens
+        self.long_text = long_text
+        # Histogram thời gian từng bước, None khi tắt đo
+        self.timings = StageTimings() if instrument else None
+        # Thời gian tokenize/forward của pipeline trong lần gọi hiện tại (theo từng thread)
+        self._hook_clock = threading.local()
+        self.attach_timings = attach_timings
+        self.metrics = metrics
+        if metrics is not None:
+            self._bind_metrics(metrics)
+        # Độ chính xác trọng số, được ghi vào kết quả để so sánh A/B
+        self.precision = "int8" if quantize else "fp32"
+        # Tên model thực sự được tải (khác model_name khi phải dùng fallback)
+        self.loaded_model_name = None
+        self.cache = None
+        if cache_size > 0 or cache_path:
+            self.cache = PredictionCache(max_size=cache_size, ttl=cache_ttl, db_path=cache_path)
         self.sentiment_map = {
             'POSITIVE': 'POSITIVE',
             'NEGATIVE': 'NEGATIVE',
@@ -62,8 +318,135 @@ class SentimentAnalyzer:
         self.neutral_keywords = [
             'ổn định', 'bình thường', 'thường', 'trung bình'
         ]
+        self.compile_keywords()
+        self.preprocessor = TextPreprocessor()
+        
+        if not lazy:
+            self.load_model()
+    
+    def _bind_metrics(self, registry):
+        """Tạo sẵn các child metric (label model) để cập nhật trên đường xử lý chính"""
+        model = {'model': self.model_name}
+        self._m_requests = registry.counter(
+            'sentiment_analyze_total', 'Số lần gọi analyze()', ('model',)).labels(**model)
+        self._m_latency = registry.histogram(
+            'sentiment_analyze_seconds', 'Độ trễ analyze() (giây)', ('model',)).labels(**model)
+        self._m_batch_items = registry.counter(
+            'sentiment_batch_items_total', 'Số câu xử lý qua batch_analyze()', ('model',)).labels(**model)
+        self._m_batch_latency = registry.histogram(
+            'sentiment_batch_seconds', 'Độ trễ mỗi lần gọi batch_analyze() (giây)', ('model',)).labels(**model)
+        errors = registry.counter(
+            'sentiment_analyze_errors_total', 'Số kết quả lỗi theo nguyên nhân', ('model', 'reason'))
+        self._m_invalid = errors.labels(reason='invalid', **model)
+        self._m_failed = errors.labels(reason='exception', **model)
+        labels = registry.counter(
+            'sentiment_predictions_total', 'Phân bố nhãn cảm xúc đã trả về', ('model', 'sentiment'))
+        self._m_labels = {
+            sentiment: labels.labels(sentiment=sentiment, **model)
+            for sentiment in ('POSITIVE', 'NEGATIVE', 'NEUTRAL')
+        }
+        self._m_load = registry.gauge(
+            'sentiment_model_load_seconds', 'Thời gian tải model gần nhất (giây)', ('model',)).labels(**model)
+        self._m_loaded = registry.gauge(
+            'sentiment_model_loaded', '1 nếu model đã được tải', ('model',)).labels(**model)
+    
+    def compile_keywords(self):
+        """
+        Biên dịch các danh sách từ khóa thành một KeywordMatcher
+        
+        Gọi lại hàm này nếu thay đổi positive_keywords/negative_keywords/neutral_keywords.
+        """
+        self.keyword_matcher = KeywordMatcher([
+            self.positive_keywords,
+            self.negative_keywords,
+            self.neutral_keywords,
+        ])
+    
+    # Model HuggingFace tương ứng với từng tên model
+    MODEL_IDS = {
+        'phobert': "vinai/phobert-base-v2",
+        'distilbert': "distilbert-base-multilingual-cased",
+    }
+    
+    @property
+    def model(self):
+        """
+        Pipeline của model, được tải ở lần suy luận đầu tiên
+        
+        torch/transformers chỉ được import khi thực sự cần model, nên các
+        thao tác chỉ dùng database hoặc tiền xử lý khởi động rất nhanh.
+        """
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self.load_model()
+        return self._model
+    
+    @model.setter
+    def model(self, value):
+        if self.timings is not None and value is not None:
+            self._instrument_pipeline(value)
+        self._model = value
+    
+    # Hook của pipeline được đo riêng khi bật instrument: tên bước -> phương thức
+    PIPELINE_HOOKS = {'tokenize': 'preprocess', 'forward': '_forward'}
+    
+    def _instrument_pipeline(self, pipeline):
+        """
+        Bọc các hook preprocess (tokenize) và _forward (forward pass) của pipeline
         
-        self.load_model()
+        Pipeline của transformers gọi các hook qua self nên thay bằng thuộc tính
+        của instance là đủ; pipeline không có hook (VD: StandInPipeline) giữ nguyên.
+        """
+        clock = self._hook_clock
+        for stage, name in self.PIPELINE_HOOKS.items():
+            hook = getattr(pipeline, name, None)
+            if hook is None or getattr(hook, 'timed_stage', None) == stage:
+                continue
+            
+            def timed(*args, _hook=hook, _stage=stage, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return _hook(*args, **kwargs)
+                finally:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    setattr(clock, _stage, getattr(clock, _stage, 0.0) + elapsed)
+            
+            timed.timed_stage = stage
+            try:
+                setattr(pipeline, name, timed)
+            except AttributeError:
+                continue
+    
+    @property
+    def is_loaded(self) -> bool:
+        """Model đã được tải hay chưa"""
+        return self._model is not None
+    
+    def _build_pipeline(self, model_name: str):
+        """Tạo pipeline sentiment-analysis (import torch/transformers tại đây)"""
+        if self.backend == "onnx":
+            try:
+                from .onnx_backend import load_onnx_pipeline
+            except ImportError:
+                from onnx_backend import load_onnx_pipeline
+            return load_onnx_pipeline(self.MODEL_IDS[model_name], cache_root=self.onnx_cache_dir)
+        
+        if self.quantize:
+            try:
+                from .quantization import load_quantized_pipeline
+            except ImportError:
+                from quantization import load_quantized_pipeline
+            return load_quantized_pipeline(self.MODEL_IDS[model_name], cache_root=self.quantized_cache_dir)
+        
+        import torch
+        from transformers import pipeline
+        
+        return pipeline(
+            "sentiment-analysis",
+            model=self.MODEL_IDS[model_name],
+            device=0 if torch.cuda.is_available() else -1
+        )
     
     def load_model(self):
         """
@@ -72,24 +455,25 @@ class SentimentAnalyzer:
         Sử dụng pipeline sentiment-analysis với model phobert-base-v2 
         (tiền tệ tiếng Việt) hoặc distilbert-base-multilingual-cased (hỗ trợ đa ngôn ngữ)
         """
+        start = time.perf_counter()
+        self._load_model()
+        if self.metrics is not None:
+            self._m_load.set(time.perf_counter() - start)
+            self._m_loaded.set(1)
+    
+    def _load_model(self):
         try:
             if self.model_name == "phobert":
                 # Load PhoBERT (model tiếng Việt)
                 print("Đang tải model PhoBERT tiếng Việt...")
-                self.model = pipeline(
-                    "sentiment-analysis",
-                    model="vinai/phobert-base-v2",
-                    device=0 if torch.cuda.is_available() else -1
-                )
+                self.model = self._build_pipeline("phobert")
+                self.loaded_model_name = "phobert"
                 print("✓ Đã tải PhoBERT thành công!")
             else:
                 # Load DistilBERT multilingual
                 print("Đang tải DistilBERT multilingual...")
-                self.model = pipeline(
-                    "sentiment-analysis",
-                    model="distilbert-base-multilingual-cased",
-                    device=0 if torch.cuda.is_available() else -1
-                )
+                self.model = self._build_pipeline("distilbert")
+                self.loaded_model_name = "distilbert"
                 print("✓ Đã tải DistilBERT multilingual thành công!")
         except Exception as e:
             print(f"Lỗi khi tải model {self.model_name}: {e}")
@@ -97,18 +481,8 @@ class SentimentAnalyzer:
             try:
                 fallback_model = "distilbert" if self.model_name == "phobert" else "phobert"
                 print(f"Đang thử model {fallback_model}...")
-                if fallback_model == "phobert":
-                    self.model = pipeline(
-                        "sentiment-analysis",
-                        model="vinai/phobert-base-v2",
-                        device=0 if torch.cuda.is_available() else -1
-                    )
-                else:
-                    self.model = pipeline(
-                        "sentiment-analysis",
-                        model="distilbert-base-multilingual-cased",
-                        device=0 if torch.cuda.is_available() else -1
-                    )
+                self.model = self._build_pipeline(fallback_model)
+                self.loaded_model_name = fallback_model
                 print(f"✓ Đã tải {fallback_model} thành công!")
             except Exception as e2:
                 print(f"Lỗi khi tải fallback model: {e2}")
@@ -133,34 +507,145 @@ class SentimentAnalyzer:
         Returns:
             Câu văn đã chuẩn hóa
         """
-        if not text:
-            return ""
+        return self.preprocessor(text)
+    
+    def batch_preprocess(self, texts: List[str]) -> List[str]:
+        """
+        Bước 1 cho nhiều câu cùng lúc
         
-        # Loại bỏ khoảng trắng thừa
-        text = text.strip()
-        
-        # Chuẩn hóa các ký tự đặc biệt phổ biến
-        replacements = {
-            'rất': 'rất',
-            'dở': 'dở',
-            'tệ': 'tệ',
-            'tuyệt': 'tuyệt',
-            'hay': 'hay',
-            'buồn': 'buồn',
-            'vui': 'vui',
-            'mệt': 'mệt',
-            'ổn': 'ổn',
-            'tốt': 'tốt',
-        }
+        Args:
+            texts: Danh sách câu văn gốc
+            
+        Returns:
+            Danh sách câu văn đã chuẩn hóa
+        """
+        return self.preprocessor.batch(texts)
+    
+    def _validate(self, text: str):
+        """
+        Bước 3: Kiểm tra - Câu nhập ≥5 ký tự
         
-        # Thay thế các từ chuẩn hóa
-        for old, new in replacements.items():
-            text = text.replace(old, new)
+        Returns:
+            Dictionary lỗi nếu câu không hợp lệ, ngược lại None
+        """
+        if not text or not text.strip() or len(text.strip()) < 5:
+            if self.metrics is not None:
+                self._m_invalid.inc()
+            return {
+                'text': text,
+                'sentiment': 'NEUTRAL',
+                'confidence': 0.0,
+                'error': 'Câu không hợp lệ, thử lại!'
+            }
+        return None
+    
+    def _keyword_scores(self, text: str) -> tuple:
+        """
+        Rule-based boost cho từ khóa rõ ràng
         
-        # Loại bỏ ký tự đặc biệt không cần thiết, giữ chữ cái và dấu câu cơ bản
-        text = re.sub(r'[^\w\s\.,!?áàảãạăắằẳẵặâấầẩẫậéèẻẽẹêếềểễệíìỉĩịóòỏõọôốồổỗộơớờởỡợúùủũụưứừửữựýỳỷỹỵđ]', '', text, flags=re.IGNORECASE)
+        Returns:
+            (keyword_sentiment, keyword_confidence, positive_count, negative_count)
+        """
+        # Đếm từ khóa tích cực, tiêu cực và trung tính trong một lượt quét
+        return self._keyword_decision(*self.keyword_matcher.count(unicodedata.normalize('NFC', text.lower())))
+    
+    def batch_keyword_scores(self, texts: List[str]) -> List[tuple]:
+        """
+        Rule-based boost cho nhiều câu cùng lúc
         
-        return text
+        Args:
+            texts: Danh sách câu văn gốc
+            
+        Returns:
+            Danh sách (keyword_sentiment, keyword_confidence, positive_count, negative_count)
+        """
+        counts = self.keyword_matcher.count_many([unicodedata.normalize('NFC', text.lower()) for text in texts])
+        return [self._keyword_decision(*c) for c in counts]
+    
+    @staticmethod
+    def _keyword_decision(positive_count: int, negative_count: int, neutral_count: int) -> tuple:
+        keyword_sentiment = None
+        keyword_confidence = 0.0
+        
+        # Nếu có từ khóa rõ ràng, ưu tiên rule-based
+        if neutral_count > 0 and positive_count == 0 and negative_count == 0:
+            keyword_sentiment = 'NEUTRAL'
+            keyword_confidence = 0.70
+        elif positive_count > negative_count and positive_count > 0:
+            keyword_sentiment = 'POSITIVE'
+            keyword_confidence = min(0.75 + (positive_count * 0.1), 0.95)
+        elif negative_count > positive_count and negative_count > 0:
+            keyword_sentiment = 'NEGATIVE'
+            keyword_confidence = min(0.75 + (negative_count * 0.1), 0.95)
+        
+        return keyword_sentiment, keyword_confidence, positive_count, negative_count
+    
+    def _combine(self, text: str, result: dict, keyword_scores: tuple) -> Dict[str, any]:
+        """
+        Hợp nhất nhãn của model với kết quả rule-based
+        
+        Args:
+            text: Câu văn gốc
+            result: Kết quả của pipeline cho câu này ({'label', 'score'})
+            keyword_scores: Kết quả của _keyword_scores()
+            
+        Returns:
+            Dictionary kết quả {text, sentiment, confidence, raw_label, precision}
+            (thêm chunks và truncated với câu dài hơn ngân sách token)
+        """
+        keyword_sentiment, keyword_confidence, positive_count, negative_count = keyword_scores
+        
+        # Lấy nhãn và confidence
+        raw_label = result['label']
+        confidence = result['score']
+        
+        # Chuyển đổi nhãn sang format chuẩn (POSITIVE/NEGATIVE/NEUTRAL)
+        sentiment = self.sentiment_map.get(raw_label.upper(), 'NEUTRAL')
+        
+        # Nếu có keyword match mạnh và model không chắc chắn, ưu tiên keyword
+        if keyword_sentiment and confidence < 0.7:
+            sentiment = keyword_sentiment
+            confidence = keyword_confidence
+        # Nếu keyword rất mạnh (1+ từ negative mạnh như tệ/kém), override model
+        elif keyword_sentiment == 'NEGATIVE' and (negative_count >= 1) and confidence < 0.85:
+            sentiment = keyword_sentiment
+            confidence = max(confidence, keyword_confidence)
+        # Nếu keyword positive mạnh (2+ từ), override model
+        elif keyword_sentiment == 'POSITIVE' and (positive_count >= 2):
+            sentiment = keyword_sentiment
+            confidence = max(confidence, keyword_confidence)
+        
+        # Bước 3: Validation - Nếu xác suất <0.5, trả về NEUTRAL mặc định
+        if confidence < 0.5 and not keyword_sentiment:
+            sentiment = 'NEUTRAL'
+        
+        # Bước 3: Tạo dictionary format: {text, sentiment}
+        combined = {
+            'text': text,
+            'sentiment': sentiment,
+            'confidence': confidence,
+            'raw_label': raw_label,
+            'precision': self.precision
+        }
+        # Câu dài: kèm điểm của từng đoạn đã chấm
+        if 'chunks' in result:
+            combined['chunks'] = result['chunks']
+            combined['truncated'] = result['truncated']
+        if self.metrics is not None:
+            self._m_labels[sentiment].inc()
+        return combined
+    
+    def _error_result(self, text: str, e: Exception) -> Dict[str, any]:
+        """Bước 3: Xử lý lỗi - trả về dictionary lỗi "Câu không hợp lệ, thử lại!" """
+        print(f"Lỗi khi phân tích: {e}")
+        if self.metrics is not None:
+            self._m_failed.inc()
+        return {
+            'text': text,
+            'sentiment': 'NEUTRAL',
+            'confidence': 0.0,
+            'error': f'Câu không hợp lệ, thử lại! ({str(e)})'
+        }
     
     def analyze(self, text: str) -> Dict[str, any]:
         """
@@ -176,98 +661,471 @@ class SentimentAnalyzer:
         Returns:
             Dictionary theo format: {"text": "câu", "sentiment": "POSITIVE/NEGATIVE/NEUTRAL"}
         """
+        if self.metrics is None:
+            return self._analyze(text)
+        start = time.perf_counter()
+        result = self._analyze(text)
+        self._m_latency.observe(time.perf_counter() - start)
+        self._m_requests.inc()
+        return result
+    
+    def _analyze(self, text: str) -> Dict[str, any]:
+        # Khi tắt đo thời gian, mỗi bước chỉ tốn thêm một phép kiểm tra
+        timed = self.timings is not None
+        if timed:
+            t0 = time.perf_counter()
+        
         # Bước 3: Kiểm tra - Câu nhập ≥5 ký tự
-        if not text or not text.strip() or len(text.strip()) < 5:
-            return {
-                'text': text,
-                'sentiment': 'NEUTRAL',
-                'confidence': 0.0,
-                'error': 'Câu không hợp lệ, thử lại!'
-            }
+        invalid = self._validate(text)
+        if invalid is not None:
+            return invalid
         
         try:
             # Bước 1: Tiền xử lý
             processed_text = self.preprocess(text)
+            if timed:
+                t1 = time.perf_counter()
             
             # Rule-based boost cho từ khóa rõ ràng
-            text_lower = text.lower()
-            keyword_sentiment = None
-            keyword_confidence = 0.0
-            
-            # Đếm từ khóa tích cực, tiêu cực và trung tính
-            positive_count = sum(1 for word in self.positive_keywords if word in text_lower)
-            negative_count = sum(1 for word in self.negative_keywords if word in text_lower)
-            neutral_count = sum(1 for word in self.neutral_keywords if word in text_lower)
-            
-            # Nếu có từ khóa rõ ràng, ưu tiên rule-based
-            if neutral_count > 0 and positive_count == 0 and negative_count == 0:
-                keyword_sentiment = 'NEUTRAL'
-                keyword_confidence = 0.70
-            elif positive_count > negative_count and positive_count > 0:
-                keyword_sentiment = 'POSITIVE'
-                keyword_confidence = min(0.75 + (positive_count * 0.1), 0.95)
-            elif negative_count > positive_count and negative_count > 0:
-                keyword_sentiment = 'NEGATIVE'
-                keyword_confidence = min(0.75 + (negative_count * 0.1), 0.95)
+            keyword_scores = self._keyword_scores(text)
+            if timed:
+                t2 = time.perf_counter()
             
             # Bước 2: Phân loại cảm xúc
             # Sử dụng pipeline sentiment-analysis với model
             # Gửi câu chuẩn hóa qua pipeline, lấy nhãn có xác suất cao nhất
-            result = self.model(processed_text)[0]
-            
-            # Lấy nhãn và confidence
-            raw_label = result['label']
-            confidence = result['score']
-            
-            # Chuyển đổi nhãn sang format chuẩn (POSITIVE/NEGATIVE/NEUTRAL)
-            sentiment = self.sentiment_map.get(raw_label.upper(), 'NEUTRAL')
+            # (câu dài được chia đoạn theo ngân sách token rồi gộp lại)
+            if timed:
+                self._hook_clock.__dict__.clear()
+            chunks, truncated = self._split_long(processed_text)
+            if len(chunks) == 1 and not truncated:
+                result = self._predict(processed_text)
+            else:
+                result = self._aggregate(chunks, self._predict_many(chunks), truncated)
+            if timed:
+                t3 = time.perf_counter()
             
-            # Nếu có keyword match mạnh và model không chắc chắn, ưu tiên keyword
-            if keyword_sentiment and confidence < 0.7:
-                sentiment = keyword_sentiment
-                confidence = keyword_confidence
-            # Nếu keyword rất mạnh (1+ từ negative mạnh như tệ/kém), override model
-            elif keyword_sentiment == 'NEGATIVE' and (negative_count >= 1) and confidence < 0.85:
-                sentiment = keyword_sentiment
-                confidence = max(confidence, keyword_confidence)
-            # Nếu keyword positive mạnh (2+ từ), override model
-            elif keyword_sentiment == 'POSITIVE' and (positive_count >= 2):
-                sentiment = keyword_sentiment
-                confidence = max(confidence, keyword_confidence)
+            combined = self._combine(text, result, keyword_scores)
+            if timed:
+                self._record_timings(combined, t0, t1, t2, t3, time.perf_counter())
+            return combined
             
-            # Bước 3: Validation - Nếu xác suất <0.5, trả về NEUTRAL mặc định
-            if confidence < 0.5 and not keyword_sentiment:
-                sentiment = 'NEUTRAL'
+        except Exception as e:
+            return self._error_result(text, e)
+    
+    def _record_timings(self, result: dict, t0: float, t1: float, t2: float, t3: float, t4: float):
+        # model gồm tra cache, chia đoạn, tokenize và forward pass của pipeline;
+        # tokenize/forward chỉ có khi pipeline có hook và thật sự chạy (không trúng cache)
+        durations = {
+            'preprocess': (t1 - t0) * 1000,
+            'keyword': (t2 - t1) * 1000,
+            'model': (t3 - t2) * 1000,
+            **self._hook_clock.__dict__,
+            'combine': (t4 - t3) * 1000,
+            'total': (t4 - t0) * 1000,
+        }
+        self.timings.record(durations)
+        if self.attach_timings:
+            result['timings_ms'] = durations
+    
+    def timing_stats(self) -> dict:
+        """
+        Thống kê thời gian từng bước của analyze()
+        
+        Returns:
+            {bước: {count, mean_ms, p50_ms, p95_ms, p99_ms, ...}} (xem
+            StageTimings.snapshot) hoặc None nếu không bật instrument
+        """
+        return self.timings.snapshot() if self.timings is not None else None
+    
+    def _cache_key_model(self) -> str:
+        name = self.loaded_model_name or self.model_name
+        if self.backend != "torch":
+            name = f"{name}:{self.backend}"
+        if self.precision != "fp32":
+            name = f"{name}:{self.precision}"
+        return name
+    
+    def _predict(self, processed_text: str) -> dict:
+        """
+        Chạy model cho một câu đã chuẩn hóa, dùng cache nếu có
+        
+        Returns:
+            Dictionary {'label', 'score'} của nhãn có xác suất cao nhất
+        """
+        if self.cache is not None:
+            cached = self.cache.get(self._cache_key_model(), processed_text)
+            if cached is not None:
+                return cached
+        
+        result = self.model(processed_text, truncation=True)[0]
+        
+        if self.cache is not None:
+            self.cache.put(self._cache_key_model(), processed_text, result)
+        return result
+    
+    def _predict_many(self, texts: List[str], batch_size: int = 32) -> List[dict]:
+        """
+        Chạy model cho nhiều đoạn theo từng batch, dùng cache nếu có
+        
+        Args:
+            texts: Các đoạn đã chuẩn hóa
+            batch_size: Số đoạn tối đa mỗi lần gửi qua model
             
-            # Bước 3: Tạo dictionary format: {text, sentiment}
-            return {
-                'text': text,
+        Returns:
+            Danh sách {'label', 'score'} cùng thứ tự đầu vào
+        """
+        outputs = {}
+        if self.cache is not None:
+            for text in texts:
+                if text not in outputs:
+                    cached = self.cache.get(self._cache_key_model(), text)
+                    if cached is not None:
+                        outputs[text] = cached
+        misses = list(dict.fromkeys(t for t in texts if t not in outputs))
+        for start in range(0, len(misses), batch_size):
+            batch = misses[start:start + batch_size]
+            results = self.model(batch, batch_size=len(batch), truncation=True)
+            results = [r[0] if isinstance(r, list) else r for r in results]
+            if self.cache is not None:
+                self.cache.put_many(self._cache_key_model(), zip(batch, results))
+            outputs.update(zip(batch, results))
+        return [outputs[t] for t in texts]
+    
+    def _split_long(self, text: str) -> tuple:
+        """
+        Chia câu dài hơn max_tokens thành các đoạn vừa ngân sách token
+        
+        Các câu con (tách theo dấu . ! ?) được ghép dần thành đoạn; câu con nào
+        tự nó vượt ngân sách thì được cắt thành cửa sổ từ. Ở chế độ 'truncate'
+        chỉ giữ phần đầu của văn bản.
+        
+        Returns:
+            (danh sách đoạn, True nếu văn bản bị cắt bớt)
+        """
+        budget = self.max_tokens
+        # Mỗi token dài ít nhất một ký tự: câu ngắn không cần tokenize
+        if budget is None or len(text) <= budget:
+            return [text], False
+        total = self._token_lengths([text])[0]
+        if total <= budget:
+            return [text], False
+        
+        if self.long_text == "truncate":
+            words = text.split()
+            keep = max(len(words) * budget // total, 1)
+            return [' '.join(words[:keep])], True
+        
+        sentences = [s for s in self.SENTENCE_PATTERN.split(text) if s.strip()]
+        chunks, current, current_len = [], [], 0
+        for sentence, length in zip(sentences, self._token_lengths(sentences)):
+            if current and current_len + length > budget:
+                chunks.append(' '.join(current))
+                current, current_len = [], 0
+            if length <= budget:
+                current.append(sentence)
+                current_len += length
+                continue
+            # Câu con quá dài: cửa sổ từ với số từ ước lượng theo tỉ lệ token/từ
+            words = sentence.split()
+            step = max(len(words) * budget // length, 1)
+            chunks.extend(' '.join(words[k:k + step]) for k in range(0, len(words), step))
+        if current:
+            chunks.append(' '.join(current))
+        return chunks, False
+    
+    def _aggregate(self, chunks: List[str], outputs: List[dict], truncated: bool) -> dict:
+        """
+        Gộp kết quả các đoạn thành nhãn toàn văn bản
+        
+        Mỗi đoạn bỏ phiếu cho nhãn của nó với trọng số = số từ × xác suất;
+        nhãn có tổng lớn nhất thắng, confidence là tổng đó chia tổng số từ.
+        
+        Returns:
+            Dictionary {'label', 'score', 'chunks', 'truncated'}
+        """
+        total = 0
+        mass = {}      # nhãn chuẩn -> tổng trọng số
+        raw_mass = {}  # (nhãn chuẩn, nhãn gốc) -> tổng trọng số
+        details = []
+        for chunk, output in zip(chunks, outputs):
+            weight = max(len(chunk.split()), 1)
+            sentiment = self.sentiment_map.get(output['label'].upper(), 'NEUTRAL')
+            total += weight
+            mass[sentiment] = mass.get(sentiment, 0.0) + weight * output['score']
+            key = (sentiment, output['label'])
+            raw_mass[key] = raw_mass.get(key, 0.0) + weight * output['score']
+            details.append({
+                'text': chunk,
                 'sentiment': sentiment,
-                'confidence': confidence,
-                'raw_label': raw_label
-            }
-            
-        except Exception as e:
-            # Bước 3: Xử lý lỗi - hiển thị pop-up "Câu không hợp lệ, thử lại!"
-            print(f"Lỗi khi phân tích: {e}")
-            return {
-                'text': text,
-                'sentiment': 'NEUTRAL',
-                'confidence': 0.0,
-                'error': f'Câu không hợp lệ, thử lại! ({str(e)})'
-            }
+                'label': output['label'],
+                'score': output['score'],
+            })
+        
+        best = max(mass, key=mass.get)
+        label = max((k for k in raw_mass if k[0] == best), key=raw_mass.get)[1]
+        return {
+            'label': label,
+            'score': mass[best] / total,
+            'chunks': details,
+            'truncated': truncated,
+        }
+    
+    def cache_stats(self) -> dict:
+        """
+        Thống kê cache kết quả model
+        
+        Returns:
+            Dictionary {hits, misses, evictions, persistent_hits, size, hit_rate}
+            hoặc None nếu cache bị tắt
+        """
+        return self.cache.stats() if self.cache is not None else None
     
-    def batch_analyze(self, texts: list) -> list:
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """
+        Độ dài token của từng câu, dùng để sắp xếp batch giảm padding
+        
+        Dùng tokenizer của pipeline nếu có, ngược lại ước lượng bằng số từ.
+        """
+        tokenizer = getattr(self.model, 'tokenizer', None)
+        if tokenizer is not None:
+            try:
+                encoded = tokenizer(texts, add_special_tokens=False)['input_ids']
+                return [len(ids) for ids in encoded]
+            except Exception:
+                pass
+        return [len(t.split()) for t in texts]
+    
+    def batch_analyze(self, texts: list, batch_size: int = 32) -> list:
         """
         Phân tích nhiều câu văn cùng lúc
         
+        Kiểm tra, tiền xử lý và đếm từ khóa được chạy trên toàn bộ danh sách,
+        sau đó các câu hợp lệ chưa có trong cache được sắp xếp theo độ dài token
+        và gửi qua model theo từng batch (giảm padding). Kết quả giữ nguyên thứ
+        tự đầu vào và giống hệt kết quả của analyze() cho từng câu. Câu dài hơn
+        max_tokens được chia đoạn và các đoạn được chấm chung batch với câu khác.
+        
         Args:
             texts: Danh sách các câu văn
+            batch_size: Số câu tối đa mỗi lần gửi qua model
             
         Returns:
             Danh sách kết quả phân tích
         """
-        results = []
-        for text in texts:
-            results.append(self.analyze(text))
+        if self.metrics is not None:
+            started = time.perf_counter()
+        results = [None] * len(texts)
+        pending = []  # (vị trí, câu đã chuẩn hóa, keyword_scores)
+        
+        valid = []
+        for i, text in enumerate(texts):
+            invalid = self._validate(text)
+            if invalid is not None:
+                results[i] = invalid
+                continue
+            valid.append(i)
+        
+        valid_texts = [texts[i] for i in valid]
+        keyword_scores = self.batch_keyword_scores(valid_texts)
+        try:
+            processed = self.batch_preprocess(valid_texts)
+        except Exception:
+            processed = None
+        for k, (i, scores) in enumerate(zip(valid, keyword_scores)):
+            try:
+                text = processed[k] if processed is not None else self.preprocess(texts[i])
+                pending.append((i, text, scores))
+            except Exception as e:
+                results[i] = self._error_result(texts[i], e)
+        
+        # Câu dài được chia đoạn; mỗi đoạn là một đơn vị gửi qua model
+        docs = []  # (vị trí, danh sách đoạn, cắt bớt?, keyword_scores)
+        for i, processed, keyword_scores in pending:
+            try:
+                # Câu dài cần tokenizer, tức là có thể phải tải model
+                chunks, truncated = self._split_long(processed)
+            except Exception as e:
+                results[i] = self._error_result(texts[i], e)
+                continue
+            docs.append((i, chunks, truncated, keyword_scores))
+        
+        # Chỉ gửi các đoạn chưa có trong cache qua model (mỗi đoạn một lần)
+        outputs = {}
+        misses = []
+        for chunk in dict.fromkeys(c for _, chunks, _, _ in docs for c in chunks):
+            cached = self.cache.get(self._cache_key_model(), chunk) if self.cache is not None else None
+            if cached is not None:
+                outputs[chunk] = cached
+            else:
+                misses.append(chunk)
+        
+        failed = set()
+        load_error = None
+        lengths = None
+        if misses:
+            try:
+                # Lần đầu truy cập self.model sẽ tải model
+                lengths = self._token_lengths(misses)
+            except Exception as e:
+                load_error = e
+                failed.update(misses)
+        
+        if lengths is not None:
+            order = sorted(range(len(misses)), key=lengths.__getitem__)
+            
+            for start in range(0, len(order), batch_size):
+                chunk = [misses[j] for j in order[start:start + batch_size]]
+                try:
+                    batch_outputs = self.model(chunk, batch_size=len(chunk), truncation=True)
+                except Exception:
+                    failed.update(chunk)
+                    continue
+                
+                batch_outputs = [output[0] if isinstance(output, list) else output for output in batch_outputs]
+                if self.cache is not None:
+                    self.cache.put_many(self._cache_key_model(), zip(chunk, batch_outputs))
+                outputs.update(zip(chunk, batch_outputs))
+        
+        for i, chunks, truncated, keyword_scores in docs:
+            if load_error is not None and failed.intersection(chunks):
+                # Không tải được model: trả lỗi như analyze() mà không thử tải lại từng câu
+                results[i] = self._error_result(texts[i], load_error)
+            elif failed.intersection(chunks):
+                # Lỗi trong batch: chạy lại riêng câu này để giữ đúng kết quả lỗi của analyze()
+                results[i] = self._analyze(texts[i])
+            elif len(chunks) == 1 and not truncated:
+                results[i] = self._combine(texts[i], outputs[chunks[0]], keyword_scores)
+            else:
+                doc = self._aggregate(chunks, [outputs[c] for c in chunks], truncated)
+                results[i] = self._combine(texts[i], doc, keyword_scores)
+        
+        if self.metrics is not None:
+            self._m_batch_latency.observe(time.perf_counter() - started)
+            self._m_batch_items.inc(len(texts))
         return results
+    
+    def analyze_stream(self, texts: Iterable[str], batch_size: int = 32, prefetch: int = 2) -> Iterator[Dict]:
+        """
+        Phân tích một luồng câu văn, trả kết quả dần dần (generator)
+        
+        Đầu vào được đọc theo từng batch bởi một thread nền, tối đa `prefetch`
+        batch được đọc trước trong lúc model xử lý batch hiện tại, nên bộ nhớ
+        không phụ thuộc độ dài luồng. Kết quả giữ đúng thứ tự đầu vào.
+        
+        Args:
+            texts: Iterable bất kỳ (list, file, generator...)
+            batch_size: Số câu mỗi batch gửi qua batch_analyze
+            prefetch: Số batch tối đa được đọc trước
+            
+        Yields:
+            Kết quả phân tích của từng câu
+        """
+        batches = queue.Queue(maxsize=max(prefetch, 1))
+        stop = threading.Event()
+        done = object()
+        
+        def offer(item) -> bool:
+            # put có timeout để thread dừng được khi consumer bỏ ngang
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            try:
+                iterator = iter(texts)
+                while True:
+                    batch = list(islice(iterator, batch_size))
+                    if not batch:
+                        offer(done)
+                        return
+                    if not offer(batch):
+                        return
+            except BaseException as e:
+                offer(e)
+        
+        producer = threading.Thread(target=produce, name="analyze-stream-prefetch", daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield from self.batch_analyze(item, batch_size=batch_size)
+        finally:
+            stop.set()
+    
+    def _get_stream_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._stream_executor is None:
+                self._stream_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analyze-stream")
+            return self._stream_executor
+    
+    def close(self):
+        """
+        Giải phóng thread suy luận của aanalyze_stream
+        
+        Batch đang chạy vẫn được hoàn tất. Analyzer vẫn dùng tiếp được: lần
+        stream sau sẽ tạo thread mới.
+        """
+        with self._executor_lock:
+            executor, self._stream_executor = self._stream_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+    
+    async def aanalyze_stream(self, texts, batch_size: int = 32, prefetch: int = 2) -> AsyncIterator[Dict]:
+        """
+        Phiên bản async của analyze_stream
+        
+        Nhận iterable thường hoặc async iterable; suy luận chạy trên một
+        thread riêng của analyzer để không chặn event loop, nên mỗi lúc chỉ
+        có một batch_analyze đang chạy. Batch tiếp theo được gom trong lúc
+        batch hiện tại đang chạy (tối đa `prefetch` batch chờ xử lý).
+        
+        Args:
+            texts: Iterable hoặc async iterable các câu văn
+            batch_size: Số câu mỗi batch
+            prefetch: Số batch đầu vào tối đa được gom sẵn chờ suy luận
+            
+        Yields:
+            Kết quả phân tích của từng câu
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_stream_executor()
+        pending = []
+        
+        async def batches():
+            batch = []
+            if hasattr(texts, '__aiter__'):
+                async for text in texts:
+                    batch.append(text)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+            else:
+                for text in texts:
+                    batch.append(text)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+            if batch:
+                yield batch
+        
+        try:
+            async for batch in batches():
+                pending.append(loop.run_in_executor(executor, self.batch_analyze, batch, batch_size))
+                if len(pending) > max(prefetch, 1):
+                    for result in await pending.pop(0):
+                        yield result
+            while pending:
+                for result in await pending.pop(0):
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,338 @@
+"""
+HTTP service bất đồng bộ (asyncio) cho phân loại cảm xúc, gom request thành micro-batch
+
+Chạy: python src/server.py [--host 127.0.0.1] [--port 8000] [--model phobert] [--save]
+                           [--metrics-port 9100]
+
+Endpoint:
+- POST /analyze        {"text": "..."}          → kết quả analyze()
+- POST /analyze/batch  {"texts": ["...", ...]}  → {"results": [...]}
+- GET  /health                                  → trạng thái service
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+class QueueFullError(Exception):
+    """Hàng đợi suy luận đã đầy (backpressure)"""
+
+
+class BatchTooLargeError(Exception):
+    """Request có nhiều câu hơn sức chứa của hàng đợi, thử lại cũng không được"""
+
+
+class MicroBatcher:
+    """
+    Gom các request đồng thời thành micro-batch động
+
+    Một batch được gửi đi khi đủ max_batch_size câu hoặc khi câu đầu tiên
+    đã chờ quá max_wait_ms. Suy luận chạy trong thread pool để không chặn
+    event loop; kết quả được trả về đúng future của từng request.
+    """
+
+    def __init__(self, analyzer, db=None, max_batch_size: int = 32,
+                 max_wait_ms: float = 10, max_queue: int = 1024, metrics=None):
+        """
+        Args:
+            analyzer: SentimentAnalyzer (hoặc object có batch_analyze)
+            db: SentimentDatabase để lưu kết quả, None để không lưu
+            max_batch_size: Số câu tối đa mỗi batch
+            max_wait_ms: Thời gian chờ tối đa để gom batch (ms)
+            max_queue: Số câu tối đa đang chờ trong hàng đợi
+            metrics: MetricsRegistry để ghi kích thước batch và độ sâu hàng đợi
+        """
+        self.analyzer = analyzer
+        self.db = db
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self._queue: asyncio.Queue = None
+        self._worker: asyncio.Task = None
+        # Một thread suy luận: các batch chạy tuần tự, song song nằm trong model
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.batches = 0
+        self.processed = 0
+        self.metrics = metrics
+        if metrics is not None:
+            self._m_batch_size = metrics.histogram(
+                'sentiment_microbatch_size', 'Số câu mỗi micro-batch',
+                buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+            self._m_queue_depth = metrics.gauge('sentiment_queue_depth', 'Số câu đang chờ suy luận')
+            self._m_rejected = metrics.counter('sentiment_queue_rejected_total', 'Số câu bị từ chối do hàng đợi đầy')
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        # Chờ batch đang chạy xong trong thread khác, không chặn event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit_many(self, texts: List[str]) -> List[Dict]:
+        """
+        Đưa nhiều câu vào hàng đợi và chờ kết quả
+
+        Raises:
+            BatchTooLargeError: Số câu vượt max_queue (không bao giờ xếp hàng được)
+            QueueFullError: Hàng đợi không đủ chỗ cho toàn bộ các câu
+        """
+        if len(texts) > self.max_queue:
+            raise BatchTooLargeError(f"Tối đa {self.max_queue} câu mỗi request")
+        if self._queue.qsize() + len(texts) > self.max_queue:
+            if self.metrics is not None:
+                self._m_rejected.inc(len(texts))
+            raise QueueFullError("Hàng đợi đã đầy, thử lại sau")
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def submit(self, text: str) -> Dict:
+        return (await self.submit_many([text]))[0]
+
+    async def _collect(self) -> List[Tuple]:
+        """Lấy một batch: chờ câu đầu tiên, sau đó gom thêm đến khi đủ hoặc hết giờ"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _process(self, texts: List[str]) -> List[Dict]:
+        results = self.analyzer.batch_analyze(texts)
+        if self.db is not None:
+            self.db.save_classifications(results)
+        return results
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [text for text, _ in batch]
+            if self.metrics is not None:
+                self._m_batch_size.observe(len(batch))
+                self._m_queue_depth.set(self._queue.qsize())
+            try:
+                results = await loop.run_in_executor(self._executor, self._process, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.processed += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class SentimentServer:
+    """HTTP/1.1 tối giản trên asyncio, không cần thư viện web bên ngoài"""
+
+    MAX_BODY = 10 * 1024 * 1024
+
+    ROUTES = ('/analyze', '/analyze/batch', '/health')
+
+    def __init__(self, analyzer, db=None, max_batch_size: int = 32,
+                 max_wait_ms: float = 10, max_queue: int = 1024, metrics=None):
+        self.analyzer = analyzer
+        self.batcher = MicroBatcher(analyzer, db, max_batch_size, max_wait_ms, max_queue, metrics)
+        self._server: asyncio.AbstractServer = None
+        self._m_requests = None
+        if metrics is not None:
+            self._m_requests = metrics.counter(
+                'sentiment_http_requests_total', 'Số request HTTP theo endpoint và mã trạng thái',
+                ('path', 'status'))
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> int:
+        """
+        Khởi động service
+
+        Returns:
+            Cổng thực sự đang lắng nghe (hữu ích khi port=0)
+        """
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.stop()
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8000):
+        port = await self.start(host, port)
+        print(f"◆ Service đang chạy tại http://{host}:{port}")
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'Request không hợp lệ'}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {'error': 'Content-Length không hợp lệ'}, keep_alive=False)
+                    break
+                if length > self.MAX_BODY:
+                    await self._respond(writer, 413, {'error': 'Body quá lớn'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                keep_alive = (
+                    headers.get('connection', '').lower() != 'close'
+                    and version.upper() == 'HTTP/1.1'
+                )
+                path = path.split('?', 1)[0]
+                status, payload = await self._route(method.upper(), path, body)
+                if self._m_requests is not None:
+                    # Đường dẫn lạ gộp chung một label để tránh bùng nổ số chuỗi metric
+                    label = path if path in self.ROUTES else 'other'
+                    self._m_requests.labels(path=label, status=status).inc()
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        if path == '/health':
+            if method != 'GET':
+                return 405, {'error': 'Method không được hỗ trợ'}
+            return 200, {
+                'status': 'ok',
+                'model_loaded': getattr(self.analyzer, 'is_loaded', True),
+                'queue_depth': self.batcher.queue_depth,
+                'batches': self.batcher.batches,
+                'processed': self.batcher.processed,
+            }
+
+        if path not in ('/analyze', '/analyze/batch'):
+            return 404, {'error': 'Không tìm thấy'}
+        if method != 'POST':
+            return 405, {'error': 'Method không được hỗ trợ'}
+
+        try:
+            data = json.loads(body.decode('utf-8') or '{}')
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return 400, {'error': 'JSON không hợp lệ'}
+
+        try:
+            if path == '/analyze':
+                text = data.get('text') if isinstance(data, dict) else None
+                if not isinstance(text, str):
+                    return 400, {'error': 'Thiếu trường "text"'}
+                return 200, await self.batcher.submit(text)
+
+            texts = data.get('texts') if isinstance(data, dict) else None
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                return 400, {'error': 'Trường "texts" phải là danh sách chuỗi'}
+            return 200, {'results': await self.batcher.submit_many(texts)}
+        except BatchTooLargeError as e:
+            return 413, {'error': str(e)}
+        except QueueFullError as e:
+            return 503, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': f'Lỗi khi phân tích: {e}'}
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Dict, keep_alive: bool):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                   413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        )
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        writer.write(head.encode('latin-1') + b"\r\n" + body)
+        await writer.drain()
+
+
+def main():
+    from sentiment_analyzer import SentimentAnalyzer
+    from database import SentimentDatabase
+    from metrics import REGISTRY, start_metrics_server
+
+    parser = argparse.ArgumentParser(description="HTTP service phân loại cảm xúc")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default="phobert", choices=["phobert", "distilbert"])
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--max-queue", type=int, default=1024)
+    parser.add_argument("--save", action="store_true", help="Lưu kết quả vào SentimentDatabase")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Cổng exporter Prometheus (GET /metrics), mặc định tắt")
+    args = parser.parse_args()
+
+    metrics = REGISTRY if args.metrics_port is not None else None
+    if metrics is not None:
+        start_metrics_server(args.metrics_port, args.host)
+    analyzer = SentimentAnalyzer(model_name=args.model, lazy=False, metrics=metrics)
+    db = SentimentDatabase(metrics=metrics) if args.save else None
+    server = SentimentServer(analyzer, db, args.max_batch_size, args.max_wait_ms, args.max_queue, metrics)
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n◈ Đã dừng service.\n")
+
+
+if __name__ == "__main__":
+    main()
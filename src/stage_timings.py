@@ -0,0 +1,95 @@
+"""
+Đo thời gian từng bước xử lý trong analyze()
+
+StageTimings gom thời gian của các bước (tiền xử lý, đếm từ khóa, model
+cùng tokenize/forward pass bên trong, hợp nhất...) thành histogram với các
+bucket cố định, đủ rẻ để bật trên đường xử lý chính và đọc lại được bằng code.
+"""
+
+import bisect
+import threading
+from typing import Dict
+
+# Cận trên các bucket (ms), bucket cuối là +Inf
+BUCKETS_MS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50,
+    100, 250, 500, 1000, 2500, 5000, 10000,
+)
+
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+
+class StageTimings:
+    """Histogram thời gian theo từng bước, an toàn khi nhiều thread cùng ghi"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, _Histogram] = {}
+
+    def record(self, durations_ms: Dict[str, float]):
+        """
+        Ghi thời gian của một lần gọi
+
+        Args:
+            durations_ms: {tên bước: thời gian (ms)}
+        """
+        with self._lock:
+            for stage, value in durations_ms.items():
+                hist = self._stages.get(stage)
+                if hist is None:
+                    hist = self._stages[stage] = _Histogram()
+                hist.counts[bisect.bisect_left(BUCKETS_MS, value)] += 1
+                hist.total += value
+                if value > hist.max:
+                    hist.max = value
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    @staticmethod
+    def _percentile(counts: list, total: int, q: float, max_value: float) -> float:
+        # Ước lượng bằng cận trên của bucket chứa phân vị (không vượt giá trị lớn nhất)
+        rank = q * total
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, max_value)
+        return max_value
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        Thống kê tổng hợp của từng bước
+
+        Returns:
+            {tên bước: {count, total_ms, mean_ms, max_ms, p50_ms, p95_ms, p99_ms, buckets}}
+            trong đó buckets là danh sách (cận trên ms, số lần) không cộng dồn,
+            cận trên None là +Inf
+        """
+        with self._lock:
+            stages = {
+                name: (list(h.counts), h.total, h.max) for name, h in self._stages.items()
+            }
+
+        result = {}
+        for name, (counts, total_ms, max_ms) in stages.items():
+            count = sum(counts)
+            result[name] = {
+                'count': count,
+                'total_ms': total_ms,
+                'mean_ms': total_ms / count if count else 0.0,
+                'max_ms': max_ms,
+                'p50_ms': self._percentile(counts, count, 0.50, max_ms),
+                'p95_ms': self._percentile(counts, count, 0.95, max_ms),
+                'p99_ms': self._percentile(counts, count, 0.99, max_ms),
+                'buckets': list(zip(BUCKETS_MS + (None,), counts)),
+            }
+        return result
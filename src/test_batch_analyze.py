@@ -0,0 +1,127 @@
+"""
+Test batch_analyze so với analyze() từng câu (dùng StandInPipeline, không cần model thật)
+"""
+
+import asyncio
+import time
+
+from benchmark import StandInPipeline
+from sentiment_analyzer import SentimentAnalyzer
+
+class FlakyPipeline(StandInPipeline):
+    """StandInPipeline làm hỏng cả lần gọi nếu có câu chứa từ 'sập'"""
+
+    def __call__(self, texts, batch_size: int = None, **kwargs) -> list:
+        batch = [texts] if isinstance(texts, str) else texts
+        if any('sập' in text for text in batch):
+            raise RuntimeError("model sập")
+        return super().__call__(texts, batch_size=batch_size, **kwargs)
+
+
+def make_analyzer(**kwargs) -> SentimentAnalyzer:
+    analyzer = SentimentAnalyzer(**kwargs)
+    analyzer.model = FlakyPipeline()
+    return analyzer
+
+
+TEXTS = [
+    "Hôm nay tôi rất vui",
+    "",
+    "Món ăn này dở quá",
+    "abc",
+    "Hôm nay tôi rất vui",
+    "Máy chủ sập giữa chừng",
+    "Thời tiết bình thường",
+    "   ",
+    "Phim này hay lắm, cảm ơn bạn",
+    "Món ăn này dở quá",
+    "Tôi buồn vì thất bại",
+    "Cảm ơn bạn rất nhiều",
+    "Ngày mai đi học",
+]
+
+
+def test_matches_analyze_in_order():
+    analyzer = make_analyzer()
+    # Một phần câu đã có sẵn trong cache
+    for text in TEXTS[:3]:
+        analyzer.analyze(text)
+    hits = analyzer.cache_stats()['hits']
+
+    results = analyzer.batch_analyze(TEXTS, batch_size=4)
+    expected = [make_analyzer(cache_size=0).analyze(text) for text in TEXTS]
+    assert results == expected
+    assert [r['text'] for r in results] == TEXTS
+    assert analyzer.cache_stats()['hits'] > hits
+
+    # Câu không hợp lệ và batch lỗi trả dictionary lỗi như analyze()
+    assert 'error' in results[1] and 'error' in results[3] and 'error' in results[7]
+    assert 'model sập' in results[5]['error']
+    assert all('error' not in results[i] for i in (0, 2, 4, 6, 8, 9, 10, 11, 12))
+
+
+def test_batch_sizes_agree():
+    expected = make_analyzer(cache_size=0).batch_analyze(TEXTS, batch_size=1)
+    for batch_size in (2, 3, 32):
+        assert make_analyzer(cache_size=0).batch_analyze(TEXTS, batch_size=batch_size) == expected
+    assert make_analyzer().batch_analyze([]) == []
+
+
+def test_model_load_failure_returns_errors():
+    def broken(model_name: str):
+        raise OSError(f"không tải được {model_name}")
+
+    # Câu dài cần tokenizer để chia đoạn, tức là cũng chạm vào model
+    texts = TEXTS + ["Món ăn ngon. " * 40]
+    analyzer = SentimentAnalyzer(cache_size=0)
+    analyzer._build_pipeline = broken
+    results = analyzer.batch_analyze(texts, batch_size=4)
+
+    reference = SentimentAnalyzer(cache_size=0)
+    reference._build_pipeline = broken
+    assert results == [reference.analyze(text) for text in texts]
+    assert all('error' in result for result in results)
+    assert 'Không thể tải bất kỳ model nào!' in results[0]['error']
+    assert not analyzer.is_loaded
+
+
+def test_async_stream_runs_one_batch_at_a_time():
+    analyzer = make_analyzer(cache_size=0)
+    texts = [f"Câu đánh giá số {i}" for i in range(100)]
+    expected = analyzer.batch_analyze(texts, batch_size=8)
+    batch_analyze = analyzer.batch_analyze
+    state = {'active': 0, 'peak': 0}
+
+    def tracked(batch, batch_size):
+        state['active'] += 1
+        state['peak'] = max(state['peak'], state['active'])
+        time.sleep(0.002)
+        try:
+            return batch_analyze(batch, batch_size)
+        finally:
+            state['active'] -= 1
+
+    analyzer.batch_analyze = tracked
+
+    async def collect():
+        return [result async for result in analyzer.aanalyze_stream(texts, batch_size=8, prefetch=4)]
+
+    assert asyncio.run(collect()) == expected
+    assert state['peak'] == 1
+
+
+def test_stream_thread_is_created_lazily_and_closed():
+    analyzer = make_analyzer(cache_size=0)
+    assert analyzer._stream_executor is None
+
+    async def collect():
+        return [result async for result in analyzer.aanalyze_stream(TEXTS[:4], batch_size=2)]
+
+    assert asyncio.run(collect()) == analyzer.batch_analyze(TEXTS[:4])
+    executor = analyzer._stream_executor
+    assert executor is not None
+    analyzer.close()
+    assert analyzer._stream_executor is None and executor._shutdown
+    # Vẫn dùng tiếp được sau close()
+    assert len(asyncio.run(collect())) == 4
+    analyzer.close()
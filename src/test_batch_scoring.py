@@ -0,0 +1,83 @@
+"""
+Test đọc đầu vào và phân loại hàng loạt (workers=1, StandInPipeline thay model thật)
+"""
+
+import io
+import json
+import os
+
+import pytest
+
+from batch_scoring import detect_format, read_texts, run_batch, score_stream
+from benchmark import StandInPipeline
+from sentiment_analyzer import SentimentAnalyzer
+
+TEXTS = [f"Câu đánh giá số {i}, {'rất hay' if i % 2 else 'khá dở'}" for i in range(23)]
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    """Mọi SentimentAnalyzer dùng StandInPipeline thay vì tải model"""
+    monkeypatch.setattr(SentimentAnalyzer, '_build_pipeline', lambda self, name: StandInPipeline())
+
+
+def test_read_texts_formats():
+    plain = io.StringIO("Câu một\r\n\n   \nCâu hai, có dấu phẩy\n")
+    assert list(read_texts(plain)) == ["Câu một", "Câu hai, có dấu phẩy"]
+
+    table = io.StringIO('id,review\n1,"Hay, rất hay"\n2,\n3,"Dòng\nhai dòng"\n')
+    assert list(read_texts(table, 'csv', field='review')) == ["Hay, rất hay", "Dòng\nhai dòng"]
+
+    lines = io.StringIO('{"text": "Món ngon"}\n\n{"text": ""}\n{"other": "x"}\n{"text": 5}\n{"text": "Dở"}\n')
+    assert list(read_texts(lines, 'jsonl')) == ["Món ngon", "Dở"]
+
+    assert [detect_format(p) for p in ("a.CSV", "b.jsonl", "c.ndjson", "d.txt", "-")] == [
+        'csv', 'jsonl', 'jsonl', 'text', 'text'
+    ]
+
+
+def test_score_stream_keeps_input_order(stand_in):
+    chunks = list(score_stream(TEXTS, workers=1, chunk_size=5, cache_size=0))
+    assert [len(chunk) for chunk in chunks] == [5, 5, 5, 5, 3]
+
+    reference = SentimentAnalyzer(cache_size=0)
+    reference.model = StandInPipeline()
+    assert [r for chunk in chunks for r in chunk] == reference.batch_analyze(TEXTS)
+
+
+def test_score_stream_reads_input_lazily(stand_in):
+    pulled = []
+
+    def source():
+        for text in TEXTS:
+            pulled.append(text)
+            yield text
+
+    stream = score_stream(source(), workers=1, chunk_size=4, cache_size=0)
+    # Chỉ một chunk được đọc và xử lý tại một thời điểm
+    for n in range(1, 4):
+        next(stream)
+        assert len(pulled) == 4 * n
+    stream.close()
+    assert len(pulled) == 12
+
+
+def test_in_process_keeps_caller_environment(stand_in, monkeypatch):
+    monkeypatch.setenv('OMP_NUM_THREADS', '7')
+    monkeypatch.delenv('MKL_NUM_THREADS', raising=False)
+    before = os.environ.copy()
+    list(score_stream(TEXTS, workers=1, threads_per_worker=2, chunk_size=8, cache_size=0))
+    assert os.environ == before
+
+
+def test_run_batch_writes_jsonl(stand_in, tmp_path, make_db):
+    source = tmp_path / "reviews.csv"
+    source.write_text("review\n" + "".join(f'"{t}"\n' for t in TEXTS), encoding='utf-8')
+    output = tmp_path / "out.jsonl"
+    db = make_db()
+
+    count = run_batch(str(source), str(output), field='review', workers=1, chunk_size=10, db=db)
+    results = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert count == len(TEXTS) == len(results)
+    assert [r['text'] for r in results] == TEXTS
+    assert db.get_total_count() == len(TEXTS)
@@ -0,0 +1,126 @@
+"""
+Test schema gọn (content-addressed) của SentimentDatabase
+"""
+
+import sqlite3
+
+from database import SentimentDatabase
+
+def fill(db: SentimentDatabase):
+    rows = [
+        (f"Câu đánh giá số {i % 7}", ("POSITIVE", "NEGATIVE", "NEUTRAL")[i % 3],
+         f"2026-10-{1 + i % 3:02d} {i % 24:02d}:{i % 60:02d}:00")
+        for i in range(300)
+    ]
+    db._insert_rows(rows)
+    with db._connection() as conn:
+        conn.execute("DELETE FROM sentiments WHERE id % 11 = 0")
+
+
+def test_convert_keeps_history_and_counters(make_db):
+    db = make_db()
+    fill(db)
+    history = db.get_history(limit=1000)
+    page, cursor = db.get_history_page(limit=20)
+    next_page = db.get_history_page(limit=20, cursor=cursor)
+    statistics = db.get_statistics()
+    timeline = db.get_timeline(granularity='day')
+
+    stats = db.convert_to_compact()
+    assert db.compact
+    assert stats['entries'] == len(history)
+    assert stats['texts'] == 7
+    assert db.get_history(limit=1000) == history
+    assert db.get_history_page(limit=20) == (page, cursor)
+    assert db.get_history_page(limit=20, cursor=cursor) == next_page
+    assert db.get_statistics() == statistics
+    assert db.get_timeline(granularity='day') == timeline
+    assert db.verify_counters()
+
+    # id tiếp tục tăng sau bản ghi lớn nhất từng có
+    db.save_classification("Câu đánh giá số 1", "POSITIVE")
+    latest = db.get_history(limit=1)[0]
+    assert latest[0] == 301 and latest[1:3] == ("Câu đánh giá số 1", "POSITIVE")
+    assert db.verify_counters()
+    db.close()
+
+
+def test_compact_writes_dedupe_texts(make_db):
+    db = make_db(compact=True)
+    assert db.compact
+    db.save_classifications([("Món này ngon", "POSITIVE")] * 50 + [("Dở tệ", "NEGATIVE")] * 50)
+    writer = db.enable_write_behind(flush_interval=0.01)
+    for _ in range(20):
+        db.save_classification("Món này ngon", "POSITIVE")
+    assert db.get_statistics() == {'total': 120, 'positive': 70, 'neutral': 0, 'negative': 50}
+    assert writer.stats()['written'] == 20
+    with db._connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM history_texts").fetchone()[0] == 2
+    assert db.verify_counters()
+
+    db.clear_history()
+    assert db.get_total_count() == 0 and db.get_history() == []
+    assert db.verify_counters()
+    db.close()
+
+
+def test_reopen_detects_compact_schema(make_db):
+    db = make_db()
+    fill(db)
+    db.convert_to_compact(vacuum=False)
+    path = db.db_path
+    db.close()
+
+    reopened = SentimentDatabase(path)
+    assert reopened.compact
+    # Chèn trực tiếp vào view sentiments vẫn hoạt động qua trigger INSTEAD OF
+    with reopened._connection() as conn:
+        conn.execute(
+            "INSERT INTO sentiments (text, sentiment, timestamp) VALUES (?, ?, ?)",
+            ("Câu mới", "NEUTRAL", "2026-10-05 08:00:00")
+        )
+    assert reopened.get_history(limit=1)[0][1:] == ("Câu mới", "NEUTRAL", "2026-10-05 08:00:00")
+    assert reopened.verify_counters()
+    total = reopened.get_total_count()
+    reopened.close()
+
+    # Kết nối sqlite3 thông thường vẫn đọc được view
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM sentiments").fetchone()[0] == total
+    conn.close()
+
+
+def test_open_instance_follows_conversion_by_another(make_db):
+    db = make_db()
+    fill(db)
+    history = db.get_history(limit=1000)
+    negative = db.get_history_page(limit=1000)[0]
+    negative = [row for row in negative if row[2] == "NEGATIVE"]
+    found = db.search_history("cau danh gia so 3", limit=1000)[0]
+    chunks = [row for chunk in db.iter_history_chunks(chunk_size=50, sentiment="NEGATIVE") for row in chunk]
+
+    # Process khác (main.py compact) chuyển file trong khi db vẫn đang mở
+    other = SentimentDatabase(db.db_path)
+    other.convert_to_compact(vacuum=False)
+    other.close()
+
+    assert db.get_history(limit=1000) == history
+    assert db.compact
+    assert db.search_history("cau danh gia so 3", limit=1000)[0] == found
+    assert db.search_history("cau danh gia so 3", limit=1000, sentiment="NEGATIVE")[0] == [
+        row for row in found if row[2] == "NEGATIVE"
+    ]
+    assert chunks == sorted(negative, key=lambda row: (row[3], row[0]))
+    assert [row for chunk in db.iter_history_chunks(chunk_size=50, sentiment="NEGATIVE") for row in chunk] == chunks
+
+    # Ghi tiếp từ instance cũ đi vào schema gọn
+    db.save_classification("Câu đánh giá số 3", "POSITIVE")
+    with db._connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM history_texts").fetchone()[0] == 7
+    assert db.search_history("cau danh gia so 3", limit=1)[0][0][1:3] == ("Câu đánh giá số 3", "POSITIVE")
+    assert db.verify_counters()
+
+    # Chuyển lần nữa từ instance cũ không làm gì
+    assert db.convert_to_compact(vacuum=False)['entries'] == len(history) + 1
+    db.clear_history()
+    assert db.get_total_count() == 0 and db.get_history() == []
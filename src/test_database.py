@@ -0,0 +1,227 @@
+"""
+Test phân trang, bộ đếm và rollup của SentimentDatabase
+"""
+
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from database import SentimentDatabase
+
+# 25 bản ghi, nhiều bản ghi trùng timestamp để kiểm tra thứ tự theo id
+ROWS = [
+    (f"Câu số {i}", ("POSITIVE", "NEGATIVE", "NEUTRAL")[i % 3], f"2026-10-0{1 + i // 10} 08:{i % 4:02d}:00")
+    for i in range(25)
+]
+
+
+def check_keyset_pages(make_db, compact: bool):
+    db = make_db(ROWS, compact=compact)
+    everything = db.get_history(limit=100)
+    expected = sorted(range(1, len(ROWS) + 1), key=lambda i: (ROWS[i - 1][2], i), reverse=True)
+    assert [row[0] for row in everything] == expected
+
+    for limit in (1, 5, 7, 25, 100):
+        seen, cursor = [], None
+        while True:
+            page, cursor = db.get_history_page(limit=limit, cursor=cursor)
+            assert len(page) <= limit
+            seen.extend(page)
+            if cursor is None:
+                break
+            assert cursor == (page[-1][3], page[-1][0])
+        assert seen == everything, limit
+
+    # Bản ghi mới chèn không làm lệch các trang tiếp theo (khác OFFSET)
+    page, cursor = db.get_history_page(limit=10)
+    db.save_classification("Câu mới nhất", "POSITIVE")
+    assert db.get_history_page(limit=10, cursor=cursor)[0] == everything[10:20]
+    assert db.get_history_page(limit=10)[0][0][1] == "Câu mới nhất"
+
+
+def test_keyset_pagination_both_schemas(make_db):
+    for compact in (False, True):
+        check_keyset_pages(make_db, compact)
+
+
+def test_empty_history_page(make_db):
+    assert make_db().get_history_page(limit=10) == ([], None)
+
+
+def check_counter_triggers(make_db, compact: bool):
+    db = make_db(ROWS, compact=compact)
+    assert db.get_statistics() == {'total': 25, 'positive': 9, 'neutral': 8, 'negative': 8}
+
+    db.save_classification("Tuyệt vời", "POSITIVE")
+    db.save_classifications([("Dở tệ", "NEGATIVE")] * 3)
+    with db._connection() as conn:
+        conn.execute("DELETE FROM sentiments WHERE id IN (1, 2)")
+    assert db.get_statistics() == {'total': 27, 'positive': 9, 'neutral': 8, 'negative': 10}
+    assert db.verify_counters()
+
+    db.clear_history()
+    assert db.get_statistics() == {'total': 0, 'positive': 0, 'neutral': 0, 'negative': 0}
+    assert db.verify_counters()
+    db.save_classification("Bình thường", "NEUTRAL")
+    assert db.get_statistics()['neutral'] == 1
+
+
+def test_counter_triggers_both_schemas(make_db):
+    for compact in (False, True):
+        check_counter_triggers(make_db, compact)
+
+
+def test_update_moves_counts(make_db):
+    db = make_db(ROWS)
+    with db._connection() as conn:
+        conn.execute("UPDATE sentiments SET sentiment = 'NEGATIVE' WHERE sentiment = 'POSITIVE'")
+    assert db.get_statistics() == {'total': 25, 'positive': 0, 'neutral': 8, 'negative': 17}
+    assert db.verify_counters()
+
+    compact = make_db(ROWS, compact=True)
+    with compact._connection() as conn:
+        conn.execute("UPDATE history_entries SET label = 0 WHERE label = 2")
+    assert compact.get_statistics() == {'total': 25, 'positive': 0, 'neutral': 8, 'negative': 17}
+    assert compact.verify_counters()
+
+
+def test_rebuild_fixes_drifted_counters(make_db):
+    for compact in (False, True):
+        db = make_db(ROWS, compact=compact)
+        with db._connection() as conn:
+            # Mô phỏng sửa trực tiếp làm lệch bộ đếm và rollup
+            conn.execute("UPDATE sentiment_counts SET count = count + 5 WHERE sentiment = 'POSITIVE'")
+            conn.execute("DELETE FROM sentiment_rollup_daily")
+        assert not db.verify_counters()
+        db.rebuild_counters()
+        assert db.verify_counters()
+        assert db.get_statistics() == {'total': 25, 'positive': 9, 'neutral': 8, 'negative': 8}
+
+
+def test_migration_backfills_baseline_database(tmp_path):
+    # Database tạo bởi phiên bản gốc: chỉ có bảng sentiments, user_version = 0
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sentiments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            sentiment TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        )
+    """)
+    conn.executemany("INSERT INTO sentiments (text, sentiment, timestamp) VALUES (?, ?, ?)", ROWS)
+    conn.commit()
+    conn.close()
+
+    with SentimentDatabase(path) as db:
+        with db._connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
+        assert db.get_statistics() == {'total': 25, 'positive': 9, 'neutral': 8, 'negative': 8}
+        assert db.verify_counters()
+        assert len(db.search_history("cau so")[0]) == 25
+        db.save_classification("Câu sau nâng cấp", "NEUTRAL")
+        assert db.get_total_count() == 26
+
+    # Mở lại không chạy migration lần nữa
+    with SentimentDatabase(path) as db:
+        assert db.get_total_count() == 26
+        assert db.verify_counters()
+
+
+def expected_timeline(rows, width: int, suffix: str = '') -> list:
+    counts = Counter((timestamp[:width] + suffix, label) for _, label, timestamp in rows)
+    return sorted((bucket, label, count) for (bucket, label), count in counts.items())
+
+
+def check_timeline(make_db, compact: bool):
+    db = make_db(ROWS, compact=compact)
+    hourly = expected_timeline(ROWS, 13, ':00:00')
+    daily = expected_timeline(ROWS, 10)
+    assert db.get_timeline() == hourly
+    assert db.get_timeline(granularity='day') == daily
+
+    # Giữ trọn bucket chứa thời điểm đầu/cuối
+    assert db.get_timeline(start="2026-10-02 08:30:00", granularity='day') == [
+        row for row in daily if row[0] >= "2026-10-02"
+    ]
+    assert db.get_timeline(start=datetime(2026, 10, 2, 8, 59), end="2026-10-02 08:00:01") == [
+        row for row in hourly if row[0] == "2026-10-02 08:00:00"
+    ]
+
+    with db._connection() as conn:
+        conn.execute("DELETE FROM sentiments WHERE timestamp LIKE '2026-10-03%'")
+    assert db.get_timeline(granularity='day') == expected_timeline(ROWS[:20], 10)
+    assert db.verify_counters()
+
+
+def test_timeline_both_schemas(make_db):
+    for compact in (False, True):
+        check_timeline(make_db, compact)
+
+
+def test_timeline_follows_updates(make_db):
+    db = make_db(ROWS)
+    with db._connection() as conn:
+        conn.execute("UPDATE sentiments SET timestamp = '2026-10-05 09:15:00', sentiment = 'NEUTRAL' WHERE id = 1")
+    rows = [("", "NEUTRAL", "2026-10-05 09:15:00")] + ROWS[1:]
+    assert db.get_timeline() == expected_timeline(rows, 13, ':00:00')
+    assert db.get_timeline(granularity='day') == expected_timeline(rows, 10)
+    assert db.verify_counters()
+
+    try:
+        db.get_timeline(granularity='week')
+        assert False, "phải báo lỗi độ chi tiết"
+    except ValueError:
+        pass
+
+
+class CountingDatabase(SentimentDatabase):
+    """Thêm một bước migration ghi lại số lần nó được chạy"""
+    MIGRATIONS = SentimentDatabase.MIGRATIONS + [[
+        "CREATE TABLE IF NOT EXISTS migration_runs (id INTEGER PRIMARY KEY)",
+        "INSERT INTO migration_runs DEFAULT VALUES",
+    ]]
+
+
+def test_concurrent_open_migrates_once(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE sentiments (id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL, "
+        "sentiment TEXT NOT NULL, timestamp TEXT NOT NULL)"
+    )
+    conn.executemany("INSERT INTO sentiments (text, sentiment, timestamp) VALUES (?, ?, ?)", ROWS)
+    conn.commit()
+    conn.close()
+
+    # Nhiều process (ở đây là thread, mỗi thread một SentimentDatabase) mở cùng lúc
+    # trong khi file đang bị khóa ghi: tất cả đều thấy user_version = 0
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("PRAGMA journal_mode = WAL")
+    holder.execute("BEGIN IMMEDIATE")
+    errors = []
+
+    def open_database():
+        try:
+            CountingDatabase(path).close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=open_database) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.3)
+    holder.execute("COMMIT")
+    holder.close()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+    with CountingDatabase(path) as db:
+        with db._connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM migration_runs").fetchone()[0] == 1
+        assert len(db.search_history("cau so", limit=100)[0]) == 25
+        assert db.verify_counters()
@@ -0,0 +1,51 @@
+"""
+Test xuất lịch sử theo từng chunk (CSV, JSONL)
+"""
+
+import csv
+import json
+
+ROWS = [
+    ('Đồ ăn "ngon", giao\nnhanh', "POSITIVE", "2026-10-01 08:00:00"),
+    ("Dở, tệ", "NEGATIVE", "2026-10-02 09:00:00"),
+    ("Bình thường", "NEUTRAL", "2026-10-02 10:00:00"),
+]
+
+def test_csv_round_trip_with_bom(make_db, tmp_path):
+    for compact in (False, True):
+        db = make_db(ROWS, compact=compact)
+        path = str(tmp_path / f"history{int(compact)}.csv")
+        assert db.export_history(path, chunk_size=2) == 3
+
+        with open(path, 'rb') as f:
+            assert f.read(3) == b'\xef\xbb\xbf'
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.reader(f))
+        assert rows[0] == ['id', 'text', 'sentiment', 'timestamp']
+        # Cũ nhất trước, giữ nguyên dấu phẩy, ngoặc kép và xuống dòng trong câu
+        assert rows[1:] == [[str(value) for value in row] for row in reversed(db.get_history())]
+        db.close()
+
+
+def test_jsonl_filters(make_db, tmp_path):
+    db = make_db(ROWS)
+    path = str(tmp_path / "history.jsonl")
+
+    assert db.export_history(path, sentiment="NEGATIVE") == 1
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == [
+            {"id": 2, "text": "Dở, tệ", "sentiment": "NEGATIVE", "timestamp": "2026-10-02 09:00:00"}
+        ]
+
+    assert db.export_history(path, start="2026-10-02 00:00:00") == 2
+    assert db.export_history(path, end="2026-10-02 09:00:00") == 2
+    assert db.export_history(path, fmt="jsonl", start="2026-10-03 00:00:00") == 0
+    db.close()
+
+
+def test_chunks_are_bounded(make_db):
+    db = make_db()
+    db.save_classifications((f"Câu {i}", "POSITIVE") for i in range(1050))
+    sizes = [len(chunk) for chunk in db.iter_history_chunks(chunk_size=100)]
+    assert sizes == [100] * 10 + [50]
+    db.close()
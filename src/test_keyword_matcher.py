@@ -0,0 +1,42 @@
+"""
+Test KeywordMatcher so với cách đếm bằng `in` từng từ khóa
+"""
+
+import random
+
+from sentiment_analyzer import KeywordMatcher, SentimentAnalyzer
+
+def naive_count(groups, text: str) -> tuple:
+    return tuple(sum(1 for word in keywords if word in text) for keywords in groups)
+
+
+def test_overlapping_and_duplicate_keywords():
+    groups = [
+        ['tệ', 'tệ hại', 'tồi tệ', 'tệ', 'tồi'],
+        ['tệ hại', 'hại', 'ổn'],
+        ['ổn định'],
+    ]
+    matcher = KeywordMatcher(groups)
+    texts = [
+        "",
+        "tệ",
+        "tệ hại",
+        "phim này tồi tệ hại não",
+        "tồi tệ tồi tệ tồi tệ",
+        "mọi thứ ổn định",
+        "tệtệ hạitồi",
+        "không có từ nào",
+    ]
+    for text in texts:
+        assert matcher.count(text) == naive_count(groups, text), text
+    assert matcher.count_many(texts) == [naive_count(groups, t) for t in texts]
+
+
+def test_random_texts_match_naive_scan():
+    analyzer = SentimentAnalyzer()
+    groups = [analyzer.positive_keywords, analyzer.negative_keywords, analyzer.neutral_keywords]
+    vocabulary = [w for keywords in groups for w in keywords] + ['rất', 'không', 'hôm nay', 'quá', 'ổn']
+    rng = random.Random(0)
+    for _ in range(500):
+        text = rng.choice((' ', '')).join(rng.choices(vocabulary, k=rng.randint(0, 8)))
+        assert analyzer.keyword_matcher.count(text) == naive_count(groups, text), text
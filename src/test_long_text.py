@@ -0,0 +1,91 @@
+"""
+Test chia đoạn câu dài (_split_long) và gộp kết quả các đoạn (_aggregate)
+
+StandInPipeline không có tokenizer nên độ dài token được ước lượng bằng số từ.
+"""
+
+from benchmark import StandInPipeline
+from sentiment_analyzer import SentimentAnalyzer
+
+class RecordingPipeline(StandInPipeline):
+    """Ghi lại kích thước từng lần gọi model"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def __call__(self, texts, batch_size: int = None, **kwargs) -> list:
+        self.calls.append(1 if isinstance(texts, str) else len(texts))
+        return super().__call__(texts, batch_size=batch_size, **kwargs)
+
+
+def make_analyzer(**kwargs) -> SentimentAnalyzer:
+    analyzer = SentimentAnalyzer(cache_size=0, **kwargs)
+    analyzer.model = RecordingPipeline()
+    return analyzer
+
+
+def test_short_text_is_not_split():
+    analyzer = make_analyzer(max_tokens=10)
+    assert analyzer._split_long("ngắn thôi") == (["ngắn thôi"], False)
+    # Dài hơn ngân sách tính theo ký tự nhưng không theo token
+    assert analyzer._split_long("một hai ba bốn năm") == (["một hai ba bốn năm"], False)
+    assert make_analyzer(max_tokens=None)._split_long("từ " * 1000) == (["từ " * 1000], False)
+
+
+def test_sentences_are_packed_into_budget():
+    analyzer = make_analyzer(max_tokens=8)
+    text = "Câu một rất hay. Câu hai khá dở! Câu ba bình thường?"
+    assert analyzer._split_long(text) == (
+        ["Câu một rất hay. Câu hai khá dở!", "Câu ba bình thường?"], False
+    )
+
+
+def test_long_sentence_uses_word_windows():
+    analyzer = make_analyzer(max_tokens=10)
+    words = [f"từ{i}" for i in range(25)]
+    chunks, truncated = analyzer._split_long(' '.join(words))
+    assert not truncated
+    assert [len(c.split()) for c in chunks] == [10, 10, 5]
+    assert ' '.join(chunks).split() == words
+
+    truncating = make_analyzer(max_tokens=10, long_text="truncate")
+    assert truncating._split_long(' '.join(words)) == ([' '.join(words[:10])], True)
+
+
+def test_chunks_stay_within_budget():
+    analyzer = make_analyzer(max_tokens=12)
+    text = " ".join(f"Câu số {i} có {'rất ' * (i % 15)}nhiều từ." for i in range(40))
+    chunks, truncated = analyzer._split_long(text)
+    assert not truncated and len(chunks) > 1
+    assert all(len(c.split()) <= 12 for c in chunks)
+    assert ' '.join(chunks).split() == text.split()
+
+
+def test_aggregate_weights_by_words_and_score():
+    analyzer = make_analyzer()
+    chunks = ["một hai ba", "bốn", "năm sáu"]
+    outputs = [
+        {'label': 'POSITIVE', 'score': 0.9},
+        {'label': 'NEGATIVE', 'score': 0.99},
+        {'label': 'LABEL_2', 'score': 0.6},
+    ]
+    result = analyzer._aggregate(chunks, outputs, truncated=False)
+    # POSITIVE: 3 × 0.9 + 2 × 0.6 = 3.9, NEGATIVE: 1 × 0.99
+    assert result['label'] == 'POSITIVE'
+    assert abs(result['score'] - 3.9 / 6) < 1e-9
+    assert result['truncated'] is False
+    assert [c['sentiment'] for c in result['chunks']] == ['POSITIVE', 'NEGATIVE', 'POSITIVE']
+    assert [c['text'] for c in result['chunks']] == chunks
+
+
+def test_long_text_is_scored_in_bounded_batches():
+    analyzer = make_analyzer(max_tokens=4)
+    text = ' '.join(f"đoạn{i}" for i in range(300))
+    result = analyzer.analyze(text)
+    assert len(result['chunks']) == 75 and result['truncated'] is False
+    assert analyzer.model.calls == [32, 32, 11]
+
+    batched = make_analyzer(max_tokens=4)
+    assert batched.batch_analyze([text]) == [result]
+    assert max(batched.model.calls) <= 32
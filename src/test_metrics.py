@@ -0,0 +1,87 @@
+"""
+Test registry metrics và exporter Prometheus (không cần model thật)
+"""
+
+import threading
+import urllib.request
+
+from metrics import MetricsRegistry, start_metrics_server
+
+def test_render_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter('demo_requests_total', 'Số request', ('path',))
+    requests.labels(path='/analyze').inc()
+    requests.labels(path='/analyze').inc(2)
+    registry.gauge('demo_queue_depth', 'Độ sâu hàng đợi').set(5)
+    latency = registry.histogram('demo_seconds', 'Độ trễ', buckets=(0.1, 1))
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(3)
+
+    lines = registry.render().splitlines()
+    assert '# TYPE demo_requests_total counter' in lines
+    assert 'demo_requests_total{path="/analyze"} 3' in lines
+    assert 'demo_queue_depth 5' in lines
+    assert 'demo_seconds_bucket{le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{le="1"} 2' in lines
+    assert 'demo_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'demo_seconds_count 3' in lines
+
+
+def test_special_values():
+    registry = MetricsRegistry()
+    gauge = registry.gauge('demo_value', 'Giá trị', ('kind',))
+    gauge.labels(kind='nan').set(float('nan'))
+    gauge.labels(kind='pos').set(float('inf'))
+    gauge.labels(kind='neg').set(float('-inf'))
+    gauge.labels(kind='frac').set(-0.25)
+
+    lines = registry.render().splitlines()
+    assert 'demo_value{kind="nan"} NaN' in lines
+    assert 'demo_value{kind="pos"} +Inf' in lines
+    assert 'demo_value{kind="neg"} -Inf' in lines
+    assert 'demo_value{kind="frac"} -0.25' in lines
+
+
+def test_same_name_is_shared_and_thread_safe():
+    registry = MetricsRegistry()
+    counter = registry.counter('demo_total', 'Đếm', ('model',)).labels(model='phobert')
+    assert registry.counter('demo_total', 'Đếm', ('model',)).labels(model='phobert') is counter
+
+    def work():
+        for _ in range(10000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.value == 80000
+
+    try:
+        registry.gauge('demo_total', 'Đếm')
+        assert False, "Phải báo lỗi khi trùng tên khác loại"
+    except ValueError:
+        pass
+
+
+def test_http_exporter():
+    registry = MetricsRegistry()
+    registry.counter('demo_total', 'Đếm').inc()
+    server = start_metrics_server(0, registry=registry)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert 'demo_total 1' in response.read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    test_render_text_format()
+    test_same_name_is_shared_and_thread_safe()
+    test_http_exporter()
+    print("◈ TẤT CẢ TEST METRICS ĐỀU PASS!")
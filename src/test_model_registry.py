@@ -0,0 +1,86 @@
+"""
+Test ModelRegistry (analyzer giả, không cần model thật)
+"""
+
+import threading
+import time
+
+from model_registry import ModelRegistry
+
+class FakeAnalyzer:
+    """Ghi lại số lượt analyze() chạy đồng thời"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.active = 0
+        self.peak = 0
+        self.closed = False
+
+    def analyze(self, text: str) -> dict:
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        time.sleep(0.001)
+        self.active -= 1
+        return {'text': text, 'sentiment': 'NEUTRAL'}
+
+    def close(self):
+        self.closed = True
+
+
+def test_acquire_serializes_inference_per_model():
+    registry = ModelRegistry(loader=FakeAnalyzer)
+
+    def work(name: str):
+        for i in range(20):
+            with registry.acquire(name) as analyzer:
+                analyzer.analyze(f"Câu số {i}")
+
+    threads = [threading.Thread(target=work, args=(name,)) for name in ("phobert", "distilbert") * 4]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert registry.get("phobert").peak == 1
+    assert registry.get("distilbert").peak == 1
+    assert sorted(registry.loaded_models()) == ["distilbert", "phobert"]
+
+
+def test_models_run_in_parallel():
+    registry = ModelRegistry(loader=FakeAnalyzer)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with registry.acquire("phobert"):
+            entered.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    assert entered.wait(5)
+    # Model khác không phải chờ model đang bận
+    with registry.acquire("distilbert") as analyzer:
+        assert analyzer.analyze("Câu khác")['sentiment'] == 'NEUTRAL'
+    release.set()
+    holder.join()
+
+
+def test_evict_waits_for_borrowers():
+    registry = ModelRegistry(loader=FakeAnalyzer)
+    with registry.acquire("phobert") as analyzer:
+        assert registry.evict("phobert")
+        # Chưa loại khi đang suy luận: không tải bản sao thứ hai
+        assert registry.get("phobert") is analyzer
+        with registry.acquire("distilbert"):
+            pass
+        assert "phobert" in registry.loaded_models()
+        assert not analyzer.closed
+    assert registry.loaded_models() == ["distilbert"]
+    assert analyzer.closed
+    assert registry.get("phobert") is not analyzer
+
+    distilbert = registry.get("distilbert")
+    assert registry.evict("distilbert")
+    assert distilbert.closed
+    assert not registry.evict("distilbert")
+    assert registry.loaded_models() == ["phobert"]
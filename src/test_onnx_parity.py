@@ -0,0 +1,82 @@
+"""
+Kiểm tra backend ONNX Runtime cho kết quả giống backend PyTorch
+
+Cần torch, transformers, onnxruntime và tải được trọng số model; thiếu thì
+test được bỏ qua. Hai backend dùng cùng một bộ trọng số: model được export
+một lần và phía PyTorch nạp lại từ thư mục export (lớp phân loại của model
+gốc được khởi tạo ngẫu nhiên mỗi lần tải nên không thể tải lại từ Hub).
+"""
+
+import tempfile
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("onnxruntime")
+
+from onnx_backend import export_onnx
+from sentiment_analyzer import SentimentAnalyzer
+
+TEST_TEXTS = [
+    "Hôm nay tôi rất vui",
+    "Món ăn này dở quá",
+    "Thời tiết bình thường",
+    "Rất vui hôm nay",
+    "Công việc ổn định",
+    "Phim này hay lắm",
+    "Tôi buồn vì thất bại",
+    "Ngày mai đi học",
+    "Cảm ơn bạn rất nhiều",
+    "Mệt mỏi quá hôm nay",
+]
+
+def check_parity(model_name: str, cache_root: str, tolerance: float = 1e-3):
+    """So sánh nhãn và độ tin cậy giữa hai backend trên 10 câu test case"""
+    from transformers import pipeline
+
+    print("\n" + "="*80)
+    print(f"KIỂM TRA PARITY ONNX / PYTORCH - {model_name.upper()}")
+    print("="*80 + "\n")
+
+    try:
+        model_dir = export_onnx(SentimentAnalyzer.MODEL_IDS[model_name], cache_root)
+    except OSError as e:
+        pytest.skip(f"Không tải được trọng số {model_name}: {e}")
+
+    # Tắt cache để cả hai backend thật sự chạy model
+    torch_analyzer = SentimentAnalyzer(model_name=model_name, cache_size=0)
+    torch_analyzer.model = pipeline("sentiment-analysis", model=model_dir, device=-1)
+    onnx_analyzer = SentimentAnalyzer(model_name=model_name, cache_size=0, backend="onnx",
+                                      onnx_cache_dir=cache_root)
+
+    torch_results = torch_analyzer.batch_analyze(TEST_TEXTS)
+    onnx_results = onnx_analyzer.batch_analyze(TEST_TEXTS)
+
+    mismatches = 0
+    for text, t, o in zip(TEST_TEXTS, torch_results, onnx_results):
+        same = (
+            t['sentiment'] == o['sentiment']
+            and t.get('raw_label') == o.get('raw_label')
+            and abs(t['confidence'] - o['confidence']) <= tolerance
+        )
+        if not same:
+            mismatches += 1
+        status = "✓" if same else "✗"
+        print(f"{status} Câu: {text:<25} | Torch: {t['sentiment']:<8} {t['confidence']:.4f} "
+              f"| ONNX: {o['sentiment']:<8} {o['confidence']:.4f}")
+
+    print("\n" + "="*80)
+    print(f"KẾT QUẢ: {len(TEST_TEXTS) - mismatches}/{len(TEST_TEXTS)} khớp (sai số ≤ {tolerance})")
+    print("="*80 + "\n")
+
+    assert mismatches == 0
+
+
+def test_onnx_parity(tmp_path):
+    check_parity("phobert", str(tmp_path))
+
+if __name__ == "__main__":
+    cache_root = tempfile.mkdtemp()
+    check_parity("phobert", cache_root)
+    check_parity("distilbert", cache_root)
@@ -0,0 +1,108 @@
+"""
+Test PredictionCache: LRU, TTL, tầng lưu trữ SQLite và bộ đếm
+"""
+
+import sqlite3
+
+import pytest
+
+import prediction_cache
+from prediction_cache import PredictionCache
+
+POSITIVE = {'label': 'POSITIVE', 'score': 0.9}
+NEGATIVE = {'label': 'NEGATIVE', 'score': 0.8}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Đồng hồ giả cho TTL: clock['now'] là giá trị time.time() hiện tại"""
+    state = {'now': 1000.0}
+    monkeypatch.setattr(prediction_cache.time, 'time', lambda: state['now'])
+    return state
+
+
+def stored_rows(path: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM prediction_cache").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache(max_size=2)
+    cache.put('phobert', 'một', POSITIVE)
+    cache.put('phobert', 'hai', NEGATIVE)
+    # Đọc 'một' để 'hai' thành mục ít dùng nhất
+    assert cache.get('phobert', 'một') == POSITIVE
+    cache.put('phobert', 'ba', POSITIVE)
+
+    assert cache.get('phobert', 'hai') is None
+    assert cache.get('phobert', 'một') == POSITIVE
+    assert cache.get('phobert', 'ba') == POSITIVE
+    # Cùng câu nhưng khác model là mục khác
+    assert cache.get('distilbert', 'một') is None
+    assert cache.stats() == {
+        'hits': 3, 'misses': 2, 'evictions': 1, 'persistent_hits': 0,
+        'size': 2, 'hit_rate': 3 / 5,
+    }
+
+
+def test_returned_results_are_copies():
+    cache = PredictionCache()
+    cache.put('phobert', 'một', {'label': 'POSITIVE', 'score': 0.9, 'extra': 1})
+    result = cache.get('phobert', 'một')
+    assert result == POSITIVE
+    result['label'] = 'NEGATIVE'
+    assert cache.get('phobert', 'một') == POSITIVE
+
+
+def test_ttl_expires_memory_entries(clock):
+    cache = PredictionCache(ttl=10)
+    cache.put('phobert', 'một', POSITIVE)
+    clock['now'] += 10
+    assert cache.get('phobert', 'một') == POSITIVE
+    clock['now'] += 1
+    assert cache.get('phobert', 'một') is None
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['misses'] == 1
+
+
+def test_persistent_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache" / "predictions.db")
+    cache = PredictionCache(max_size=1, db_path=path)
+    cache.put_many('phobert', [('một', POSITIVE), ('hai', NEGATIVE)])
+    # 'một' đã bị đẩy khỏi bộ nhớ nhưng vẫn còn trong SQLite
+    assert cache.get('phobert', 'một') == POSITIVE
+    assert cache.stats()['persistent_hits'] == 1
+    cache.close()
+
+    restarted = PredictionCache(db_path=path)
+    assert restarted.get('phobert', 'hai') == NEGATIVE
+    assert restarted.get('phobert', 'hai') == NEGATIVE
+    stats = restarted.stats()
+    assert stats['hits'] == 2 and stats['persistent_hits'] == 1 and stats['size'] == 1
+
+    restarted.clear()
+    assert restarted.get('phobert', 'một') is None
+    assert stored_rows(path) == 0
+    restarted.close()
+
+
+def test_expired_rows_are_deleted(clock, tmp_path):
+    path = str(tmp_path / "predictions.db")
+    cache = PredictionCache(max_size=0, ttl=10, db_path=path)
+    cache.put_many('phobert', [(f"câu {i}", POSITIVE) for i in range(5)])
+    clock['now'] += 5
+    cache.put('phobert', 'mới', NEGATIVE)
+
+    # Đọc mục hết hạn xóa luôn hàng đó
+    clock['now'] += 6
+    assert cache.get('phobert', 'câu 0') is None
+    assert stored_rows(path) == 5
+
+    # Ghi mới dọn các mục hết hạn chưa từng được đọc lại
+    cache.put('phobert', 'mới nhất', POSITIVE)
+    assert stored_rows(path) == 2
+    assert cache.get('phobert', 'mới') == NEGATIVE
+    cache.close()
@@ -0,0 +1,116 @@
+"""
+Test tìm kiếm toàn văn (FTS5) trong lịch sử phân loại
+"""
+
+import sqlite3
+
+from database import remove_diacritics
+
+ROWS = [
+    ("Hàng kém chất lượng, giao chậm", "NEGATIVE", "2026-10-01 08:00:00"),
+    ("Đồ ăn ngon, giao hàng nhanh", "POSITIVE", "2026-10-02 09:00:00"),
+    ("Dở ẹc, đồ hư hết rồi", "NEGATIVE", "2026-10-03 10:00:00"),
+    ("Chất lượng bình thường", "NEUTRAL", "2026-10-04 11:00:00"),
+]
+
+def ids(result) -> list:
+    return [row[0] for row in result[0]]
+
+
+def test_remove_diacritics():
+    assert remove_diacritics("Đồ ăn ngon, giao hàng NHANH") == "Do an ngon, giao hang NHANH"
+
+
+def check_diacritics_and_filters(make_db, compact: bool):
+    db = make_db(ROWS, compact=compact)
+    assert ids(db.search_history("chat luong")) == [4, 1]
+    assert ids(db.search_history("đồ")) == [3, 2]
+    assert ids(db.search_history("do", match_diacritics=True)) == []
+    assert ids(db.search_history("Chất", match_diacritics=True)) == [4, 1]
+    assert ids(db.search_history('"giao hang"')) == [2]
+    assert ids(db.search_history("gia*")) == [2, 1]
+    assert ids(db.search_history("do", sentiment="NEGATIVE")) == [3]
+    assert ids(db.search_history("giao", start="2026-10-02 00:00:00")) == [2]
+    assert ids(db.search_history("giao", end="2026-10-01 23:59:59")) == [1]
+    # Ký tự đặc biệt của FTS5 không làm lỗi truy vấn
+    assert ids(db.search_history('"chat (luong*)')) == [4, 1]
+    assert db.search_history("!!!") == ([], None)
+    db.close()
+
+
+def check_pagination_and_sync(make_db, compact: bool):
+    db = make_db(ROWS, compact=compact)
+    db.save_classifications([(f"Món số {i} rất ngon", "POSITIVE") for i in range(25)])
+    page, cursor = db.search_history("ngon", limit=10)
+    seen = [row[0] for row in page]
+    while cursor is not None:
+        page, cursor = db.search_history("ngon", limit=10, cursor=cursor)
+        seen.extend(row[0] for row in page)
+    assert seen == sorted(seen, reverse=True) and len(seen) == 26
+
+    db.clear_history()
+    assert db.search_history("ngon") == ([], None)
+    db.save_classification("Ngon tuyệt", "POSITIVE")
+    assert len(db.search_history("ngon")[0]) == 1
+    db.close()
+
+
+def test_search_both_schemas(make_db):
+    for compact in (False, True):
+        check_diacritics_and_filters(make_db, compact)
+        check_pagination_and_sync(make_db, compact)
+
+
+def test_index_follows_conversion(make_db):
+    db = make_db(ROWS)
+    db.convert_to_compact()
+    assert ids(db.search_history("chat luong")) == [4, 1]
+    db.save_classification("Chất lượng tuyệt vời", "POSITIVE")
+    assert ids(db.search_history("chat luong")) == [5, 4, 1]
+    db.close()
+
+
+def test_external_connection_keeps_index_in_sync(make_db):
+    # Trigger đồng bộ chỉ dùng SQL thuần: kết nối sqlite3 thông thường ghi được
+    db = make_db(ROWS)
+    conn = sqlite3.connect(db.db_path)
+    with conn:
+        conn.execute(
+            "INSERT INTO sentiments (text, sentiment, timestamp) VALUES (?, ?, ?)",
+            ("Đường phố đông đúc, ồn ào", "NEGATIVE", "2026-10-05 08:00:00")
+        )
+        conn.execute("DELETE FROM sentiments WHERE id = 3")
+        conn.execute("UPDATE sentiments SET text = 'Chất lượng tuyệt vời' WHERE id = 1")
+    conn.close()
+    assert ids(db.search_history("duong pho")) == [5]
+    assert ids(db.search_history("đường", match_diacritics=True)) == [5]
+    assert db.search_history("do hu") == ([], None)
+    assert ids(db.search_history("chat luong")) == [4, 1]
+    assert db.search_history("kem") == ([], None)
+    assert ids(db.search_history("tuyet voi")) == [1]
+
+    # Schema gọn: xóa câu văn từ kết nối ngoài vẫn cập nhật chỉ mục
+    compact = make_db(ROWS, compact=True)
+    conn = sqlite3.connect(compact.db_path)
+    with conn:
+        conn.execute("DELETE FROM history_entries WHERE text_id = 3")
+        conn.execute("DELETE FROM history_texts WHERE id = 3")
+        indexed = conn.execute(
+            "SELECT rowid FROM history_fts_folded WHERE history_fts_folded MATCH 'do'"
+        ).fetchall()
+    conn.close()
+    assert indexed == [(2,)]
+    assert ids(compact.search_history("do")) == [2]
+
+
+def test_folding_matches_remove_diacritics(make_db):
+    letters = "aàáảãạăằắẳẵặâầấẩẫậeèéẻẽẹêềếểễệiìíỉĩịoòóỏõọôồốổỗộơờớởỡợuùúủũụưừứửữựyỳýỷỹỵđ"
+    words = [f"x{ch}x" for ch in letters + letters.upper()]
+    db = make_db([(word, "NEUTRAL", "2026-10-01 08:00:00") for word in words])
+    for word in words:
+        # Tìm không dấu khớp mọi biến thể có cùng chữ gốc, tìm có dấu chỉ khớp đúng dấu
+        folded = [i for i, w in enumerate(words, start=1)
+                  if remove_diacritics(w).lower() == remove_diacritics(word).lower()]
+        exact = [i for i, w in enumerate(words, start=1) if w.lower() == word.lower()]
+        assert sorted(ids(db.search_history(remove_diacritics(word)))) == folded, word
+        assert sorted(ids(db.search_history(word, match_diacritics=True))) == exact, word
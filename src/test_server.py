@@ -0,0 +1,182 @@
+"""
+Test HTTP service micro-batching bằng client cục bộ (không cần model thật)
+"""
+
+import asyncio
+import json
+import threading
+
+from server import SentimentServer
+
+class FakeAnalyzer:
+    """Analyzer giả: ghi lại kích thước từng batch, nhãn theo độ dài câu"""
+
+    def __init__(self, delay: float = 0.0):
+        self.batch_sizes = []
+        self.delay = delay
+        self.release = threading.Event()
+        self.release.set()
+
+    def batch_analyze(self, texts):
+        self.release.wait()
+        self.batch_sizes.append(len(texts))
+        return [
+            {'text': t, 'sentiment': 'POSITIVE' if len(t) % 2 else 'NEGATIVE', 'confidence': 0.9}
+            for t in texts
+        ]
+
+
+async def request(port: int, method: str, path: str, payload=None):
+    """Gửi một request HTTP/1.1 và trả về (status, body JSON)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, content = raw.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    return status, json.loads(content.decode('utf-8'))
+
+
+def run_with_server(coro_factory, analyzer, **kwargs):
+    async def runner():
+        server = SentimentServer(analyzer, **kwargs)
+        port = await server.start("127.0.0.1", 0)
+        try:
+            return await coro_factory(port)
+        finally:
+            await server.stop()
+    return asyncio.run(runner())
+
+
+def test_single_and_health():
+    analyzer = FakeAnalyzer()
+
+    async def scenario(port):
+        status, result = await request(port, "POST", "/analyze", {"text": "Hôm nay tôi rất vui"})
+        assert status == 200
+        assert result['text'] == "Hôm nay tôi rất vui"
+        status, health = await request(port, "GET", "/health")
+        assert status == 200 and health['status'] == 'ok'
+        assert health['processed'] == 1
+        status, _ = await request(port, "GET", "/missing")
+        assert status == 404
+        status, _ = await request(port, "POST", "/analyze", {"wrong": 1})
+        assert status == 400
+
+    run_with_server(scenario, analyzer)
+
+
+def test_concurrent_requests_are_batched():
+    analyzer = FakeAnalyzer()
+    texts = [f"Câu số {i}" + "!" * i for i in range(20)]
+
+    async def scenario(port):
+        return await asyncio.gather(*[request(port, "POST", "/analyze", {"text": t}) for t in texts])
+
+    responses = run_with_server(scenario, analyzer, max_batch_size=8, max_wait_ms=50)
+    # Mỗi caller nhận đúng kết quả của câu mình gửi
+    assert [r[1]['text'] for r in responses] == texts
+    assert all(status == 200 for status, _ in responses)
+    # Các request đồng thời được gộp thành batch lớn hơn 1 và không vượt giới hạn
+    assert max(analyzer.batch_sizes) > 1
+    assert max(analyzer.batch_sizes) <= 8
+    assert sum(analyzer.batch_sizes) == len(texts)
+
+
+def test_batch_endpoint_keeps_order():
+    analyzer = FakeAnalyzer()
+    texts = ["Món ăn này dở quá", "Phim này hay lắm", "Ngày mai đi học"]
+
+    async def scenario(port):
+        return await request(port, "POST", "/analyze/batch", {"texts": texts})
+
+    status, body = run_with_server(scenario, analyzer)
+    assert status == 200
+    assert [r['text'] for r in body['results']] == texts
+
+
+def test_backpressure_when_queue_full():
+    analyzer = FakeAnalyzer()
+    analyzer.release.clear()  # Chặn suy luận để hàng đợi đầy lên
+
+    async def scenario(port):
+        first = asyncio.ensure_future(request(port, "POST", "/analyze/batch", {"texts": ["a" * 10] * 4}))
+        await asyncio.sleep(0.1)
+        status, body = await request(port, "POST", "/analyze/batch", {"texts": ["b" * 10] * 4})
+        analyzer.release.set()
+        await first
+        return status
+
+    status = run_with_server(scenario, analyzer, max_batch_size=1, max_queue=4)
+    assert status == 503
+
+
+def test_batch_larger_than_queue_is_rejected():
+    analyzer = FakeAnalyzer()
+
+    async def scenario(port):
+        return await request(port, "POST", "/analyze/batch", {"texts": ["c" * 10] * 5})
+
+    # Không bao giờ vừa hàng đợi nên không phải lỗi tạm thời (503)
+    status, body = run_with_server(scenario, analyzer, max_queue=4)
+    assert status == 413
+    assert analyzer.batch_sizes == []
+
+
+def test_invalid_content_length():
+    async def scenario(port):
+        statuses = []
+        for value in ("abc", "-5"):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(
+                f"POST /analyze HTTP/1.1\r\nHost: localhost\r\nContent-Length: {value}\r\n\r\n".encode('latin-1')
+            )
+            await writer.drain()
+            raw = await reader.read()
+            writer.close()
+            statuses.append(int(raw.split()[1]))
+        return statuses
+
+    assert run_with_server(scenario, FakeAnalyzer()) == [400, 400]
+
+
+def test_stop_does_not_block_event_loop():
+    analyzer = FakeAnalyzer()
+    analyzer.release.clear()  # Batch đang suy luận lúc dừng service
+    timer = threading.Timer(0.5, analyzer.release.set)
+
+    async def scenario():
+        server = SentimentServer(analyzer)
+        port = await server.start("127.0.0.1", 0)
+        pending = asyncio.ensure_future(request(port, "POST", "/analyze", {"text": "Câu đang chạy"}))
+        await asyncio.sleep(0.1)
+        timer.start()
+        stopping = asyncio.ensure_future(server.stop())
+        await asyncio.sleep(0.05)
+        # Event loop vẫn chạy trong khi chờ batch đang dở kết thúc
+        responsive = not analyzer.release.is_set()
+        await stopping
+        pending.cancel()
+        return responsive
+
+    try:
+        assert asyncio.run(scenario())
+    finally:
+        timer.cancel()
+        analyzer.release.set()
+
+
+if __name__ == "__main__":
+    test_single_and_health()
+    test_concurrent_requests_are_batched()
+    test_batch_endpoint_keeps_order()
+    test_backpressure_when_queue_full()
+    test_batch_larger_than_queue_is_rejected()
+    test_invalid_content_length()
+    test_stop_does_not_block_event_loop()
+    print("◈ TẤT CẢ TEST SERVICE ĐỀU PASS!")
@@ -0,0 +1,54 @@
+"""
+Test đo thời gian từng bước của analyze() (pipeline giả, không cần model thật)
+"""
+
+import time
+
+from sentiment_analyzer import SentimentAnalyzer
+
+class HookedPipeline:
+    """Pipeline giả gọi hook preprocess/_forward qua self như pipeline của transformers"""
+
+    tokenizer = None
+
+    def preprocess(self, text: str) -> list:
+        time.sleep(0.005)
+        return text.split()
+
+    def _forward(self, tokens: list) -> float:
+        time.sleep(0.01)
+        return 0.9 if len(tokens) % 2 else 0.8
+
+    def __call__(self, texts, batch_size: int = None, **kwargs) -> list:
+        if isinstance(texts, str):
+            texts = [texts]
+        return [{'label': 'POSITIVE', 'score': self._forward(self.preprocess(t))} for t in texts]
+
+
+def test_tokenize_and_forward_are_separate_stages():
+    analyzer = SentimentAnalyzer(instrument=True, attach_timings=True)
+    analyzer.model = HookedPipeline()
+    # Gán lại cùng pipeline không bọc hook hai lần
+    analyzer.model = analyzer.model
+
+    timings = analyzer.analyze("Hôm nay tôi rất vui")['timings_ms']
+    assert 5 <= timings['tokenize'] < timings['model']
+    assert 10 <= timings['forward'] < timings['model']
+    assert timings['tokenize'] + timings['forward'] <= timings['model'] <= timings['total']
+
+    # Trúng cache: không tokenize, không forward
+    cached = analyzer.analyze("Hôm nay tôi rất vui")['timings_ms']
+    assert 'tokenize' not in cached and 'forward' not in cached
+
+    stats = analyzer.timing_stats()
+    assert stats['model']['count'] == 2
+    assert stats['tokenize']['count'] == stats['forward']['count'] == 1
+
+
+def test_pipeline_untouched_without_instrument():
+    pipeline = HookedPipeline()
+    analyzer = SentimentAnalyzer()
+    analyzer.model = pipeline
+    assert 'preprocess' not in vars(pipeline) and '_forward' not in vars(pipeline)
+    assert analyzer.timing_stats() is None
+    assert 'timings_ms' not in analyzer.analyze("Hôm nay tôi rất vui")
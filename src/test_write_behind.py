@@ -0,0 +1,86 @@
+"""
+Test chế độ ghi trễ (write-behind) của SentimentDatabase
+"""
+
+import os
+import subprocess
+import sys
+import threading
+
+from database import SentimentDatabase
+
+def test_reads_flush_pending_writes(make_db):
+    db = make_db()
+    writer = db.enable_write_behind(flush_interval=60, flush_size=1000)
+    for i in range(250):
+        db.save_classification(f"Câu số {i}", "POSITIVE")
+    # Hàm đọc ghi nốt hàng đợi trước khi đọc
+    assert db.get_total_count() == 250
+    assert db.get_history(limit=1)[0][1] == "Câu số 249"
+    assert writer.stats()['written'] == 250
+    db.close()
+
+
+def test_concurrent_producers_and_batching(make_db):
+    db = make_db()
+    writer = db.enable_write_behind(flush_interval=0.05, flush_size=100)
+
+    def produce(k):
+        for i in range(1000):
+            db.save_classification(f"{k}-{i}", "NEGATIVE")
+
+    threads = [threading.Thread(target=produce, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert db.get_total_count() == 4000
+    assert db.verify_counters()
+    assert writer.stats()['batches'] < 4000
+    db.close()
+
+
+def test_drop_when_full_without_blocking(make_db):
+    db = make_db()
+    writer = db.enable_write_behind(max_queue=5, block=False, flush_interval=60, flush_size=1000)
+    release = threading.Event()
+    write = writer._write
+    writer._write = lambda rows: (release.wait(), write(rows))
+    for i in range(20):
+        db.save_classification(f"Câu số {i}", "NEUTRAL")
+    assert writer.stats()['dropped'] == 15
+    release.set()
+    assert db.get_total_count() == 5
+    db.close()
+
+
+def test_flush_on_interpreter_exit(tmp_path):
+    path = str(tmp_path / "history.db")
+    code = (
+        "from database import SentimentDatabase\n"
+        f"db = SentimentDatabase({path!r})\n"
+        "db.enable_write_behind(flush_interval=60)\n"
+        "for i in range(37):\n"
+        "    db.save_classification(f'Câu số {i}', 'POSITIVE')\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    with SentimentDatabase(path) as db:
+        assert db.get_total_count() == 37
+
+
+
+def test_app_enables_write_behind_only_on_request(tmp_path, monkeypatch):
+    from main import SentimentApp
+
+    # SentimentApp dùng database mặc định data/sentiment_history.db theo thư mục hiện tại
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('SENTIMENT_WRITE_BEHIND', raising=False)
+    for env, explicit, expected in ((None, None, False), ('1', None, True), (None, True, True), ('1', False, False)):
+        if env is not None:
+            monkeypatch.setenv('SENTIMENT_WRITE_BEHIND', env)
+        app = SentimentApp(write_behind=explicit)
+        try:
+            assert (app.db._writer is not None) == expected
+        finally:
+            app.db.close()
+            monkeypatch.delenv('SENTIMENT_WRITE_BEHIND', raising=False)
@@ -0,0 +1,200 @@
+"""
+Hàng đợi ghi trễ (write-behind) cho lịch sử phân loại
+
+Kết quả được đưa vào một hàng đợi giới hạn trong process; một thread nền gom
+chúng thành batch và ghi trong một transaction, nên người dùng không phải chờ
+insert và fsync trước khi thấy kết quả.
+"""
+
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+
+class WriteBehindQueue:
+    """
+    Hàng đợi giới hạn với thread ghi nền
+
+    - Batch được ghi khi đủ flush_size mục hoặc mục đầu tiên đã chờ flush_interval giây
+    - Hàng đợi đầy: chặn người gọi (block=True, tối đa put_timeout giây) hoặc bỏ mục mới
+    - flush() chờ đến khi mọi mục đã nhận trước đó được ghi xong
+    - close() (tự gọi khi thoát interpreter) ghi nốt toàn bộ hàng đợi rồi dừng thread
+    """
+
+    def __init__(self, write: Callable[[List], object], max_queue: int = 10000,
+                 flush_interval: float = 0.5, flush_size: int = 500, block: bool = True,
+                 put_timeout: float = None, metrics=None):
+        """
+        Args:
+            write: Hàm ghi một batch (VD: SentimentDatabase._insert_rows)
+            max_queue: Số mục tối đa đang chờ ghi
+            flush_interval: Thời gian chờ tối đa để gom batch (giây)
+            flush_size: Số mục tối đa mỗi batch
+            block: True để chặn người gọi khi hàng đợi đầy, False để bỏ mục mới
+            put_timeout: Thời gian chặn tối đa (giây) trước khi bỏ mục, None là chờ mãi
+            metrics: MetricsRegistry để ghi độ sâu hàng đợi và số mục bị bỏ/lỗi
+        """
+        self._write = write
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.block = block
+        self.put_timeout = put_timeout
+
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._accepted = 0   # Số mục đã nhận vào hàng đợi
+        self._finished = 0   # Số mục đã ghi xong (kể cả lỗi)
+        self._flush_requested = False
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+
+        self.metrics = metrics
+        if metrics is not None:
+            self._m_depth = metrics.gauge('sentiment_write_queue_depth', 'Số bản ghi đang chờ ghi')
+            self._m_dropped = metrics.counter('sentiment_write_dropped_total', 'Số bản ghi bị bỏ do hàng đợi đầy')
+            self._m_errors = metrics.counter('sentiment_write_errors_total', 'Số bản ghi ghi thất bại')
+
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    def put(self, item) -> bool:
+        """
+        Đưa một mục vào hàng đợi
+
+        Returns:
+            True nếu đã nhận, False nếu bị bỏ vì hàng đợi đầy
+
+        Raises:
+            RuntimeError: Hàng đợi đã đóng
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Hàng đợi ghi đã đóng")
+            if len(self._items) >= self.max_queue:
+                deadline = None if self.put_timeout is None else time.monotonic() + self.put_timeout
+                while self.block and len(self._items) >= self.max_queue and not self._closed:
+                    # Yêu cầu ghi ngay để giải phóng chỗ
+                    self._flush_requested = True
+                    self._cond.notify_all()
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if len(self._items) >= self.max_queue or self._closed:
+                    self.dropped += 1
+                    if self.metrics is not None:
+                        self._m_dropped.inc()
+                    return False
+
+            self._items.append(item)
+            self._accepted += 1
+            if len(self._items) == 1 or len(self._items) >= self.flush_size:
+                self._cond.notify_all()
+            if self.metrics is not None:
+                self._m_depth.set(len(self._items))
+            return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Ghi ngay các mục đang chờ và đợi đến khi xong
+
+        Args:
+            timeout: Thời gian chờ tối đa (giây), None là chờ đến khi xong
+
+        Returns:
+            True nếu mọi mục nhận trước lời gọi đã được ghi
+        """
+        with self._cond:
+            target = self._accepted
+            if self._finished >= target:
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._finished < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self):
+        """Ghi nốt hàng đợi và dừng thread ghi (gọi nhiều lần vẫn an toàn)"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dictionary {queue_depth, written, dropped, errors, batches}
+        """
+        with self._cond:
+            return {
+                'queue_depth': len(self._items),
+                'written': self.written,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'batches': self.batches,
+            }
+
+    def _next_batch(self) -> List:
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            # Đã có mục đầu tiên: gom thêm đến khi đủ batch, hết giờ hoặc được yêu cầu flush
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._items) < self.flush_size and not (self._closed or self._flush_requested):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._items.popleft() for _ in range(min(len(self._items), self.flush_size))]
+            if self.metrics is not None:
+                self._m_depth.set(len(self._items))
+            # Báo cho người gọi đang bị chặn vì hàng đợi đầy
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return  # Đã đóng và hàng đợi trống
+
+            failed = 0
+            try:
+                self._write(batch)
+            except Exception as e:
+                failed = len(batch)
+                print(f"Lỗi khi ghi lịch sử: {e}")
+                if self.metrics is not None:
+                    self._m_errors.inc(failed)
+
+            with self._cond:
+                self.batches += 1
+                self.written += len(batch) - failed
+                self.errors += failed
+                self._finished += len(batch)
+                if not self._items:
+                    self._flush_requested = False
+                self._cond.notify_all()